@@ -0,0 +1,36 @@
+"""
+"User card" rows shared by the user listing endpoints (search, following,
+followers).
+
+A page of cards costs the same number of queries however many users it
+lists: the viewer's follow state is one IN query over the page ids and the
+follower counts come from the CustomUser.followers_count column.
+"""
+from .models import CustomUser
+
+Follow = CustomUser.following.through
+
+
+def followed_ids(viewer, user_ids):
+    """The subset of `user_ids` that `viewer` follows"""
+    return set(
+        Follow.objects.filter(from_customuser_id=viewer.id, to_customuser_id__in=user_ids)
+        .values_list('to_customuser_id', flat=True)
+    )
+
+
+def user_cards(viewer, users):
+    """Serialize `users` (already fetched) as seen by `viewer`"""
+    ids = [user.id for user in users]
+    if not ids:
+        return []
+    following = followed_ids(viewer, ids)
+    return [
+        {
+            'username': user.username,
+            'bio': user.bio,
+            'is_following': user.id in following,
+            'followers_count': user.followers_count,
+        }
+        for user in users
+    ]
@@ -0,0 +1,73 @@
+"""
+Denormalized profile counters on CustomUser (followers, following, reviews,
+watched movies).
+
+accounts.signals adjusts them with F() updates as reviews and interactions
+are written, and recounts the follow counters of the users involved in a
+follow change, so profiles and "suggested users" read a column instead of
+aggregating. `manage.py reconcile_user_counters` recomputes them
+from the source tables to repair any drift (e.g. rows written with
+queryset.update/bulk_create, which send no signals).
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import CustomUser
+
+Follow = CustomUser.following.through
+
+
+def apply_delta(user_ids, field, n):
+    """Add `n` to `field` of every user in `user_ids`"""
+    if user_ids and n:
+        CustomUser.objects.filter(id__in=user_ids).update(**{field: F(field) + n})
+
+
+def recount(user_ids, fields):
+    """Recompute `fields` of every user in `user_ids` from the source tables"""
+    if user_ids:
+        expressions = actual_counts()
+        CustomUser.objects.filter(id__in=user_ids).update(**{field: expressions[field] for field in fields})
+
+
+def _count(queryset, column):
+    """Correlated COUNT(*) of `queryset` rows whose `column` is the outer user"""
+    counted = (
+        queryset.filter(**{column: OuterRef('pk')})
+        .order_by()
+        .values(column)
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+def actual_counts():
+    """{counter field: expression computing it from the source tables}"""
+    from movies.models import MovieReview, UserMovieInteraction
+
+    return {
+        'followers_count': _count(Follow.objects.all(), 'to_customuser'),
+        'following_count': _count(Follow.objects.all(), 'from_customuser'),
+        'reviews_count': _count(MovieReview.objects.all(), 'user'),
+        'watched_count': _count(UserMovieInteraction.objects.filter(interaction_type='watched'), 'user'),
+    }
+
+
+def reconcile(dry_run=False, batch_size=1000):
+    """Fix users whose counters disagree with the source tables; returns how many were off"""
+    expressions = actual_counts()
+    drifted = CustomUser.objects.annotate(
+        **{f'actual_{field}': expression for field, expression in expressions.items()}
+    ).filter(
+        Q(*[~Q(**{field: F(f'actual_{field}')}) for field in expressions], _connector=Q.OR)
+    ).only('id', *expressions)
+
+    users = []
+    for user in drifted.iterator():
+        for field in expressions:
+            setattr(user, field, getattr(user, f'actual_{field}'))
+        users.append(user)
+    if users and not dry_run:
+        CustomUser.objects.bulk_update(users, list(expressions), batch_size=batch_size)
+    return len(users)
@@ -0,0 +1,130 @@
+"""
+Friends activity feed.
+
+Every review, movie interaction and liked song is appended to the Activity
+log (accounts.signals). It is then copied into the FeedEntry inbox of each
+follower (fan-out on write), so reading a feed is a single range scan of
+(owner, -created_at).
+
+Users with more than FEED_FANOUT_MAX_FOLLOWERS followers are the exception.
+Copying their activity to every inbox would make each of their writes huge,
+so their activity stays in the log and is merged into their followers'
+feeds at read time (fan-out on read). Both sides decide by the
+CustomUser.followers_count column. An author who crosses the threshold can
+have the same activity in an inbox and in the log, so the merge drops
+repeated ids.
+"""
+import heapq
+
+from django.conf import settings
+
+from tunr_backend.pagination import decode_cursor, encode_cursor, keyset_filter
+from .models import Activity, CustomUser, FeedEntry
+
+INBOX_ORDERING = ['-created_at', '-activity_id']
+LOG_ORDERING = ['-created_at', '-id']
+
+# UserMovieInteraction.interaction_type -> Activity.activity_type
+INTERACTION_ACTIVITY = {
+    'watched': 'watched',
+    'want_to_watch': 'want_to_watch',
+    'like': 'liked',
+    'love': 'loved',
+}
+REVIEW_ACTIVITIES = ('rated', 'reviewed')
+
+
+def _fan_out_targets(user_id):
+    """Follower ids to copy `user_id`'s activity to, or None if they have too many"""
+    followers_count = CustomUser.objects.filter(id=user_id).values_list('followers_count', flat=True).first()
+    # Same test as _read_time_authors, so every author lands on exactly one side
+    if followers_count is None or followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        return None
+    return list(CustomUser.objects.filter(following=user_id).values_list('id', flat=True))
+
+
+def fan_out(activity):
+    """Copy a new activity into its author's followers' inboxes (skipped for very popular authors)"""
+    followers = _fan_out_targets(activity.user_id)
+    if not followers:
+        return 0
+    FeedEntry.objects.bulk_create([
+        FeedEntry(owner_id=follower_id, activity=activity, created_at=activity.created_at)
+        for follower_id in followers
+    ], ignore_conflicts=True, batch_size=500)
+    return len(followers)
+
+
+def record_activity(user_id, activity_type, **fields):
+    activity = Activity.objects.create(user_id=user_id, activity_type=activity_type, **fields)
+    fan_out(activity)
+    return activity
+
+
+def remove_activity(user_id, activity_types, **filters):
+    """Drop logged activities (and their feed copies) whose source was deleted"""
+    Activity.objects.filter(user_id=user_id, activity_type__in=activity_types, **filters).delete()
+
+
+def backfill(follower_id, followee_id):
+    """Seed a new follower's inbox with the followee's recent activity"""
+    if _fan_out_targets(followee_id) is None:
+        return  # merged in at read time
+    recent = Activity.objects.filter(user_id=followee_id).order_by(*LOG_ORDERING)[:settings.FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create([
+        FeedEntry(owner_id=follower_id, activity=activity, created_at=activity.created_at)
+        for activity in recent
+    ], ignore_conflicts=True)
+
+
+def unfollow(follower_id, followee_id):
+    FeedEntry.objects.filter(owner_id=follower_id, activity__user_id=followee_id).delete()
+
+
+def clear_inbox(follower_id):
+    FeedEntry.objects.filter(owner_id=follower_id).delete()
+
+
+def _read_time_authors(user):
+    """Followed users whose activity isn't fanned out"""
+    return list(
+        user.following.filter(followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS).values_list('id', flat=True)
+    )
+
+
+def get_feed(user, cursor=None, page_size=None):
+    """
+    One page of `user`'s friends feed, newest first.
+
+    Returns (activities, next_cursor).
+    """
+    page_size = page_size or settings.API_PAGE_SIZE
+    values = decode_cursor(cursor) if cursor else None
+
+    inbox = FeedEntry.objects.filter(owner=user).select_related('activity__user')
+    if values:
+        inbox = inbox.filter(keyset_filter(INBOX_ORDERING, values))
+    activities = [entry.activity for entry in inbox.order_by(*INBOX_ORDERING)[:page_size + 1]]
+
+    authors = _read_time_authors(user)
+    if authors:
+        direct = Activity.objects.filter(user_id__in=authors).select_related('user')
+        if values:
+            direct = direct.filter(keyset_filter(LOG_ORDERING, values))
+        merged = heapq.merge(
+            activities,
+            direct.order_by(*LOG_ORDERING)[:page_size + 1],
+            key=lambda a: (a.created_at, a.id),
+            reverse=True,
+        )
+        activities, seen = [], set()
+        for activity in merged:
+            if activity.id not in seen:
+                seen.add(activity.id)
+                activities.append(activity)
+
+    page = activities[:page_size]
+    next_cursor = None
+    if len(activities) > page_size:
+        next_cursor = encode_cursor([page[-1].created_at, page[-1].id])
+    return page, next_cursor
@@ -0,0 +1,210 @@
+"""
+Friend recommendations ("people with similar taste").
+
+Rather than comparing the current user against every other account, we walk
+the inverted indexes the movie app already keeps:
+
+    movie    -> reviewers   (MovieReview, indexed on movie)
+    genre    -> movies      (MovieGenre, indexed on genre, movie)
+    person   -> movies      (MovieCredit, indexed on person, role, movie)
+
+Each signal is one GROUP BY user query that only touches users sharing at
+least one movie / genre / director / actor with the current user:
+
+1. Candidate generation: the top CANDIDATES_PER_SIGNAL users of each signal.
+2. Exact scoring: the same aggregates, restricted to the candidate set.
+3. Reasons ("Both love Drama") are only worked out for the final top N.
+
+When `manage.py build_user_similarity` has run, the precomputed
+UserSimilarity neighbours are used instead and steps 1-2 are skipped.
+
+The query count is constant, so the cost depends on how much overlap there
+is rather than on how many accounts exist.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count
+
+from .models import CustomUser, UserSimilarity
+
+# Points per shared movie / genre / director / actor
+SIGNAL_WEIGHTS = {
+    'movies': 10,
+    'genres': 3,
+    'directors': 5,
+    'actors': 2,
+}
+CANDIDATES_PER_SIGNAL = 200
+
+
+def _signal_queries(user):
+    """signal name -> (MovieReview queryset of *other* users' overlapping reviews, counted column)"""
+    from movies.models import MovieCredit, MovieGenre, MovieReview
+
+    my_movies = MovieReview.objects.filter(user=user).values('movie_id')
+    others = MovieReview.objects.exclude(user=user).exclude(
+        user_id__in=user.following.values('id')
+    )
+
+    def my_people(role):
+        return MovieCredit.objects.filter(movie_id__in=my_movies, role=role).values('person_id')
+
+    return {
+        'movies': (others.filter(movie_id__in=my_movies), 'movie_id'),
+        'genres': (
+            others.filter(movie__movie_genres__genre_id__in=MovieGenre.objects.filter(
+                movie_id__in=my_movies
+            ).values('genre_id')),
+            'movie__movie_genres__genre_id',
+        ),
+        'directors': (
+            others.filter(
+                movie__credits__role='director',
+                movie__credits__person_id__in=my_people('director'),
+            ),
+            'movie__credits__person_id',
+        ),
+        'actors': (
+            others.filter(
+                movie__credits__role='actor',
+                movie__credits__person_id__in=my_people('actor'),
+            ),
+            'movie__credits__person_id',
+        ),
+    }
+
+
+def _overlap_counts(queryset, column, user_ids=None, limit=None):
+    """user_id -> number of distinct shared items"""
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    rows = queryset.values('user_id').annotate(n=Count(column, distinct=True)).order_by('-n', 'user_id')
+    if limit:
+        rows = rows[:limit]
+    return {row['user_id']: row['n'] for row in rows}
+
+
+def score_users(user, candidates_per_signal=CANDIDATES_PER_SIGNAL):
+    """
+    Return (scores, overlaps): user_id -> score, and user_id -> {signal: count}.
+    """
+    queries = _signal_queries(user)
+    candidates = set()
+    for queryset, column in queries.values():
+        candidates.update(_overlap_counts(queryset, column, limit=candidates_per_signal))
+    if not candidates:
+        return {}, {}
+
+    scores = Counter()
+    overlaps = defaultdict(dict)
+    for signal, (queryset, column) in queries.items():
+        for user_id, n in _overlap_counts(queryset, column, user_ids=candidates).items():
+            scores[user_id] += n * SIGNAL_WEIGHTS[signal]
+            overlaps[user_id][signal] = n
+    return scores, overlaps
+
+
+def _top_shared(user, user_ids):
+    """
+    For each of `user_ids`, the shared genre and director the current user
+    has reviewed most: user_id -> {'genre': name, 'director': name}.
+    """
+    from movies.models import MovieCredit, MovieGenre, MovieReview
+
+    my_movies = MovieReview.objects.filter(user=user).values('movie_id')
+    my_genres = Counter(dict(
+        MovieGenre.objects.filter(movie_id__in=my_movies).values_list('genre__name').annotate(n=Count('id'))
+    ))
+    my_directors = Counter(dict(
+        MovieCredit.objects.filter(movie_id__in=my_movies, role='director')
+        .values_list('person__name').annotate(n=Count('id'))
+    ))
+
+    shared = defaultdict(dict)
+    genre_rows = MovieReview.objects.filter(
+        user_id__in=user_ids, movie__movie_genres__genre__name__in=list(my_genres)
+    ).values_list('user_id', 'movie__movie_genres__genre__name').distinct()
+    director_rows = MovieReview.objects.filter(
+        user_id__in=user_ids,
+        movie__credits__role='director',
+        movie__credits__person__name__in=list(my_directors),
+    ).values_list('user_id', 'movie__credits__person__name').distinct()
+
+    for key, rows, counter in (('genre', genre_rows, my_genres), ('director', director_rows, my_directors)):
+        for user_id, name in rows:
+            best = shared[user_id].get(key)
+            if best is None or counter[name] > counter[best]:
+                shared[user_id][key] = name
+    return shared
+
+
+def _reasons(overlap, shared):
+    reasons = []
+    if overlap.get('movies'):
+        reasons.append(f"{overlap['movies']} movies in common")
+    if shared.get('genre'):
+        reasons.append(f"Both love {shared['genre']}")
+    if shared.get('director'):
+        reasons.append(f"Both like {shared['director']}")
+    if overlap.get('actors', 0) >= 3:
+        reasons.append(f"{overlap['actors']} favorite actors in common")
+    return reasons[:2]  # Top 2 reasons
+
+
+def precomputed_neighbours(user, limit):
+    """
+    (scores, overlaps) for the user's top neighbours from UserSimilarity
+    (see accounts.similarity), or ({}, {}) if none have been computed yet.
+    """
+    neighbours = UserSimilarity.objects.filter(user=user).exclude(
+        neighbor_id__in=user.following.values('id')
+    ).order_by('-score').values_list('neighbor_id', 'score')[:limit]
+    scores = Counter({neighbor_id: round(score * 100) for neighbor_id, score in neighbours})
+    if not scores:
+        return {}, {}
+
+    overlaps = defaultdict(dict)
+    for signal, (queryset, column) in _signal_queries(user).items():
+        for user_id, n in _overlap_counts(queryset, column, user_ids=list(scores)).items():
+            overlaps[user_id][signal] = n
+    return scores, overlaps
+
+
+def recommend_friends(user, limit=20):
+    """Top `limit` users with similar taste, as response dicts"""
+    scores, overlaps = precomputed_neighbours(user, limit)
+    if not scores:
+        scores, overlaps = score_users(user)
+    top = [user_id for user_id, score in scores.most_common(limit) if score > 0]
+    if not top:
+        return []
+
+    users = CustomUser.objects.in_bulk(top)
+    shared = _top_shared(user, top)
+    recommendations = []
+    for user_id in top:
+        reasons = _reasons(overlaps.get(user_id, {}), shared.get(user_id, {}))
+        recommendations.append({
+            'username': users[user_id].username,
+            'bio': users[user_id].bio,
+            'reason': ' • '.join(reasons) if reasons else 'Similar taste',
+            'score': scores[user_id],
+            'is_following': False,
+        })
+    return recommendations
+
+
+def popular_users(user, limit=10):
+    """Most-followed users the current user doesn't follow yet (for new accounts)"""
+    users = CustomUser.objects.exclude(
+        id=user.id
+    ).exclude(
+        id__in=user.following.values('id')
+    ).order_by('-followers_count', 'id')[:limit]
+    return [{
+        'username': u.username,
+        'bio': u.bio,
+        'reason': f'{u.followers_count} followers',
+        'score': u.followers_count,
+        'is_following': False,
+    } for u in users]
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.similarity import rebuild_all, refresh_pending
+
+
+class Command(BaseCommand):
+    help = 'Precompute each user\'s most similar users (by movie ratings) for friend recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only refresh users whose reviews changed since the last run',
+        )
+        parser.add_argument(
+            '--neighbours', type=int, default=settings.USER_SIMILARITY_NEIGHBOURS,
+            help='Neighbours kept per user',
+        )
+        parser.add_argument(
+            '--metric', choices=['cosine', 'pearson'], default=settings.USER_SIMILARITY_METRIC,
+        )
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users per matrix block (full rebuild)')
+
+    def handle(self, *args, **options):
+        if options['incremental']:
+            refreshed = refresh_pending(k=options['neighbours'], metric=options['metric'])
+            self.stdout.write(self.style.SUCCESS(f"Refreshed neighbours of {refreshed} users"))
+            return
+
+        stored = rebuild_all(k=options['neighbours'], metric=options['metric'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Stored {stored} user similarity rows"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from accounts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the follower/following/review/watched counters on user profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many users are off')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = reconcile(dry_run=options['dry_run'], batch_size=options['batch_size'])
+        if options['dry_run']:
+            self.stdout.write(f"{fixed} users have stale counters")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed counters of {fixed} users"))
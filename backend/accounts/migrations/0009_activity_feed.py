@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_user_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_type', models.CharField(choices=[('watched', 'Watched Movie'), ('want_to_watch', 'Wants to Watch'), ('rated', 'Rated Movie'), ('reviewed', 'Reviewed Movie'), ('loved', 'Loved Movie'), ('liked', 'Liked Movie'), ('liked_song', 'Liked Song')], max_length=20)),
+                ('movie_id', models.CharField(blank=True, max_length=20, null=True)),
+                ('movie_title', models.CharField(blank=True, max_length=255)),
+                ('movie_poster', models.URLField(blank=True)),
+                ('rating', models.IntegerField(blank=True, null=True)),
+                ('review_text', models.TextField(blank=True)),
+                ('song_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('song_name', models.CharField(blank=True, max_length=255)),
+                ('song_artist', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'user_activities',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='accounts.activity')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='user_activi_user_id_1c7daf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', 'movie_id'], name='user_activi_user_id_cb1240_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['owner', '-created_at', '-activity'], name='accounts_fe_owner_i_dee216_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='feedentry',
+            unique_together={('owner', 'activity')},
+        ),
+    ]
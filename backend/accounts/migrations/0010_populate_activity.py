@@ -0,0 +1,88 @@
+from django.db import migrations
+
+# Mirrors accounts.feed at the time of writing
+INTERACTION_ACTIVITY = {
+    'watched': 'watched',
+    'want_to_watch': 'want_to_watch',
+    'like': 'liked',
+    'love': 'loved',
+}
+FANOUT_MAX_FOLLOWERS = 1000
+
+
+def populate(apps, schema_editor):
+    Activity = apps.get_model('accounts', 'Activity')
+    FeedEntry = apps.get_model('accounts', 'FeedEntry')
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    MovieReview = apps.get_model('movies', 'MovieReview')
+    UserMovieInteraction = apps.get_model('movies', 'UserMovieInteraction')
+    LikedSong = apps.get_model('music', 'LikedSong')
+
+    activities = []
+    reviewed = set()
+    for review in MovieReview.objects.select_related('movie').iterator():
+        reviewed.add((review.user_id, review.movie_id))
+        activities.append(Activity(
+            user_id=review.user_id,
+            activity_type='reviewed' if review.review_text else 'rated',
+            movie_id=review.movie_id,
+            movie_title=review.movie.title,
+            movie_poster=review.movie.poster,
+            rating=review.rating,
+            review_text=review.review_text,
+            created_at=review.created_at,
+        ))
+    for interaction in UserMovieInteraction.objects.select_related('movie').iterator():
+        activity_type = INTERACTION_ACTIVITY.get(interaction.interaction_type)
+        if not activity_type or (activity_type == 'watched' and (interaction.user_id, interaction.movie_id) in reviewed):
+            continue
+        activities.append(Activity(
+            user_id=interaction.user_id,
+            activity_type=activity_type,
+            movie_id=interaction.movie_id,
+            movie_title=interaction.movie.title,
+            movie_poster=interaction.movie.poster,
+            created_at=interaction.created_at,
+        ))
+    for song in LikedSong.objects.iterator():
+        activities.append(Activity(
+            user_id=song.user_id,
+            activity_type='liked_song',
+            song_id=song.spotify_track_id,
+            song_name=song.track_name,
+            song_artist=song.artist_name,
+            created_at=song.liked_at,
+        ))
+
+    # created_at is auto_now_add, so restore the original timestamps afterwards
+    timestamps = [a.created_at for a in activities]
+    Activity.objects.bulk_create(activities, batch_size=1000)
+    for activity, created_at in zip(activities, timestamps):
+        activity.created_at = created_at
+    Activity.objects.bulk_update(activities, ['created_at'], batch_size=1000)
+
+    followers = {}
+    for follower_id, followee_id in CustomUser.following.through.objects.values_list(
+        'from_customuser_id', 'to_customuser_id'
+    ):
+        followers.setdefault(followee_id, []).append(follower_id)
+    entries = [
+        FeedEntry(owner_id=follower_id, activity_id=activity.id, created_at=activity.created_at)
+        for activity in activities
+        if len(followers.get(activity.user_id, ())) <= FANOUT_MAX_FOLLOWERS
+        for follower_id in followers.get(activity.user_id, ())
+    ]
+    FeedEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_activity_feed'),
+        ('movies', '0013_similarmovie'),
+        ('music', '0002_likedsong_album_image_url_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_populate_activity'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='reviews_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='watched_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['-followers_count', 'id'], name='user_followers_count_idx'),
+        ),
+    ]
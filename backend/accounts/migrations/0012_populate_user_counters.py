@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, column):
+    counted = queryset.filter(**{column: OuterRef('pk')}).order_by().values(column).annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+def populate(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    MovieReview = apps.get_model('movies', 'MovieReview')
+    UserMovieInteraction = apps.get_model('movies', 'UserMovieInteraction')
+    Follow = CustomUser.following.through
+
+    CustomUser.objects.update(
+        followers_count=_count(Follow.objects.all(), 'to_customuser'),
+        following_count=_count(Follow.objects.all(), 'from_customuser'),
+        reviews_count=_count(MovieReview.objects.all(), 'user'),
+        watched_count=_count(UserMovieInteraction.objects.filter(interaction_type='watched'), 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_user_counters'),
+        ('movies', '0013_similarmovie'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
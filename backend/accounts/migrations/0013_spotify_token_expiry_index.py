@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_populate_user_counters'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['spotify_token_expires'], name='user_spotify_expiry_idx'),
+        ),
+    ]
@@ -20,6 +20,19 @@ class CustomUser(AbstractUser):
     updated_at = models.DateTimeField(auto_now=True)
     # Social features
     following = models.ManyToManyField('self', symmetrical=False, related_name='followers', blank=True)
+    # Profile counters, maintained by accounts.signals (`manage.py reconcile_user_counters` repairs drift)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    reviews_count = models.IntegerField(default=0)
+    watched_count = models.IntegerField(default=0)
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # "Suggested users" / popular-user fallback
+            models.Index(fields=['-followers_count', 'id'], name='user_followers_count_idx'),
+            # `refresh_spotify_tokens` sweep
+            models.Index(fields=['spotify_token_expires'], name='user_spotify_expiry_idx'),
+        ]
     
     def __str__(self):
         return self.username
@@ -68,3 +81,83 @@ class ModerationQueue(models.Model):
 
     class Meta:
         db_table = 'moderation_queue'
+
+
+class UserSimilarity(models.Model):
+    """
+    Precomputed taste neighbours: the top-K users whose movie ratings are
+    most similar to `user`'s. Built by `manage.py build_user_similarity`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='similar_users')
+    neighbor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'neighbor']
+        indexes = [
+            models.Index(fields=['user', '-score']),
+            models.Index(fields=['neighbor']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} ~ {self.neighbor_id} ({self.score:.3f})"
+
+
+class PendingSimilarityUpdate(models.Model):
+    """Users whose reviews changed since their neighbours were last computed"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True)
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+
+class Activity(models.Model):
+    """
+    Append-only log of what users do (written by accounts.signals). Follower
+    feeds are materialized from it into FeedEntry; see accounts.feed.
+    """
+    ACTIVITY_TYPES = [
+        ('watched', 'Watched Movie'),
+        ('want_to_watch', 'Wants to Watch'),
+        ('rated', 'Rated Movie'),
+        ('reviewed', 'Reviewed Movie'),
+        ('loved', 'Loved Movie'),
+        ('liked', 'Liked Movie'),
+        ('liked_song', 'Liked Song'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activities')
+    activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPES)
+    # Copied from the movie / song so feeds render without joins
+    movie_id = models.CharField(max_length=20, blank=True, null=True)
+    movie_title = models.CharField(max_length=255, blank=True)
+    movie_poster = models.URLField(blank=True)
+    rating = models.IntegerField(blank=True, null=True)
+    review_text = models.TextField(blank=True)
+    song_id = models.CharField(max_length=100, blank=True, null=True)
+    song_name = models.CharField(max_length=255, blank=True)
+    song_artist = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'user_activities'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),
+            models.Index(fields=['user', 'movie_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.activity_type} {self.movie_title or self.song_name}"
+
+
+class FeedEntry(models.Model):
+    """One activity in one follower's feed inbox (fan-out on write)"""
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='feed_entries')
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='feed_entries')
+    created_at = models.DateTimeField()  # copy of activity.created_at, so the feed is a single index range
+
+    class Meta:
+        unique_together = ['owner', 'activity']
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-activity']),
+        ]
@@ -0,0 +1,136 @@
+"""
+Per-user cache for the recommendation endpoints.
+
+Recommendations only change when the user (or someone they follow) reviews,
+interacts with a movie, likes a song or follows someone. accounts.signals
+bumps the acting user's version counter on those writes (one cache write,
+however many followers they have). Followers pick the change up at read
+time: a cached response remembers a signature of the user's own version,
+the set of people they follow and each of those people's versions, and is
+fresh only while that signature still matches.
+
+Counters are created with `cache.add` and bumped with `cache.incr`. They
+start from a clock value rather than 0, so a counter that was evicted and
+recreated can never land back on a version an old entry remembers; a
+missing counter is part of the signature too.
+
+Requests are served with stale-while-revalidate:
+
+- same version and younger than RECOMMENDATION_CACHE_TTL: served as is
+- otherwise, if younger than RECOMMENDATION_CACHE_MAX_STALE: the cached copy
+  is served at once and a background thread recomputes it
+- nothing cached (or too old): computed in the request
+"""
+import functools
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.response import Response
+
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+Follow = CustomUser.following.through
+
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _version_key(user_id):
+    return f'recs:version:{user_id}'
+
+
+def _entry_key(endpoint, user_id):
+    return f'recs:{endpoint}:{user_id}'
+
+
+def bump_version(user_id):
+    """Invalidate every cached recommendation that depends on `user_id`'s activity"""
+    key = _version_key(user_id)
+    if cache.add(key, time.time_ns(), timeout=None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def get_signature(user_id):
+    """Fingerprint of everything `user_id`'s recommendations depend on"""
+    followee_ids = sorted(Follow.objects.filter(from_customuser_id=user_id).values_list('to_customuser_id', flat=True))
+    keys = [_version_key(user_id)] + [_version_key(followee_id) for followee_id in followee_ids]
+    versions = cache.get_many(keys)
+    return hashlib.sha1(repr([(key, versions.get(key)) for key in keys]).encode()).hexdigest()
+
+
+def _compute(view_func, endpoint, request):
+    user_id = request.user.id
+    signature = get_signature(user_id)
+    response = view_func(request)
+    # Partial answers (an upstream ran out of time) aren't worth keeping
+    if response.status_code == 200 and not response.data.get('partial'):
+        cache.set(_entry_key(endpoint, user_id), {
+            'data': response.data,
+            'signature': signature,
+            'computed_at': time.time(),
+        }, timeout=settings.RECOMMENDATION_CACHE_MAX_STALE)
+    return response
+
+
+def _revalidate_in_background(view_func, endpoint, request):
+    key = _entry_key(endpoint, request.user.id)
+    try:
+        _compute(view_func, endpoint, request)
+    except Exception as e:
+        logger.warning('Recomputing %s failed: %s', key, e)
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(key)
+        # Threads get their own DB connection; don't leak it
+        connection.close()
+
+
+def _revalidate_async(view_func, endpoint, request):
+    key = _entry_key(endpoint, request.user.id)
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+    threading.Thread(
+        target=_revalidate_in_background, args=(view_func, endpoint, request), daemon=True
+    ).start()
+
+
+def cached_recommendations(endpoint):
+    """
+    Cache a recommendation view per user (put it below @api_view).
+
+    Sets an `X-Recommendation-Cache: hit | stale | miss` header.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            entry = cache.get(_entry_key(endpoint, request.user.id))
+            if entry is None:
+                response = _compute(view_func, endpoint, request)
+                response['X-Recommendation-Cache'] = 'miss'
+                return response
+
+            fresh = (
+                entry.get('signature') == get_signature(request.user.id)
+                and time.time() - entry['computed_at'] < settings.RECOMMENDATION_CACHE_TTL
+            )
+            if not fresh:
+                _revalidate_async(view_func, endpoint, request)
+            response = Response(entry['data'])
+            response['X-Recommendation-Cache'] = 'hit' if fresh else 'stale'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,188 @@
+"""
+Reacts to reviews, movie interactions, liked songs and follows:
+
+- queues review authors for a similarity refresh (accounts.similarity)
+- bumps the recommendation cache version (accounts.rec_cache) of the acting
+  user; followers notice it when they read their recommendations
+- appends to the activity log and fans it out to followers (accounts.feed)
+- keeps the profile counters on CustomUser in step (accounts.counters)
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from movies.models import MovieReview, UserMovieInteraction
+from music.models import LikedSong
+
+from . import counters, feed, rec_cache
+from .models import CustomUser, PendingSimilarityUpdate
+
+
+def queue_similarity_update(user_id):
+    """Mark a user for `build_user_similarity --incremental` (after the write commits)"""
+    def queue():
+        # The review may have gone with its user (cascade delete)
+        if CustomUser.objects.filter(id=user_id).exists():
+            PendingSimilarityUpdate.objects.bulk_create(
+                [PendingSimilarityUpdate(user_id=user_id)],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['queued_at'],
+            )
+    transaction.on_commit(queue)
+
+
+def invalidate_recommendations(user_id):
+    """Expire the cached recommendations of a user and their followers (after the write commits)"""
+    transaction.on_commit(lambda: rec_cache.bump_version(user_id))
+
+
+@receiver(post_save, sender=MovieReview)
+@receiver(post_delete, sender=MovieReview)
+def review_changed(sender, instance, **kwargs):
+    queue_similarity_update(instance.user_id)
+    invalidate_recommendations(instance.user_id)
+
+
+@receiver(post_save, sender=UserMovieInteraction)
+@receiver(post_delete, sender=UserMovieInteraction)
+@receiver(post_save, sender=LikedSong)
+@receiver(post_delete, sender=LikedSong)
+def activity_changed(sender, instance, **kwargs):
+    invalidate_recommendations(instance.user_id)
+
+
+@receiver(m2m_changed, sender=CustomUser.following.through)
+def following_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # Cached recommendations need nothing here: their signature covers who the
+    # user follows (accounts.rec_cache). Keep the followers' feed inboxes in step;
+    # `reverse` means `instance` is the one being followed
+    if not reverse:
+        followers = [instance.pk]
+    elif pk_set:
+        followers = list(pk_set)
+    else:
+        return  # clear() from the followed side doesn't say who was removed
+    if action == 'post_clear':
+        feed.clear_inbox(instance.pk)
+        return
+    followees = [instance.pk] if reverse else list(pk_set or ())
+    for follower_id in followers:
+        for followee_id in followees:
+            if action == 'post_add':
+                feed.backfill(follower_id, followee_id)
+            else:
+                feed.unfollow(follower_id, followee_id)
+
+
+# ============= ACTIVITY LOG =============
+
+def _movie_fields(movie):
+    return {'movie_id': movie.imdb_id, 'movie_title': movie.title, 'movie_poster': movie.poster}
+
+
+@receiver(post_save, sender=MovieReview)
+def log_review(sender, instance, created, **kwargs):
+    if not created:
+        return
+    activity_type = 'reviewed' if instance.review_text else 'rated'
+    fields = {
+        **_movie_fields(instance.movie),
+        'rating': instance.rating,
+        'review_text': instance.review_text,
+    }
+    
+    def record():
+        # Reviewing marks the movie watched; the review supersedes that entry
+        feed.remove_activity(instance.user_id, ['watched'], movie_id=instance.movie_id)
+        feed.record_activity(instance.user_id, activity_type, **fields)
+    transaction.on_commit(record)
+
+
+@receiver(post_delete, sender=MovieReview)
+def unlog_review(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: feed.remove_activity(instance.user_id, feed.REVIEW_ACTIVITIES, movie_id=instance.movie_id)
+    )
+
+
+@receiver(post_save, sender=UserMovieInteraction)
+def log_interaction(sender, instance, created, **kwargs):
+    activity_type = feed.INTERACTION_ACTIVITY.get(instance.interaction_type)
+    if not created or not activity_type:
+        return
+    fields = _movie_fields(instance.movie)
+    transaction.on_commit(lambda: feed.record_activity(instance.user_id, activity_type, **fields))
+
+
+@receiver(post_delete, sender=UserMovieInteraction)
+def unlog_interaction(sender, instance, **kwargs):
+    activity_type = feed.INTERACTION_ACTIVITY.get(instance.interaction_type)
+    if activity_type:
+        transaction.on_commit(
+            lambda: feed.remove_activity(instance.user_id, [activity_type], movie_id=instance.movie_id)
+        )
+
+
+@receiver(post_save, sender=LikedSong)
+def log_liked_song(sender, instance, created, **kwargs):
+    if not created:
+        return
+    fields = {'song_id': instance.spotify_track_id, 'song_name': instance.track_name, 'song_artist': instance.artist_name}
+    transaction.on_commit(lambda: feed.record_activity(instance.user_id, 'liked_song', **fields))
+
+
+@receiver(post_delete, sender=LikedSong)
+def unlog_liked_song(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: feed.remove_activity(instance.user_id, ['liked_song'], song_id=instance.spotify_track_id)
+    )
+
+
+# ============= PROFILE COUNTERS =============
+
+@receiver(m2m_changed, sender=CustomUser.following.through)
+def follow_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    # `instance` follows the users in pk_set, or (reverse) is followed by them.
+    # Follow counts are recounted rather than adjusted: two requests adding the
+    # same follow at once both report it in pk_set, but only one row lands
+    own_field, other_field = ('followers_count', 'following_count') if reverse else ('following_count', 'followers_count')
+    if action == 'pre_clear':
+        # clear() doesn't say who was removed, so look them up before they go
+        own_column, other_column = ('to_customuser_id', 'from_customuser_id') if reverse else ('from_customuser_id', 'to_customuser_id')
+        follows = sender.objects.filter(**{own_column: instance.pk})
+        instance._cleared_follows = list(follows.values_list(other_column, flat=True))
+        return
+    if action in ('post_add', 'post_remove'):
+        changed = list(pk_set)
+    elif action == 'post_clear':
+        changed = instance.__dict__.pop('_cleared_follows', [])
+    else:
+        return
+    counters.recount([instance.pk], [own_field])
+    counters.recount(changed, [other_field])
+
+
+@receiver(post_save, sender=MovieReview)
+def count_review(sender, instance, created, **kwargs):
+    if created:
+        counters.apply_delta([instance.user_id], 'reviews_count', 1)
+
+
+@receiver(post_delete, sender=MovieReview)
+def uncount_review(sender, instance, **kwargs):
+    counters.apply_delta([instance.user_id], 'reviews_count', -1)
+
+
+@receiver(post_save, sender=UserMovieInteraction)
+def count_watched(sender, instance, created, **kwargs):
+    if created and instance.interaction_type == 'watched':
+        counters.apply_delta([instance.user_id], 'watched_count', 1)
+
+
+@receiver(post_delete, sender=UserMovieInteraction)
+def uncount_watched(sender, instance, **kwargs):
+    if instance.interaction_type == 'watched':
+        counters.apply_delta([instance.user_id], 'watched_count', -1)
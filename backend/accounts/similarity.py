@@ -0,0 +1,171 @@
+"""
+Offline user-user taste similarity.
+
+Every user's reviews are turned into a sparse rating vector over the movie
+catalog (a users x movies CSR matrix). The rows are L2-normalised, so the
+product X @ X.T holds the cosine similarity of every pair of users. With the
+"pearson" metric each row is mean-centred first.
+
+The product is computed one block of rows at a time and only the top
+USER_SIMILARITY_NEIGHBOURS of each row are kept in UserSimilarity, so friend
+recommendations become an indexed lookup.
+
+- `rebuild_all()` recomputes every row. Run it nightly. Each block of users
+  is written as soon as it's computed, so memory stays at one block's worth
+  of neighbours.
+- `refresh_pending()` only recomputes the users queued in
+  PendingSimilarityUpdate by the review signals. It builds the rating matrix
+  once per run and reuses it for every batch of the queue. It rewrites their
+  own neighbour lists and updates their score in other users' existing lists.
+  Users who should newly gain them as a neighbour are picked up by the next
+  full rebuild.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .models import PendingSimilarityUpdate, UserSimilarity
+
+WRITE_BATCH_SIZE = 1000
+
+
+def build_rating_matrix(metric='cosine'):
+    """
+    Return (X, user_ids): row-normalised users x movies CSR matrix and the
+    user id of each row.
+    """
+    from movies.models import MovieReview
+
+    rows = list(MovieReview.objects.values_list('user_id', 'movie_id', 'rating').iterator())
+    if not rows:
+        return sparse.csr_matrix((0, 0), dtype=np.float32), np.array([], dtype=np.int64)
+
+    user_col, movie_col, ratings = zip(*rows)
+    user_ids, user_idx = np.unique(np.array(user_col, dtype=np.int64), return_inverse=True)
+    _, movie_idx = np.unique(np.array(movie_col, dtype=object), return_inverse=True)
+    X = sparse.csr_matrix(
+        (np.array(ratings, dtype=np.float32), (user_idx, movie_idx)),
+        shape=(len(user_ids), movie_idx.max() + 1),
+    )
+    X.sum_duplicates()
+
+    if metric == 'pearson':
+        counts = np.diff(X.indptr)
+        means = np.asarray(X.sum(axis=1)).ravel() / np.maximum(counts, 1)
+        X.data -= np.repeat(means, counts).astype(np.float32)
+        X.eliminate_zeros()
+
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(inverse.astype(np.float32)) @ X, user_ids
+
+
+def _top_k(row, self_index, k):
+    """(column indices, scores) of the `k` best positive entries of a sparse row"""
+    mask = (row.indices != self_index) & (row.data > 0)
+    indices, scores = row.indices[mask], row.data[mask]
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        indices, scores = indices[keep], scores[keep]
+    order = np.argsort(-scores, kind='stable')
+    return indices[order], scores[order]
+
+
+def _neighbour_rows(X, user_ids, row_indices, k):
+    """UserSimilarity instances for the given matrix rows"""
+    objs = []
+    block = X[row_indices] @ X.T
+    for offset, i in enumerate(row_indices):
+        indices, scores = _top_k(block.getrow(offset), i, k)
+        objs += [
+            UserSimilarity(user_id=int(user_ids[i]), neighbor_id=int(user_ids[j]), score=float(s))
+            for j, s in zip(indices, scores)
+        ]
+    return objs
+
+
+def rebuild_all(k=None, metric=None, chunk_size=500):
+    """Recompute every user's neighbours. Returns the number of rows stored."""
+    k = k or settings.USER_SIMILARITY_NEIGHBOURS
+    started = timezone.now()
+    X, user_ids = build_rating_matrix(metric or settings.USER_SIMILARITY_METRIC)
+
+    stored = 0
+    for start in range(0, len(user_ids), chunk_size):
+        rows = np.arange(start, min(start + chunk_size, len(user_ids)))
+        objs = _neighbour_rows(X, user_ids, rows, k)
+        # Each block replaces its users' lists in one transaction; readers never see a user half-written
+        with transaction.atomic():
+            UserSimilarity.objects.filter(user_id__in=[int(user_ids[i]) for i in rows]).delete()
+            UserSimilarity.objects.bulk_create(objs, batch_size=WRITE_BATCH_SIZE)
+        stored += len(objs)
+
+    with transaction.atomic():
+        # Users with no reviews left (auto_now marks every row written above)
+        UserSimilarity.objects.filter(updated_at__lt=started).delete()
+        PendingSimilarityUpdate.objects.filter(queued_at__lte=started).delete()
+    return stored
+
+
+def refresh_users(users, k=None, metric=None, matrix=None):
+    """
+    Recompute the neighbours of `users` (ids) against everyone else.
+
+    `matrix` is a prebuilt `build_rating_matrix()` result to reuse.
+    """
+    k = k or settings.USER_SIMILARITY_NEIGHBOURS
+    users = set(users)
+    if not users:
+        return 0
+    X, user_ids = matrix or build_rating_matrix(metric or settings.USER_SIMILARITY_METRIC)
+    position = {int(uid): i for i, uid in enumerate(user_ids)}
+    rows = [position[uid] for uid in users if uid in position]
+
+    objs = _neighbour_rows(X, user_ids, rows, k) if rows else []
+
+    # Their score as somebody else's neighbour changed too
+    reverse = list(UserSimilarity.objects.filter(neighbor_id__in=users).exclude(user_id__in=users))
+    updated, dropped = [], []
+    now = timezone.now()
+    if reverse and rows:
+        block = X[rows] @ X.T
+        row_of = {int(user_ids[i]): offset for offset, i in enumerate(rows)}
+        for sim in reverse:
+            offset, j = row_of.get(sim.neighbor_id), position.get(sim.user_id)
+            score = float(block[offset, j]) if offset is not None and j is not None else 0.0
+            if score > 0:
+                sim.score, sim.updated_at = score, now
+                updated.append(sim)
+            else:
+                dropped.append(sim.pk)
+    else:
+        dropped = [sim.pk for sim in reverse]
+
+    with transaction.atomic():
+        UserSimilarity.objects.filter(user_id__in=users).delete()
+        UserSimilarity.objects.bulk_create(objs, batch_size=WRITE_BATCH_SIZE)
+        UserSimilarity.objects.bulk_update(updated, ['score', 'updated_at'], batch_size=WRITE_BATCH_SIZE)
+        UserSimilarity.objects.filter(pk__in=dropped).delete()
+    return len(objs)
+
+
+def refresh_pending(batch_size=500, k=None, metric=None):
+    """Drain PendingSimilarityUpdate. Returns the number of users refreshed."""
+    started = timezone.now()
+    queue = PendingSimilarityUpdate.objects.filter(queued_at__lte=started)
+    if not queue.exists():
+        return 0
+    # One matrix for the whole run; users re-queued after this point wait for the next run
+    matrix = build_rating_matrix(metric or settings.USER_SIMILARITY_METRIC)
+    total = 0
+    while True:
+        pending = list(queue.order_by('queued_at').values_list('user_id', 'queued_at')[:batch_size])
+        if not pending:
+            return total
+        refresh_users([user_id for user_id, _ in pending], k=k, matrix=matrix)
+        for user_id, queued_at in pending:
+            # A review written while we were computing re-queues the user
+            PendingSimilarityUpdate.objects.filter(user_id=user_id, queued_at=queued_at).delete()
+        total += len(pending)
@@ -1,3 +1,370 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from scipy import sparse
+
+from movies import catalog
+from movies.models import Movie, MovieReview, UserMovieInteraction
+from music.models import LikedSong
+from tunr_backend.pagination import encode_cursor
+
+from . import feed, friend_recs, rec_cache, signals, similarity, timeline
+from .models import Activity, CustomUser, FeedEntry, PendingSimilarityUpdate, UserSimilarity
+
+
+Follow = CustomUser.following.through
+
+
+def _user(username):
+    return CustomUser.objects.create(username=username, email=f'{username}@example.com')
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTests(TestCase):
+    def setUp(self):
+        self.author = _user('author')
+        self.reader = _user('reader')
+        self.reader.following.add(self.author)
+
+    def _like_song(self, user, track_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            return LikedSong.objects.create(user=user, spotify_track_id=track_id, track_name=track_id, artist_name='x')
+
+    def _feed_ids(self, user, page_size=10):
+        ids, cursor = [], None
+        while True:
+            page, cursor = feed.get_feed(user, cursor=cursor, page_size=page_size)
+            ids += [activity.id for activity in page]
+            if not cursor:
+                return ids
+
+    def test_activity_is_fanned_out_to_followers(self):
+        self._like_song(self.author, 'song-1')
+        self.assertTrue(FeedEntry.objects.filter(owner=self.reader).exists())
+        self.assertEqual(len(self._feed_ids(self.reader)), 1)
+
+    def test_popular_authors_are_merged_at_read_time(self):
+        _user('fan').following.add(self.author)
+        self._like_song(self.author, 'song-1')
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(len(self._feed_ids(self.reader)), 1)
+
+    def test_author_crossing_the_threshold_is_not_shown_twice(self):
+        for n in range(3):
+            self._like_song(self.author, f'song-{n}')
+        # Now popular: the fanned-out copies are also read from the log
+        _user('fan').following.add(self.author)
+        self._like_song(self.author, 'song-3')
+        ids = self._feed_ids(self.reader, page_size=2)
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(len(set(ids)), 4)
+
+    def test_unlog_waits_for_the_commit(self):
+        song = self._like_song(self.author, 'song-1')
+        with self.captureOnCommitCallbacks() as callbacks:
+            song.delete()
+            self.assertTrue(Activity.objects.filter(song_id='song-1').exists())
+        for callback in callbacks:
+            callback()
+        self.assertFalse(Activity.objects.filter(song_id='song-1').exists())
+
+
+class RecommendationCacheTests(TestCase):
+    def setUp(self):
+        self.reader = _user('reader')
+        self.author = _user('author')
+        self.calls = 0
+
+        @rec_cache.cached_recommendations('test')
+        def view(request):
+            self.calls += 1
+            return Response({'calls': self.calls})
+
+        self.view = view
+
+    def _get(self):
+        response = self.view(SimpleNamespace(user=self.reader))
+        return response['X-Recommendation-Cache']
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self._get(), 'miss')
+        self.assertEqual(self._get(), 'hit')
+        self.assertEqual(self.calls, 1)
+
+    @mock.patch.object(rec_cache, '_revalidate_async')
+    def test_expired_entry_is_served_stale_and_revalidated(self, revalidate_async):
+        self._get()
+        with override_settings(RECOMMENDATION_CACHE_TTL=0):
+            self.assertEqual(self._get(), 'stale')
+        revalidate_async.assert_called_once()
+        self.assertEqual(self.calls, 1)
+
+    @mock.patch.object(rec_cache, '_revalidate_async')
+    def test_followee_review_invalidates_followers(self, revalidate_async):
+        self.reader.following.add(self.author)
+        self._get()
+        self.assertEqual(self._get(), 'hit')
+        movie = Movie.objects.create(imdb_id='tt0000001', title='Arrival')
+        with self.captureOnCommitCallbacks(execute=True):
+            MovieReview.objects.create(user=self.author, movie=movie, rating=5)
+        self.assertEqual(self._get(), 'stale')
+
+    @mock.patch.object(rec_cache, '_revalidate_async')
+    def test_follow_invalidates_the_follower(self, revalidate_async):
+        self._get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.following.add(self.author)
+        self.assertEqual(self._get(), 'stale')
+
+    @mock.patch.object(rec_cache, '_revalidate_async')
+    def test_evicted_version_never_revalidates_an_old_entry(self, revalidate_async):
+        rec_cache.bump_version(self.reader.id)
+        self._get()
+        rec_cache.cache.delete(rec_cache._version_key(self.reader.id))
+        self.assertEqual(self._get(), 'stale')
+        rec_cache.bump_version(self.reader.id)
+        self.assertEqual(self._get(), 'stale')
+
+
+class UserSimilarityTests(TestCase):
+    def setUp(self):
+        self.movies = [Movie.objects.create(imdb_id=f'tt000000{n}', title=f'Movie {n}') for n in (1, 2)]
+        # a and b agree; c rates the same movies the other way round
+        self.a, self.b, self.c = (_user(name) for name in 'abc')
+        for user, ratings in ((self.a, (5, 1)), (self.b, (5, 1)), (self.c, (1, 5))):
+            for movie, rating in zip(self.movies, ratings):
+                MovieReview.objects.create(user=user, movie=movie, rating=rating)
+
+    def _neighbours(self, user):
+        return set(UserSimilarity.objects.filter(user=user).values_list('neighbor__username', flat=True))
+
+    def test_top_k_skips_self_and_non_positive_scores(self):
+        row = sparse.csr_matrix(np.array([[0.9, 0.5, -0.2, 0.7, 0.1]], dtype=np.float32)).getrow(0)
+        indices, scores = similarity._top_k(row, self_index=0, k=2)
+        self.assertEqual(list(indices), [3, 1])
+        np.testing.assert_allclose(scores, [0.7, 0.5])
+
+    def test_cosine_counts_opposite_tastes_pearson_does_not(self):
+        similarity.rebuild_all(k=5, metric='cosine')
+        self.assertEqual(self._neighbours(self.a), {'b', 'c'})
+        similarity.rebuild_all(k=5, metric='pearson')
+        self.assertEqual(self._neighbours(self.a), {'b'})
+
+    def test_rebuild_drops_users_without_reviews(self):
+        similarity.rebuild_all(k=5, metric='cosine')
+        MovieReview.objects.filter(user=self.c).delete()
+        similarity.rebuild_all(k=5, metric='cosine')
+        self.assertFalse(UserSimilarity.objects.filter(user=self.c).exists())
+        self.assertEqual(self._neighbours(self.a), {'b'})
+
+    def test_refresh_pending_builds_the_matrix_once(self):
+        similarity.rebuild_all(k=5, metric='cosine')
+        MovieReview.objects.filter(user=self.c, movie=self.movies[0]).update(rating=5)
+        MovieReview.objects.filter(user=self.c, movie=self.movies[1]).update(rating=1)
+        PendingSimilarityUpdate.objects.bulk_create([PendingSimilarityUpdate(user=u) for u in (self.a, self.c)])
+
+        with mock.patch.object(similarity, 'build_rating_matrix', wraps=similarity.build_rating_matrix) as build:
+            self.assertEqual(similarity.refresh_pending(batch_size=1, k=5, metric='cosine'), 2)
+        self.assertEqual(build.call_count, 1)
+        self.assertFalse(PendingSimilarityUpdate.objects.exists())
+        score = UserSimilarity.objects.get(user=self.a, neighbor=self.c).score
+        self.assertAlmostEqual(score, 1.0, places=5)
+        # b wasn't queued, but its score for c was updated in place
+        self.assertAlmostEqual(UserSimilarity.objects.get(user=self.b, neighbor=self.c).score, 1.0, places=5)
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.user = _user('viewer')
+        movies = [Movie.objects.create(imdb_id=f'tt000000{n}', title=f'Movie {n}') for n in range(6)]
+        # 0: reviewed (and so watched) and liked -> one "rated" entry
+        MovieReview.objects.create(user=self.user, movie=movies[0], rating=4)
+        UserMovieInteraction.objects.create(user=self.user, movie=movies[0], interaction_type='like')
+        # 1: watched and loved -> one "watched" entry
+        for kind in ('watched', 'love'):
+            UserMovieInteraction.objects.create(user=self.user, movie=movies[1], interaction_type=kind)
+        # 2: liked and loved -> one "liked" entry (the love)
+        for kind in ('like', 'love'):
+            UserMovieInteraction.objects.create(user=self.user, movie=movies[2], interaction_type=kind)
+        # 3-5: plain watched, so the watched source is longer than one page
+        for movie in movies[3:]:
+            UserMovieInteraction.objects.create(user=self.user, movie=movie, interaction_type='watched')
+        self.expected = {movie.imdb_id for movie in movies}
+
+    def _walk(self, page_size):
+        movies, cursor = [], None
+        while True:
+            items, cursor = timeline.get_timeline(self.user, cursor=cursor, page_size=page_size)
+            movies += [row.movie_id for _, row in items]
+            if cursor is None:
+                return movies
+
+    def test_each_movie_once_across_pages(self):
+        for page_size in (1, 2, 3, 50):
+            with self.subTest(page_size=page_size):
+                movies = self._walk(page_size)
+                self.assertEqual(len(movies), len(set(movies)))
+                self.assertEqual(set(movies), self.expected)
+
+    def test_each_movie_once_with_tied_timestamps(self):
+        now = timezone.now()
+        MovieReview.objects.update(created_at=now)
+        UserMovieInteraction.objects.update(created_at=now)
+        movies = self._walk(page_size=2)
+        self.assertEqual(len(movies), len(set(movies)))
+        self.assertEqual(set(movies), self.expected)
+
+    def test_love_wins_over_like(self):
+        items, _ = timeline.get_timeline(self.user, page_size=50)
+        kinds = {row.movie_id: (activity_type, getattr(row, 'interaction_type', None)) for activity_type, row in items}
+        self.assertEqual(kinds['tt0000000'][0], 'rated_movie')
+        self.assertEqual(kinds['tt0000001'], ('watched_movie', 'watched'))
+        self.assertEqual(kinds['tt0000002'], ('liked_movie', 'love'))
+
+    def test_bad_cursor_is_a_400(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('user_activity')
+        for cursor in ('garbage!', encode_cursor([1, 2]), encode_cursor(['2024-01-01', 'x', 1])):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(client.get(url, {'cursor': cursor}).status_code, 400)
+
+
+class UserCardQueryTests(TestCase):
+    def setUp(self):
+        self.viewer = _user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self._add_users(2)
+
+    def _add_users(self, count):
+        start = CustomUser.objects.count()
+        for n in range(start, start + count):
+            user = _user(f'member{n}')
+            user.following.add(self.viewer)
+            if n % 2:
+                self.viewer.following.add(user)
+
+    def _queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        urls = [
+            (reverse('search_users'), {'q': 'member'}),
+            (reverse('search_users'), None),
+            (reverse('get_following'), None),
+            (reverse('get_followers'), None),
+        ]
+        before = [self._queries(url, params) for url, params in urls]
+        self._add_users(4)
+        for (url, params), count in zip(urls, before):
+            with self.subTest(url=url, params=params):
+                self.assertEqual(self._queries(url, params), count)
+
+    def test_cards_carry_follow_state_and_counts(self):
+        data = self.client.get(reverse('get_followers')).json()
+        following = set(self.viewer.following.values_list('username', flat=True))
+        self.assertEqual(len(data['followers']), 2)
+        for card in data['followers']:
+            self.assertEqual(card['is_following'], card['username'] in following)
+            self.assertEqual(card['followers_count'], int(card['is_following']))
+
+
+class ProfileCounterTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = _user('alice'), _user('bob'), _user('carol')
+
+    def _counts(self, user, *fields):
+        user.refresh_from_db(fields=fields)
+        return tuple(getattr(user, field) for field in fields)
+
+    def test_follow_unfollow_and_clear(self):
+        self.alice.following.add(self.bob, self.carol)
+        self.carol.following.add(self.bob)
+        self.assertEqual(self._counts(self.alice, 'following_count', 'followers_count'), (2, 0))
+        self.assertEqual(self._counts(self.bob, 'following_count', 'followers_count'), (0, 2))
+
+        # Removing a follow that doesn't exist changes nothing
+        self.alice.following.remove(self.carol, _user('dave'))
+        self.assertEqual(self._counts(self.alice, 'following_count'), (1,))
+        self.assertEqual(self._counts(self.carol, 'followers_count'), (0,))
+
+        self.bob.followers.clear()
+        self.assertEqual(self._counts(self.bob, 'followers_count'), (0,))
+        self.assertEqual(self._counts(self.alice, 'following_count'), (0,))
+        self.assertEqual(self._counts(self.carol, 'following_count'), (0,))
+
+    def test_racing_adds_count_once(self):
+        self.alice.following.add(self.bob)
+        # A second request that also saw the follow missing reports it as added
+        signals.follow_counters(
+            sender=Follow, instance=self.alice, action='post_add', reverse=False, pk_set={self.bob.pk},
+        )
+        self.assertEqual(self._counts(self.alice, 'following_count'), (1,))
+        self.assertEqual(self._counts(self.bob, 'followers_count'), (1,))
+
+    def test_reviews_and_watched(self):
+        movie = Movie.objects.create(imdb_id='tt0000001', title='Arrival')
+        review = MovieReview.objects.create(user=self.alice, movie=movie, rating=5)
+        self.assertEqual(self._counts(self.alice, 'reviews_count', 'watched_count'), (1, 1))
+        review.delete()
+        self.assertEqual(self._counts(self.alice, 'reviews_count', 'watched_count'), (0, 1))
+        UserMovieInteraction.objects.filter(user=self.alice, interaction_type='watched').delete()
+        self.assertEqual(self._counts(self.alice, 'watched_count'), (0,))
+
+
+class FriendRecommendationTests(TestCase):
+    def setUp(self):
+        self.me = _user('me')
+        self.twin, self.genre_fan, self.followed, self.stranger = (
+            _user(name) for name in ('twin', 'genre_fan', 'followed', 'stranger')
+        )
+        self.me.following.add(self.followed)
+        movies = [
+            Movie.objects.create(imdb_id='tt0000001', title='Inception', genre='Drama, Sci-Fi', director='Nolan', actors='A, B, C'),
+            Movie.objects.create(imdb_id='tt0000002', title='Heat', genre='Drama', director='Mann', actors='D'),
+            Movie.objects.create(imdb_id='tt0000003', title='Carol', genre='Drama', director='Haynes', actors='E'),
+            Movie.objects.create(imdb_id='tt0000004', title='Airplane!', genre='Comedy', director='Zucker', actors='F'),
+        ]
+        catalog.sync_taxonomy(movies)
+        for user, watched in (
+            (self.me, movies[:2]),
+            (self.twin, movies[:2]),
+            (self.genre_fan, movies[2:3]),
+            (self.followed, movies[:1]),
+            (self.stranger, movies[3:]),
+        ):
+            for movie in watched:
+                MovieReview.objects.create(user=user, movie=movie, rating=4)
+
+    def test_scores_only_overlapping_users_not_followed(self):
+        scores, overlaps = friend_recs.score_users(self.me)
+        # twin: 2 movies, 2 genres, 2 directors, 4 actors
+        self.assertEqual(dict(scores), {self.twin.id: 2 * 10 + 2 * 3 + 2 * 5 + 4 * 2, self.genre_fan.id: 3})
+        self.assertEqual(overlaps[self.genre_fan.id], {'genres': 1})
+
+    def test_candidate_cap_still_scores_exactly(self):
+        scores, _ = friend_recs.score_users(self.me, candidates_per_signal=1)
+        self.assertEqual(scores[self.twin.id], 44)
+
+    def test_recommendations_with_reasons(self):
+        recommendations = friend_recs.recommend_friends(self.me)
+        self.assertEqual([r['username'] for r in recommendations], ['twin', 'genre_fan'])
+        self.assertEqual(recommendations[0]['reason'], '2 movies in common • Both love Drama')
+        self.assertEqual(recommendations[1]['reason'], 'Both love Drama')
+
+    def test_precomputed_neighbours_take_over(self):
+        UserSimilarity.objects.create(user=self.me, neighbor=self.stranger, score=0.9)
+        UserSimilarity.objects.create(user=self.me, neighbor=self.followed, score=0.8)
+        recommendations = friend_recs.recommend_friends(self.me)
+        self.assertEqual([(r['username'], r['score']) for r in recommendations], [('stranger', 90)])
@@ -0,0 +1,85 @@
+"""
+Per-user activity timeline (reviews, watched and liked movies).
+
+Each source is read with a keyset query ordered by (-created_at, -id), so
+it costs the same at any depth, and the sources are combined with a k-way
+heapq.merge. Ties on the timestamp are broken by a fixed source rank and then
+the row id, which makes the merged order total. The "load older" cursor is
+the (timestamp, rank, id) of the last item shown.
+
+A movie appears once: a review hides the watched / liked events of the same
+movie, a watched event hides the liked one and a love hides a like. These exclusions are
+semi-joins in SQL, so they hold across pages. A set over the merged page
+catches anything left over.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from tunr_backend.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+def _sources(user):
+    """(rank, activity type, queryset) for each timeline source, in tie-break order"""
+    from movies.models import MovieReview, UserMovieInteraction
+
+    reviewed = MovieReview.objects.filter(user=user, movie_id=OuterRef('movie_id'))
+    same_movie = UserMovieInteraction.objects.filter(user=user, movie_id=OuterRef('movie_id'))
+    watched = same_movie.filter(interaction_type='watched')
+    loved = same_movie.filter(interaction_type='love')
+    interactions = UserMovieInteraction.objects.filter(user=user).select_related('movie')
+    return [
+        (0, 'rated_movie', MovieReview.objects.filter(user=user).select_related('movie')),
+        (1, 'watched_movie', interactions.filter(interaction_type='watched').exclude(Exists(reviewed))),
+        (2, 'liked_movie', interactions.filter(interaction_type__in=['like', 'love']).exclude(
+            Exists(reviewed)
+        ).exclude(Exists(watched)).exclude(Q(interaction_type='like') & Exists(loved))),
+    ]
+
+
+def _after(rank, cursor):
+    """Rows of the source with `rank` that sort after `cursor` in the merged order"""
+    timestamp, cursor_rank, cursor_id = cursor
+    if rank < cursor_rank:
+        return Q(created_at__lte=timestamp)
+    if rank > cursor_rank:
+        return Q(created_at__lt=timestamp)
+    return Q(created_at__lt=timestamp) | Q(created_at=timestamp, id__lt=cursor_id)
+
+
+def get_timeline(user, cursor=None, page_size=None):
+    """
+    One page of `user`'s timeline, newest first.
+
+    Returns (items, next_cursor) where items are (activity type, row) pairs.
+    """
+    page_size = page_size or settings.API_PAGE_SIZE
+    values = decode_cursor(cursor) if cursor else None
+    if values is not None and (len(values) != 3 or not isinstance(values[1], int)):
+        raise InvalidCursor('Cursor does not match the ordering')
+
+    streams = []
+    for rank, activity_type, queryset in _sources(user):
+        if values:
+            queryset = queryset.filter(_after(rank, values))
+        rows = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+        stream = [[row.created_at, rank, row.id, activity_type, row, False] for row in rows]
+        if len(rows) > page_size:
+            stream[-1][5] = True  # rows past this one weren't fetched
+        streams.append(stream)
+
+    items, seen_movies, last = [], set(), None
+    for created_at, rank, row_id, activity_type, row, boundary in heapq.merge(
+        *streams, reverse=True, key=lambda entry: entry[:3]
+    ):
+        if len(items) == page_size:
+            return items, encode_cursor(last)
+        last = (created_at, rank, row_id)
+        if row.movie_id not in seen_movies:
+            seen_movies.add(row.movie_id)
+            items.append((activity_type, row))
+        if boundary:
+            # Merging past a truncated source could skip its unfetched rows
+            return items, encode_cursor(last)
+    return items, None
@@ -6,8 +6,39 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Count
 from collections import Counter
+import logging
+from tunr_backend.pagination import InvalidCursor, get_page_size, paginate
+from . import feed, friend_recs, timeline
+from .cards import user_cards
+from .rec_cache import cached_recommendations
 from .models import CustomUser
 
+logger = logging.getLogger(__name__)
+
+# Movie recommendations skip anything released before this
+MIN_RECOMMENDATION_YEAR = 1995
+
+
+def _taste_profile(reviews):
+    """
+    Genre / director / actor counts over the movies in `reviews`, read from
+    the indexed movie link tables instead of re-splitting the text fields.
+    """
+    from movies.models import MovieCredit, MovieGenre
+    
+    movie_ids = reviews.values('movie_id')
+    genres = Counter(dict(
+        MovieGenre.objects.filter(movie_id__in=movie_ids)
+        .values_list('genre__name').annotate(n=Count('id'))
+    ))
+    directors, actors = Counter(), Counter()
+    credits = MovieCredit.objects.filter(movie_id__in=movie_ids).values_list(
+        'role', 'person__name'
+    ).annotate(n=Count('id'))
+    for role, name, n in credits:
+        (directors if role == 'director' else actors)[name] = n
+    return genres, directors, actors
+
 
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
@@ -25,15 +56,6 @@ def get_profile(request, username=None):
     if not is_own_profile:
         is_following = request.user.following.filter(id=user.id).exists()
     
-    # Get user's stats
-    from movies.models import MovieReview, UserMovieInteraction
-    watched_count = UserMovieInteraction.objects.filter(
-        user=user, 
-        interaction_type='watched'
-    ).count()
-    
-    reviews_count = MovieReview.objects.filter(user=user).count()
-    
     profile_data = {
         'username': user.username,
         'email': user.email if is_own_profile else None,
@@ -42,10 +64,10 @@ def get_profile(request, username=None):
         'spotify_connected': bool(user.spotify_access_token),
         'spotify_display_name': user.spotify_display_name,
         'stats': {
-            'watched': watched_count,
-            'reviews': reviews_count,
-            'following': user.following.count(),
-            'followers': user.followers.count(),
+            'watched': user.watched_count,
+            'reviews': user.reviews_count,
+            'following': user.following_count,
+            'followers': user.followers_count,
         },
         'is_own_profile': is_own_profile,
         'is_following': is_following,
@@ -58,77 +80,45 @@ def get_profile(request, username=None):
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def get_user_activity(request, username=None):
-    """Get user's activity feed - movies watched, songs listened to, ratings, etc."""
+    """
+    Get user's activity feed - movies rated, watched and liked, newest first.
+    Pass the returned `next_cursor` as `?cursor=` to load older activity.
+    """
     if username:
         user = get_object_or_404(CustomUser, username=username)
     else:
         user = request.user
     
-    from movies.models import MovieReview, UserMovieInteraction
-    activities = []
+    try:
+        items, next_cursor = timeline.get_timeline(
+            user,
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request, default=50),
+        )
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=400)
     
-    # Get movie reviews (ratings)
-    movie_reviews = MovieReview.objects.filter(user=user).select_related('movie').order_by('-created_at')[:20]
-    for review in movie_reviews:
-        activities.append({
-            'type': 'rated_movie',
-            'timestamp': review.created_at,
+    activities = []
+    for activity_type, row in items:
+        activity = {
+            'type': activity_type,
+            'timestamp': row.created_at,
             'movie': {
-                'imdb_id': review.movie.imdb_id,
-                'title': review.movie.title,
-                'year': review.movie.year,
-                'poster_url': review.movie.poster_url,
+                'imdb_id': row.movie.imdb_id,
+                'title': row.movie.title,
+                'year': row.movie.year,
+                'poster_url': row.movie.poster,
             },
-            'rating': review.rating,
-            'review_text': review.review_text if review.review_text else None,
-        })
-    
-    # Get watched movies
-    watched = UserMovieInteraction.objects.filter(
-        user=user,
-        interaction_type='watched'
-    ).select_related('movie').order_by('-created_at')[:20]
-    
-    for watch in watched:
-        # Skip if we already have a review for this movie (to avoid duplicates)
-        if not any(a.get('movie', {}).get('imdb_id') == watch.movie.imdb_id for a in activities):
-            activities.append({
-                'type': 'watched_movie',
-                'timestamp': watch.created_at,
-                'movie': {
-                    'imdb_id': watch.movie.imdb_id,
-                    'title': watch.movie.title,
-                    'year': watch.movie.year,
-                    'poster_url': watch.movie.poster_url,
-                },
-            })
-    
-    # Get liked movies
-    liked = UserMovieInteraction.objects.filter(
-        user=user,
-        interaction_type='liked'
-    ).select_related('movie').order_by('-created_at')[:20]
-    
-    for like in liked:
-        if not any(a.get('movie', {}).get('imdb_id') == like.movie.imdb_id for a in activities):
-            activities.append({
-                'type': 'liked_movie',
-                'timestamp': like.created_at,
-                'movie': {
-                    'imdb_id': like.movie.imdb_id,
-                    'title': like.movie.title,
-                    'year': like.movie.year,
-                    'poster_url': like.movie.poster_url,
-                },
-            })
-    
-    # Sort all activities by timestamp
-    activities.sort(key=lambda x: x['timestamp'], reverse=True)
+        }
+        if activity_type == 'rated_movie':
+            activity['rating'] = row.rating
+            activity['review_text'] = row.review_text if row.review_text else None
+        activities.append(activity)
     
-    # Return top 50 activities
     return Response({
-        'activities': activities[:50],
-        'username': user.username
+        'activities': activities,
+        'username': user.username,
+        'next_cursor': next_cursor,
     })
 
 
@@ -154,13 +144,15 @@ def toggle_follow(request, username):
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def get_friends_activity(request):
-    """Get activity feed from users you follow"""
-    following_users = request.user.following.all()
-    
-    # Get activities from followed users
-    activities = UserActivity.objects.filter(
-        user__in=following_users
-    )[:50]  # Last 50 activities
+    """Get activity feed from users you follow (newest first, `?cursor=` for older)"""
+    try:
+        activities, next_cursor = feed.get_feed(
+            request.user,
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request),
+        )
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=400)
     
     activity_data = []
     for activity in activities:
@@ -180,10 +172,30 @@ def get_friends_activity(request):
     
     return Response({
         'activities': activity_data,
-        'count': len(activity_data)
+        'count': len(activity_data),
+        'next_cursor': next_cursor,
     })
 
 
+# User listings are sorted alphabetically; suggestions by popularity
+USER_LIST_ORDERING = ['username', 'id']
+SUGGESTED_USERS_ORDERING = ['-followers_count', 'id']
+
+
+def _user_list_response(request, key, queryset, ordering):
+    """One page of user cards from `queryset`, or a 400 for a bad cursor"""
+    try:
+        users, next_cursor = paginate(
+            queryset,
+            ordering,
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request),
+        )
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=400)
+    return Response({key: user_cards(request.user, users), 'next_cursor': next_cursor})
+
+
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
@@ -197,25 +209,14 @@ def search_users(request):
             id=request.user.id
         ).exclude(
             id__in=request.user.following.values_list('id', flat=True)
-        ).annotate(
-            follower_count=Count('followers')
-        ).order_by('-follower_count')[:20]
-    else:
-        # Search by username or email - CASE INSENSITIVE
-        users = CustomUser.objects.filter(
-            Q(username__icontains=query) | Q(email__icontains=query)
-        ).exclude(id=request.user.id)[:20]
-    
-    user_data = []
-    for user in users:
-        user_data.append({
-            'username': user.username,
-            'bio': user.bio,
-            'is_following': request.user.following.filter(id=user.id).exists(),
-            'followers_count': user.followers.count(),
-        })
-    
-    return Response({'users': user_data})
+        )
+        return _user_list_response(request, 'users', users, SUGGESTED_USERS_ORDERING)
+    
+    # Search by username or email - CASE INSENSITIVE
+    users = CustomUser.objects.filter(
+        Q(username__icontains=query) | Q(email__icontains=query)
+    ).exclude(id=request.user.id)
+    return _user_list_response(request, 'users', users, USER_LIST_ORDERING)
 
 
 @api_view(['GET'])
@@ -228,17 +229,7 @@ def get_following(request, username=None):
     else:
         user = request.user
     
-    following = user.following.all()
-    
-    following_data = []
-    for followed_user in following:
-        following_data.append({
-            'username': followed_user.username,
-            'bio': followed_user.bio,
-            'is_following': request.user.following.filter(id=followed_user.id).exists() if user != request.user else True,
-        })
-    
-    return Response({'following': following_data})
+    return _user_list_response(request, 'following', user.following.all(), USER_LIST_ORDERING)
 
 
 @api_view(['GET'])
@@ -251,173 +242,57 @@ def get_followers(request, username=None):
     else:
         user = request.user
     
-    followers = user.followers.all()
-    
-    followers_data = []
-    for follower in followers:
-        followers_data.append({
-            'username': follower.username,
-            'bio': follower.bio,
-            'is_following': request.user.following.filter(id=follower.id).exists(),
-        })
-    
-    return Response({'followers': followers_data})
+    return _user_list_response(request, 'followers', user.followers.all(), USER_LIST_ORDERING)
 
 
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@cached_recommendations('friends')
 def get_friend_recommendations(request):
     """
     Recommend friends based on:
     1. Similar movie reviews (taste similarity)
     2. Common movie genres watched
     3. Common directors/cast preferences
+
+    Scoring lives in accounts.friend_recs.
     """
-    from movies.models import MovieReview, UserMovieInteraction, Movie
+    from movies.models import MovieReview
     
     current_user = request.user
-    recommendations = []
-    
-    # Get user's reviewed movies
-    user_reviews = MovieReview.objects.filter(user=current_user).select_related('movie')
     
-    if not user_reviews.exists():
+    if not MovieReview.objects.filter(user=current_user).exists():
         # No reviews yet, just return popular users
-        popular_users = CustomUser.objects.exclude(
-            id=current_user.id
-        ).exclude(
-            id__in=current_user.following.values_list('id', flat=True)
-        ).annotate(
-            follower_count=Count('followers')
-        ).order_by('-follower_count')[:10]
-        
-        for user in popular_users:
-            recommendations.append({
-                'username': user.username,
-                'bio': user.bio,
-                'reason': f'{user.followers.count()} followers',
-                'score': user.followers.count(),
-                'is_following': False,
-            })
-        
-        return Response({'recommendations': recommendations})
-    
-    # Extract user's preferences
-    user_movie_ids = set(user_reviews.values_list('movie_id', flat=True))
-    user_genres = []
-    user_directors = []
-    user_actors = []
-    
-    for review in user_reviews:
-        if review.movie.genre:
-            user_genres.extend([g.strip() for g in review.movie.genre.split(',')])
-        if review.movie.director:
-            user_directors.extend([d.strip() for d in review.movie.director.split(',')])
-        if review.movie.actors:
-            user_actors.extend([a.strip() for a in review.movie.actors.split(',')])
-    
-    # Count preferences
-    genre_counter = Counter(user_genres)
-    director_counter = Counter(user_directors)
-    actor_counter = Counter(user_actors)
-    
-    # Find other users with similar tastes
-    other_users = CustomUser.objects.exclude(
-        id=current_user.id
-    ).exclude(
-        id__in=current_user.following.values_list('id', flat=True)
-    )
+        return Response({'recommendations': friend_recs.popular_users(current_user)})
     
-    user_scores = {}
-    
-    for other_user in other_users:
-        score = 0
-        reasons = []
-        
-        # Check if they reviewed the same movies
-        other_reviews = MovieReview.objects.filter(user=other_user).select_related('movie')
-        other_movie_ids = set(other_reviews.values_list('movie_id', flat=True))
-        
-        common_movies = user_movie_ids & other_movie_ids
-        if common_movies:
-            score += len(common_movies) * 10  # 10 points per common movie
-            reasons.append(f'{len(common_movies)} movies in common')
-        
-        # Check genre similarity
-        other_genres = []
-        other_directors = []
-        other_actors = []
-        
-        for review in other_reviews:
-            if review.movie.genre:
-                other_genres.extend([g.strip() for g in review.movie.genre.split(',')])
-            if review.movie.director:
-                other_directors.extend([d.strip() for d in review.movie.director.split(',')])
-            if review.movie.actors:
-                other_actors.extend([a.strip() for a in review.movie.actors.split(',')])
-        
-        # Score genres
-        common_genres = set(user_genres) & set(other_genres)
-        if common_genres:
-            score += len(common_genres) * 3
-            top_genre = max(common_genres, key=lambda g: genre_counter.get(g, 0))
-            reasons.append(f'Both love {top_genre}')
-        
-        # Score directors
-        common_directors = set(user_directors) & set(other_directors)
-        if common_directors:
-            score += len(common_directors) * 5
-            top_director = max(common_directors, key=lambda d: director_counter.get(d, 0))
-            reasons.append(f'Both like {top_director}')
-        
-        # Score actors
-        common_actors = set(user_actors) & set(other_actors)
-        if common_actors:
-            score += len(common_actors) * 2
-            if len(common_actors) >= 3:
-                reasons.append(f'{len(common_actors)} favorite actors in common')
-        
-        # Only recommend if there's some similarity
-        if score > 0:
-            user_scores[other_user] = {
-                'score': score,
-                'reasons': reasons[:2],  # Top 2 reasons
-            }
-    
-    # Sort by score and get top 20
-    sorted_users = sorted(user_scores.items(), key=lambda x: x[1]['score'], reverse=True)[:20]
-    
-    for user, data in sorted_users:
-        reason_text = ' • '.join(data['reasons']) if data['reasons'] else 'Similar taste'
-        recommendations.append({
-            'username': user.username,
-            'bio': user.bio,
-            'reason': reason_text,
-            'score': data['score'],
-            'is_following': False,
-        })
-    
-    return Response({'recommendations': recommendations})
+    return Response({'recommendations': friend_recs.recommend_friends(current_user)})
 
 
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@cached_recommendations('movies')
 def get_personalized_movie_recommendations(request):
     """
     Recommend movies based on:
-    1. User's highly rated movies (similar genre, director, cast)
-    2. Movies loved by people they follow
-    3. Popular movies in their favorite genres
+    1. Movies people who liked the same titles also liked (item-item CF)
+    2. Matrix-factorization ranking of the whole catalog
+    3. User's highly rated movies (similar genre, director, cast)
+    4. Movies loved by people they follow
+    5. Popular movies in their favorite genres
     """
-    from movies.models import MovieReview, Movie
-    from django.db.models import Avg, Count, Q
+    from movies.models import MovieReview, Movie, MovieCredit, MovieGenre, UserMovieInteraction, parse_rating, parse_year_range
+    from movies import factorization, similarity as movie_similarity
+    from django.db.models import Avg, Count, F, Q
     
     current_user = request.user
     recommendations = []
     seen_movie_ids = set()
     
+    # Only from 1995 onwards (titles without a parsed year are kept)
+    recent_enough = Q(year_start__gte=MIN_RECOMMENDATION_YEAR) | Q(year_start__isnull=True)
+    
     # Get user's watched movies
     user_reviews = MovieReview.objects.filter(user=current_user).select_related('movie')
     watched_movie_ids = set(user_reviews.values_list('movie_id', flat=True))
@@ -425,53 +300,94 @@ def get_personalized_movie_recommendations(request):
     # Get user's highly rated movies (4-5 stars)
     highly_rated = user_reviews.filter(rating__gte=4).select_related('movie')
     
+    # "Because you liked X": the precomputed item-item neighbours of the user's favourites
+    because = movie_similarity.because_you_liked(current_user, exclude=watched_movie_ids)
+    if because:
+        neighbour_movies = Movie.objects.filter(recent_enough).annotate(
+            avg_rating=Avg('reviews__rating')
+        ).in_bulk([movie_id for movie_id, _, _ in because])
+        seed_titles = dict(Movie.objects.filter(
+            imdb_id__in={seed_id for _, _, seed_id in because}
+        ).values_list('imdb_id', 'title'))
+        for movie_id, _, seed_id in because:
+            movie = neighbour_movies.get(movie_id)
+            if movie is None:
+                continue
+            recommendations.append({
+                'imdb_id': movie.imdb_id,
+                'title': movie.title,
+                'year': movie.year,
+                'genre': movie.genre,
+                'director': movie.director,
+                'poster': movie.poster,
+                'imdb_rating': movie.imdb_rating,
+                'reason': f'Because you liked {seed_titles.get(seed_id, "a favorite")}',
+                'avg_user_rating': round(movie.avg_rating, 1) if movie.avg_rating else None,
+            })
+            seen_movie_ids.add(movie.imdb_id)
+    
+    # Ranked by the matrix-factorization model (once `manage.py train_recommender` has run)
+    interacted_ids = set(UserMovieInteraction.objects.filter(user=current_user).values_list('movie_id', flat=True))
+    try:
+        picked_ids = factorization.recommend_for_user(
+            current_user, k=10, exclude=watched_movie_ids | interacted_ids | seen_movie_ids
+        )
+    except Exception as e:
+        # A missing or half-written model must not take the page down; the heuristics below still run
+        logger.warning('Factor model recommendations failed: %s', e)
+        picked_ids = []
+    if picked_ids:
+        picked_movies = Movie.objects.filter(recent_enough).annotate(
+            avg_rating=Avg('reviews__rating')
+        ).in_bulk(picked_ids)
+        for movie_id in picked_ids:
+            movie = picked_movies.get(movie_id)
+            if movie is None:
+                continue
+            recommendations.append({
+                'imdb_id': movie.imdb_id,
+                'title': movie.title,
+                'year': movie.year,
+                'genre': movie.genre,
+                'director': movie.director,
+                'poster': movie.poster,
+                'imdb_rating': movie.imdb_rating,
+                'reason': 'Picked for you',
+                'avg_user_rating': round(movie.avg_rating, 1) if movie.avg_rating else None,
+            })
+            seen_movie_ids.add(movie.imdb_id)
+    
+    top_genres, top_directors, top_actors = [], [], []
     if highly_rated.exists():
         # Extract user's favorite genres, directors, actors
-        favorite_genres = []
-        favorite_directors = []
-        favorite_actors = []
+        genre_counter, director_counter, actor_counter = _taste_profile(highly_rated)
+        top_genres = [g for g, _ in genre_counter.most_common(3)]
+        top_directors = [d for d, _ in director_counter.most_common(3)]
+        top_actors = [a for a, _ in actor_counter.most_common(5)]
         
-        for review in highly_rated:
-            if review.movie.genre:
-                favorite_genres.extend([g.strip() for g in review.movie.genre.split(',')])
-            if review.movie.director:
-                favorite_directors.extend([d.strip() for d in review.movie.director.split(',')])
-            if review.movie.actors:
-                favorite_actors.extend([a.strip() for a in review.movie.actors.split(',')])
-        
-        # Get most common preferences
-        from collections import Counter
-        top_genres = [g for g, _ in Counter(favorite_genres).most_common(3)]
-        top_directors = [d for d, _ in Counter(favorite_directors).most_common(3)]
-        top_actors = [a for a, _ in Counter(favorite_actors).most_common(5)]
-        
-        # Find movies with similar attributes
-        similar_movies_query = Q()
-        for genre in top_genres:
-            similar_movies_query |= Q(genre__icontains=genre)
-        for director in top_directors:
-            similar_movies_query |= Q(director__icontains=director)
-        for actor in top_actors[:3]:  # Top 3 actors only
-            similar_movies_query |= Q(actors__icontains=actor)
+        # Find movies with similar attributes (semi-joins on the indexed link tables)
+        similar_movies_query = (
+            Q(imdb_id__in=MovieGenre.objects.filter(genre__name__in=top_genres).values('movie_id'))
+            | Q(imdb_id__in=MovieCredit.objects.filter(
+                role='director', person__name__in=top_directors
+            ).values('movie_id'))
+            | Q(imdb_id__in=MovieCredit.objects.filter(
+                role='actor', person__name__in=top_actors[:3]  # Top 3 actors only
+            ).values('movie_id'))
+        )
         
         similar_movies = Movie.objects.filter(
             similar_movies_query
+        ).filter(
+            recent_enough
         ).exclude(
             imdb_id__in=watched_movie_ids
         ).annotate(
             avg_rating=Avg('reviews__rating'),
             review_count=Count('reviews')
-        ).order_by('-avg_rating', '-review_count')[:15]
+        ).order_by(F('avg_rating').desc(nulls_last=True), '-review_count', F('imdb_score').desc(nulls_last=True))[:15]
         
         for movie in similar_movies:
-            # Filter by year - only from 1995 onwards
-            try:
-                year_int = int(movie.year.split('–')[0].split('-')[0]) if movie.year else 0
-                if year_int < 1995:
-                    continue
-            except (ValueError, TypeError, AttributeError):
-                pass  # Include if year parsing fails
-            
             if movie.imdb_id not in seen_movie_ids:
                 reason = []
                 if any(g in (movie.genre or '') for g in top_genres):
@@ -498,27 +414,21 @@ def get_personalized_movie_recommendations(request):
     # Get movies loved by people user follows
     following_users = current_user.following.all()
     if following_users.exists():
-        friend_favorites = MovieReview.objects.filter(
+        friend_favorites = list(MovieReview.objects.filter(
             user__in=following_users,
             rating__gte=4
+        ).filter(
+            Q(movie__year_start__gte=MIN_RECOMMENDATION_YEAR) | Q(movie__year_start__isnull=True)
         ).exclude(
             movie_id__in=watched_movie_ids
         ).values('movie').annotate(
             love_count=Count('id'),
             avg_rating=Avg('rating')
-        ).order_by('-love_count', '-avg_rating')[:10]
+        ).order_by('-love_count', '-avg_rating')[:10])
+        friend_movies = Movie.objects.in_bulk([item['movie'] for item in friend_favorites])
         
         for item in friend_favorites:
-            movie = Movie.objects.get(imdb_id=item['movie'])
-            
-            # Filter by year - only from 1995 onwards
-            try:
-                year_int = int(movie.year.split('–')[0].split('-')[0]) if movie.year else 0
-                if year_int < 1995:
-                    continue
-            except (ValueError, TypeError, AttributeError):
-                pass
-            
+            movie = friend_movies[item['movie']]
             if movie.imdb_id not in seen_movie_ids:
                 recommendations.append({
                     'imdb_id': movie.imdb_id,
@@ -535,7 +445,9 @@ def get_personalized_movie_recommendations(request):
     
     # If still no recommendations, show popular movies
     if len(recommendations) < 5:
-        popular_movies = Movie.objects.exclude(
+        popular_movies = Movie.objects.filter(
+            recent_enough
+        ).exclude(
             imdb_id__in=watched_movie_ids
         ).annotate(
             avg_rating=Avg('reviews__rating'),
@@ -545,14 +457,6 @@ def get_personalized_movie_recommendations(request):
         ).order_by('-review_count', '-avg_rating')[:10]
         
         for movie in popular_movies:
-            # Filter by year - only from 1995 onwards
-            try:
-                year_int = int(movie.year.split('–')[0].split('-')[0]) if movie.year else 0
-                if year_int < 1995:
-                    continue
-            except (ValueError, TypeError, AttributeError):
-                pass
-            
             if movie.imdb_id not in seen_movie_ids:
                 recommendations.append({
                     'imdb_id': movie.imdb_id,
@@ -567,131 +471,110 @@ def get_personalized_movie_recommendations(request):
                 })
                 seen_movie_ids.add(movie.imdb_id)
     
-    # If STILL no recommendations (empty DB), fetch from OMDb API based on user preferences
+    # If STILL no recommendations (empty DB), fetch from OMDb API based on user preferences.
+    # Searches and detail lookups run concurrently within RECOMMENDATION_OMDB_DEADLINE;
+    # whatever hasn't arrived by then is skipped (and cached for next time).
+    partial = False
     if len(recommendations) == 0:
         from django.conf import settings
-        import requests
+        from movies import omdb
         
         api_key = settings.OMDB_API_KEY
         if api_key:
             search_queries = []
             
-            if highly_rated.exists():
+            if top_genres:
                 # Search by favorite genres (works better than actor/director names)
-                if top_genres:
-                    for genre in top_genres[:2]:
-                        search_queries.append(f'{genre}')
+                for genre in top_genres[:2]:
+                    search_queries.append(f'{genre}')
                 
                 # Search by combining genre + year range for better results
-                if top_genres:
-                    search_queries.append(f'{top_genres[0]} 2020')
-                    search_queries.append(f'{top_genres[0]} 2015')
+                search_queries.append(f'{top_genres[0]} 2020')
+                search_queries.append(f'{top_genres[0]} 2015')
             else:
                 # New user - show popular recent movies
                 search_queries = ['comedy 2024', 'action 2023', 'romance 2024', 'thriller 2023']
             
-            for query in search_queries[:4]:  # Limit to 4 searches
-                try:
-                    url = f'http://www.omdbapi.com/?s={query}&type=movie&apikey={api_key}'
-                    response = requests.get(url, timeout=5)
-                    data = response.json()
-                    
-                    if data.get('Response') == 'True':
-                        movies = data.get('Search', [])
-                        
-                        # Process MORE movies to increase chance of finding matches
-                        for movie_data in movies[:10]:  # Check 10 movies per search instead of default
-                            imdb_id = movie_data.get('imdbID')
-                            movie_year = movie_data.get('Year', '')
-                            
-                            if imdb_id not in seen_movie_ids and imdb_id not in watched_movie_ids:
-                                # Fetch full details for better recommendations
-                                try:
-                                    detail_url = f'http://www.omdbapi.com/?i={imdb_id}&apikey={api_key}'
-                                    detail_response = requests.get(detail_url, timeout=5)
-                                    detail_data = detail_response.json()
-                                    
-                                    if detail_data.get('Response') == 'True':
-                                        # Filter by year - only movies from 1995 onwards
-                                        movie_year = detail_data.get('Year', '')
-                                        try:
-                                            # Handle year formats like "2024" or "2020-2021"
-                                            year_int = int(movie_year.split('–')[0].split('-')[0])
-                                            if year_int < 1995:
-                                                continue  # Skip old movies
-                                        except (ValueError, TypeError, AttributeError):
-                                            continue  # Skip if no valid year
-                                        
-                                        # Only include if IMDb rating is good (≥ 5.0)
-                                        imdb_rating = detail_data.get('imdbRating', 'N/A')
-                                        try:
-                                            rating_float = float(imdb_rating)
-                                            if rating_float < 5.0:
-                                                continue  # Skip low-rated movies
-                                        except (ValueError, TypeError):
-                                            continue  # Skip if no valid rating
-                                        
-                                        reason_parts = []
-                                        
-                                        # Check if director matches (EXACT match)
-                                        movie_director = detail_data.get('Director', '')
-                                        if top_directors and movie_director:
-                                            for d in top_directors[:2]:
-                                                if d.lower() in movie_director.lower():
-                                                    reason_parts.append('Favorite Director')
-                                                    break
-                                        
-                                        # Check if actors match (EXACT match in Actors field)
-                                        movie_actors = detail_data.get('Actors', '')
-                                        if top_actors and movie_actors:
-                                            for a in top_actors[:3]:
-                                                if a.lower() in movie_actors.lower():
-                                                    reason_parts.append('Favorite Actor')
-                                                    break
-                                        
-                                        # Check if genre matches (EXACT match in Genre field)
-                                        movie_genre = detail_data.get('Genre', '')
-                                        if top_genres and movie_genre:
-                                            for g in top_genres:
-                                                if g.lower() in movie_genre.lower():
-                                                    reason_parts.append(g)
-                                                    break
-                                        
-                                        # Only add if it matches at least ONE preference (actor, director, or genre)
-                                        if not reason_parts:
-                                            continue  # Skip movies that don't match any preferences
-                                        
-                                        reason = ' • '.join(reason_parts) if reason_parts else 'Highly Rated'
-                                        
-                                        recommendations.append({
-                                            'imdb_id': imdb_id,
-                                            'title': detail_data.get('Title', ''),
-                                            'year': detail_data.get('Year', ''),
-                                            'genre': detail_data.get('Genre', ''),
-                                            'director': detail_data.get('Director', ''),
-                                            'poster': detail_data.get('Poster', ''),
-                                            'imdb_rating': imdb_rating,
-                                            'reason': reason,
-                                            'avg_user_rating': None,
-                                            '_rating_sort': rating_float,  # For sorting
-                                        })
-                                        seen_movie_ids.add(imdb_id)
-                                except Exception as e:
-                                    print(f"Error fetching movie details: {e}")
-                                    continue
-                                
-                        if len(recommendations) >= 10:
-                            break
-                except Exception as e:
-                    print(f"Error fetching from OMDb: {e}")
+            details, complete = omdb.search_details(
+                search_queries[:4],  # Limit to 4 searches
+                per_query=10,  # Check 10 movies per search
+                timeout=settings.RECOMMENDATION_OMDB_DEADLINE,
+                exclude=seen_movie_ids | watched_movie_ids,
+                max_workers=settings.RECOMMENDATION_OMDB_WORKERS,
+            )
+            partial = not complete
+            
+            for detail_data in details:
+                if detail_data.get('Response') != 'True':
                     continue
+                
+                # Filter by year - only movies from 1995 onwards
+                year_start, _ = parse_year_range(detail_data.get('Year', ''))
+                if year_start is None or year_start < MIN_RECOMMENDATION_YEAR:
+                    continue  # Skip old movies and ones without a valid year
+                
+                # Only include if IMDb rating is good (≥ 5.0)
+                imdb_rating = detail_data.get('imdbRating', 'N/A')
+                score = parse_rating(imdb_rating)
+                if score is None or score < 5:
+                    continue  # Skip low-rated movies and ones without a rating
+                rating_float = float(score)
+                
+                reason_parts = []
+                
+                # Check if director matches (EXACT match)
+                movie_director = detail_data.get('Director', '')
+                if top_directors and movie_director:
+                    for d in top_directors[:2]:
+                        if d.lower() in movie_director.lower():
+                            reason_parts.append('Favorite Director')
+                            break
+                
+                # Check if actors match (EXACT match in Actors field)
+                movie_actors = detail_data.get('Actors', '')
+                if top_actors and movie_actors:
+                    for a in top_actors[:3]:
+                        if a.lower() in movie_actors.lower():
+                            reason_parts.append('Favorite Actor')
+                            break
+                
+                # Check if genre matches (EXACT match in Genre field)
+                movie_genre = detail_data.get('Genre', '')
+                if top_genres and movie_genre:
+                    for g in top_genres:
+                        if g.lower() in movie_genre.lower():
+                            reason_parts.append(g)
+                            break
+                
+                # New users have no preferences yet; otherwise require at least ONE match
+                if top_genres and not reason_parts:
+                    continue  # Skip movies that don't match any preferences
+                
+                reason = ' • '.join(reason_parts) if reason_parts else 'Highly Rated'
+                
+                recommendations.append({
+                    'imdb_id': detail_data.get('imdbID'),
+                    'title': detail_data.get('Title', ''),
+                    'year': detail_data.get('Year', ''),
+                    'genre': detail_data.get('Genre', ''),
+                    'director': detail_data.get('Director', ''),
+                    'poster': detail_data.get('Poster', ''),
+                    'imdb_rating': imdb_rating,
+                    'reason': reason,
+                    'avg_user_rating': None,
+                    '_rating_sort': rating_float,  # For sorting
+                })
+                seen_movie_ids.add(detail_data.get('imdbID'))
     
     # If still nothing, return helpful message
     if len(recommendations) == 0:
-        return Response({
+        data = {
             'recommendations': [],
             'message': 'Rate some movies to get personalized suggestions!'
-        })
+        }
+        if partial:
+            data['partial'] = True
+        return Response(data)
     
     # Sort by IMDb rating (highest first)
     recommendations.sort(key=lambda x: x.get('_rating_sort', 0), reverse=True)
@@ -700,12 +583,17 @@ def get_personalized_movie_recommendations(request):
     for rec in recommendations:
         rec.pop('_rating_sort', None)
     
-    return Response({'recommendations': recommendations[:20]})
+    data = {'recommendations': recommendations[:20]}
+    if partial:
+        # The OMDb fallback ran out of time; a reload will have more
+        data['partial'] = True
+    return Response(data)
 
 
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@cached_recommendations('music')
 def get_personalized_music_recommendations(request):
     """
     Recommend music based on friends' listening activity
@@ -799,6 +687,7 @@ def get_personalized_music_recommendations(request):
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@cached_recommendations('friend_movies')
 def get_friend_movie_recommendations(request):
     """
     Recommendations based on friends' activity:
@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import Movie, UserMovieInteraction, UserGenrePreference, MovieReview
+from .models import Movie, UserMovieInteraction, UserGenrePreference, MovieReview, MovieEnrichmentTask, Genre, Person, MovieStats, SimilarMovie
 
 
 @admin.register(Movie)
 class MovieAdmin(admin.ModelAdmin):
     list_display = ['title', 'year', 'genre', 'imdb_rating', 'created_at']
-    search_fields = ['title', 'director', 'actors']
-    list_filter = ['year', 'created_at']
+    search_fields = ['title', 'people__name']
+    list_filter = ['genres', 'created_at']
 
 
 @admin.register(MovieReview)
@@ -29,3 +29,35 @@ class UserGenrePreferenceAdmin(admin.ModelAdmin):
     list_filter = ['genre']
     search_fields = ['user__username', 'genre']
 
+
+
+@admin.register(MovieEnrichmentTask)
+class MovieEnrichmentTaskAdmin(admin.ModelAdmin):
+    list_display = ['movie', 'status', 'attempts', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['movie__imdb_id', 'movie__title']
+
+
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name']
+
+
+@admin.register(Person)
+class PersonAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name']
+
+
+@admin.register(MovieStats)
+class MovieStatsAdmin(admin.ModelAdmin):
+    list_display = ['movie', 'review_count', 'watched_count', 'love_count', 'updated_at']
+    search_fields = ['movie__imdb_id', 'movie__title']
+
+
+@admin.register(SimilarMovie)
+class SimilarMovieAdmin(admin.ModelAdmin):
+    list_display = ['movie', 'similar', 'score', 'support', 'updated_at']
+    search_fields = ['movie__imdb_id', 'movie__title']
+    raw_id_fields = ['movie', 'similar']
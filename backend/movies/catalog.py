@@ -0,0 +1,247 @@
+"""
+Keeps the local Movie table in sync with OMDb.
+
+The Movie table is the primary source for movie details; OMDb is only
+consulted for titles we haven't stored yet and to refresh rows older than
+settings.MOVIE_DETAIL_STALE_AFTER.
+
+Write endpoints never wait on OMDb: new titles are stored as a stub built
+from what the client sent and queued in MovieEnrichmentTask, which the
+`enrich_movies` management command drains in batches.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import omdb
+from .models import Genre, Movie, MovieCredit, MovieEnrichmentTask, MovieGenre, Person
+
+logger = logging.getLogger(__name__)
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+# ============= GENRES / PEOPLE =============
+
+def parse_names(value):
+    """Split an OMDb comma list ("Action, Drama") into clean, unique names"""
+    names = []
+    for name in (value or '').split(','):
+        name = name.strip()
+        if name and name != 'N/A' and name not in names:
+            names.append(name)
+    return names
+
+
+def _get_or_create_names(model, names):
+    """Map name -> row for `names`, inserting the missing ones in one statement"""
+    if not names:
+        return {}
+    model.objects.bulk_create([model(name=n) for n in names], ignore_conflicts=True)
+    return {obj.name: obj for obj in model.objects.filter(name__in=names)}
+
+
+def sync_taxonomy(movies):
+    """Rebuild the Genre/Person links of `movies` from their comma-separated fields"""
+    movies = list(movies)
+    if not movies:
+        return
+    parsed = {
+        m.imdb_id: (
+            [g[:50] for g in parse_names(m.genre)],
+            [(n[:255], 'director') for n in parse_names(m.director)]
+            + [(n[:255], 'actor') for n in parse_names(m.actors)],
+        )
+        for m in movies
+    }
+    genres = _get_or_create_names(Genre, {g for names, _ in parsed.values() for g in names})
+    people = _get_or_create_names(Person, {n for _, names in parsed.values() for n, _ in names})
+    
+    movie_genres, credits = [], []
+    for imdb_id, (genre_names, credit_names) in parsed.items():
+        movie_genres += [MovieGenre(movie_id=imdb_id, genre=genres[g]) for g in genre_names]
+        credits += [
+            MovieCredit(movie_id=imdb_id, person=people[name], role=role, billing_order=i)
+            for i, (name, role) in enumerate(credit_names)
+        ]
+    
+    with transaction.atomic():
+        MovieGenre.objects.filter(movie_id__in=parsed).delete()
+        MovieCredit.objects.filter(movie_id__in=parsed).delete()
+        MovieGenre.objects.bulk_create(movie_genres, ignore_conflicts=True)
+        MovieCredit.objects.bulk_create(credits, ignore_conflicts=True)
+
+
+# ============= OMDB -> MOVIE =============
+
+def save_omdb_details(data):
+    """Upsert a Movie row from an OMDb detail payload"""
+    movie = Movie.objects.filter(imdb_id=data['imdbID']).first() or Movie(imdb_id=data['imdbID'])
+    movie.apply_omdb(data)
+    movie.save()
+    sync_taxonomy([movie])
+    MovieEnrichmentTask.objects.filter(movie=movie).exclude(status='done').update(status='done', locked_at=None)
+    return movie
+
+
+def bulk_upsert_omdb_details(payloads):
+    """Insert or update many Movie rows from OMDb detail payloads in one statement"""
+    movies = []
+    for data in payloads:
+        movie = Movie(imdb_id=data['imdbID'])
+        movie.apply_omdb(data)
+        movie.parse_typed_fields()  # bulk_create skips save()
+        movies.append(movie)
+    Movie.objects.bulk_create(
+        movies,
+        update_conflicts=True,
+        unique_fields=['imdb_id'],
+        update_fields=list(Movie.OMDB_FIELDS) + Movie.TYPED_FIELDS + ['updated_at'],
+    )
+    sync_taxonomy(movies)
+    MovieEnrichmentTask.objects.filter(
+        movie_id__in=[m.imdb_id for m in movies]
+    ).exclude(status='done').update(status='done', locked_at=None)
+    return movies
+
+
+def refresh_movie(imdb_id):
+    """Re-fetch a title from OMDb (bypassing the response cache) and store it"""
+    omdb.invalidate(imdb_id)
+    data = omdb.get_details(imdb_id)
+    if data.get('Response') == 'True':
+        return save_omdb_details(data)
+    return None
+
+
+def _refresh_in_background(imdb_id):
+    try:
+        refresh_movie(imdb_id)
+    except Exception as e:
+        logger.warning('Background refresh of %s failed: %s', imdb_id, e)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(imdb_id)
+        # Threads get their own DB connection; don't leak it
+        connection.close()
+
+
+def refresh_movie_async(imdb_id):
+    """Schedule a refresh unless one is already running for this title"""
+    with _refreshing_lock:
+        if imdb_id in _refreshing:
+            return
+        _refreshing.add(imdb_id)
+    threading.Thread(target=_refresh_in_background, args=(imdb_id,), daemon=True).start()
+
+
+# ============= ENRICHMENT QUEUE =============
+
+STUB_FIELDS = ('title', 'year', 'poster', 'genre')
+
+
+def get_or_create_movie(imdb_id, stub):
+    """
+    Return the Movie for `imdb_id`, creating it from the client-supplied
+    `stub` (title/year/poster/genre) and queueing enrichment if it's new.
+    """
+    defaults = {field: stub.get(field) or '' for field in STUB_FIELDS}
+    defaults['title'] = defaults['title'] or 'Unknown'
+    movie, created = Movie.objects.get_or_create(imdb_id=imdb_id, defaults=defaults)
+    if created:
+        sync_taxonomy([movie])
+        enqueue_enrichment(movie)
+    return movie
+
+
+def enqueue_enrichment(movie):
+    """Queue a movie for a full OMDb fetch (no-op if it's already queued)"""
+    task, created = MovieEnrichmentTask.objects.get_or_create(movie=movie)
+    if not created and task.status in ('done', 'failed'):
+        MovieEnrichmentTask.objects.filter(pk=task.pk).update(status='pending', attempts=0, locked_at=None)
+    return task
+
+
+def claim_enrichment_batch(batch_size, lock_timeout=timedelta(minutes=10)):
+    """
+    Atomically move up to `batch_size` tasks to in_progress and return their ids.
+
+    Tasks left in_progress longer than `lock_timeout` (a crashed worker) are
+    claimable again. On Postgres, SKIP LOCKED lets several workers share the queue.
+    """
+    stale_before = timezone.now() - lock_timeout
+    with transaction.atomic():
+        ids = list(
+            MovieEnrichmentTask.objects.select_for_update(skip_locked=True).filter(
+                status='pending'
+            ).order_by('created_at').values_list('movie_id', flat=True)[:batch_size]
+        )
+        if len(ids) < batch_size:
+            ids += list(
+                MovieEnrichmentTask.objects.select_for_update(skip_locked=True).filter(
+                    status='in_progress', locked_at__lt=stale_before
+                ).values_list('movie_id', flat=True)[:batch_size - len(ids)]
+            )
+        MovieEnrichmentTask.objects.filter(movie_id__in=ids).update(status='in_progress', locked_at=timezone.now())
+    return ids
+
+
+def _fetch_details(imdb_id):
+    try:
+        return imdb_id, omdb.get_details(imdb_id), None
+    except Exception as e:
+        return imdb_id, None, str(e)
+    finally:
+        # Worker threads get their own DB connection (for the shared cache tier)
+        connection.close()
+
+
+def process_enrichment_batch(imdb_ids, concurrency=4, max_attempts=5):
+    """
+    Fetch OMDb details for the claimed ids concurrently and fill in the rows.
+
+    Only the HTTP calls run in worker threads; all DB writes happen here.
+    Returns (enriched, failed) counts.
+    """
+    imdb_ids = list(dict.fromkeys(imdb_ids))
+    enriched = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(_fetch_details, imdb_ids))
+    
+    movies = Movie.objects.in_bulk([imdb_id for imdb_id, _, _ in results])
+    updated = []
+    for imdb_id, data, error in results:
+        tasks = MovieEnrichmentTask.objects.filter(movie_id=imdb_id)
+        movie = movies.get(imdb_id)
+        if movie and data and data.get('Response') == 'True':
+            movie.apply_omdb(data)
+            movie.save()
+            updated.append(movie)
+            tasks.update(status='done', locked_at=None, last_error='')
+            enriched += 1
+            continue
+        
+        failed += 1
+        if error is None:
+            error = (data or {}).get('Error', 'Movie not found')
+            if movie is None or omdb.is_negative(data or {}):
+                # OMDb doesn't know the id - retrying won't help
+                tasks.update(status='failed', locked_at=None, last_error=error)
+                continue
+            # Anything else ("Request limit reached!") is transient: retry later
+        task = tasks.first()
+        if task:
+            attempts = task.attempts + 1
+            tasks.update(
+                status='failed' if attempts >= max_attempts else 'pending',
+                attempts=attempts,
+                locked_at=None,
+                last_error=error,
+            )
+    sync_taxonomy(updated)
+    return enriched, failed
@@ -0,0 +1,218 @@
+"""
+Implicit-feedback matrix factorization (ALS) for personalized movie ranking.
+
+Training (`manage.py train_recommender`) uses the same preference matrix as
+the item-item model (movies.similarity.build_preference_matrix). Each
+observed weight r becomes a confidence of 1 + alpha * r that the user likes
+the movie (Hu, Koren & Volinsky, "Collaborative Filtering for Implicit
+Feedback Datasets"). Alternating least squares then fits one float32 vector
+per user and per movie.
+
+Each training run writes its factors as .npy files into a new version
+directory under settings.RECOMMENDER_MODEL_DIR. It then swaps the `current`
+symlink to that directory with a single atomic rename, so a worker always
+loads one run's files together. Web workers memory-map the files, so every
+process shares one page-cached copy. A worker reloads as soon as `current`
+points somewhere new.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+FILES = ('user_factors', 'item_factors', 'user_ids', 'movie_ids')
+CURRENT = 'current'
+# Versions kept on disk: the live one plus the one workers may still be switching from
+KEEP_VERSIONS = 2
+
+_model = None
+_model_lock = threading.Lock()
+
+
+# ============= TRAINING =============
+
+def _least_squares(confidence, fixed, regularization):
+    """
+    Solve for one side of the factorization with the other side `fixed`.
+
+    `confidence` holds alpha * r for every observed (row, item) pair. The
+    dense part Y^T Y is shared and each row only adds its observed items.
+    """
+    n_factors = fixed.shape[1]
+    YtY = fixed.T @ fixed
+    ridge = regularization * np.eye(n_factors, dtype=np.float64)
+    solved = np.zeros((confidence.shape[0], n_factors), dtype=np.float32)
+    indptr, indices, data = confidence.indptr, confidence.indices, confidence.data
+    for row in range(confidence.shape[0]):
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            continue
+        Y = fixed[indices[start:end]].astype(np.float64)
+        c = data[start:end].astype(np.float64)
+        A = YtY + (Y.T * c) @ Y + ridge
+        b = Y.T @ (1.0 + c)
+        solved[row] = np.linalg.solve(A, b)
+    return solved
+
+
+def train_als(X, factors=32, regularization=0.1, iterations=15, alpha=20.0, seed=0):
+    """Return (user_factors, item_factors) for the users x items weight matrix `X`"""
+    rng = np.random.default_rng(seed)
+    confidence = (X * alpha).tocsr().astype(np.float32)
+    confidence_t = confidence.T.tocsr()
+    item_factors = (rng.standard_normal((X.shape[1], factors)) * 0.01).astype(np.float32)
+    user_factors = np.zeros((X.shape[0], factors), dtype=np.float32)
+    for _ in range(iterations):
+        user_factors = _least_squares(confidence, item_factors.astype(np.float64), regularization)
+        item_factors = _least_squares(confidence_t, user_factors.astype(np.float64), regularization)
+    return user_factors, item_factors
+
+
+def top_items(user_vector, item_factors, k, seen=()):
+    """Indices of the `k` best-scoring items for one user, skipping `seen`"""
+    scores = item_factors @ user_vector
+    if len(seen):
+        scores[np.asarray(list(seen), dtype=np.int64)] = -np.inf
+    k = min(k, len(scores) - len(seen))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+def save_model(user_factors, item_factors, user_ids, movie_ids, meta=None, directory=None):
+    """Write the factors to a new version directory and make it current atomically"""
+    directory = Path(directory or settings.RECOMMENDER_MODEL_DIR)
+    version = f'v{time.time_ns()}'
+    target = directory / version
+    target.mkdir(parents=True)
+    arrays = {
+        'user_factors': np.ascontiguousarray(user_factors, dtype=np.float32),
+        'item_factors': np.ascontiguousarray(item_factors, dtype=np.float32),
+        'user_ids': np.asarray(user_ids, dtype=np.int64),
+        'movie_ids': np.asarray(movie_ids, dtype=str),
+    }
+    for name, array in arrays.items():
+        np.save(target / f'{name}.npy', array)
+    (target / 'meta.json').write_text(json.dumps(meta or {}, indent=2))
+
+    # Swap the whole set in with one rename of the `current` symlink
+    link = directory / f'{CURRENT}.tmp'
+    if link.is_symlink():
+        link.unlink()
+    link.symlink_to(version, target_is_directory=True)
+    os.replace(link, directory / CURRENT)
+
+    versions = sorted(p for p in directory.glob('v*') if p.is_dir())
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(old, ignore_errors=True)
+    return target
+
+
+# ============= EVALUATION =============
+
+def split_holdout(X, test_fraction=0.2, seed=0):
+    """
+    Hide `test_fraction` of each user's items (users with 2+ items).
+
+    Returns (train matrix, {row: set of held-out item indices}).
+    """
+    rng = np.random.default_rng(seed)
+    X = X.tocsr()
+    keep = np.ones(X.nnz, dtype=bool)
+    held_out = {}
+    for row in range(X.shape[0]):
+        start, end = X.indptr[row], X.indptr[row + 1]
+        if end - start < 2:
+            continue
+        n_test = max(1, int(round((end - start) * test_fraction)))
+        picked = rng.choice(np.arange(start, end), size=n_test, replace=False)
+        keep[picked] = False
+        held_out[row] = set(X.indices[picked].tolist())
+    train = X.copy()
+    train.data = np.where(keep, train.data, 0).astype(train.data.dtype)
+    train.eliminate_zeros()
+    return train, held_out
+
+
+def evaluate(X, k=10, test_fraction=0.2, seed=0, **params):
+    """
+    Offline precision@k / recall@k of ALS against a hold-out split, with a
+    "most popular" baseline for comparison.
+    """
+    train, held_out = split_holdout(X, test_fraction=test_fraction, seed=seed)
+    user_factors, item_factors = train_als(train, seed=seed, **params)
+    popularity = np.asarray((train > 0).sum(axis=0)).ravel().astype(np.float32)
+
+    totals = {'als': [0.0, 0.0], 'popular': [0.0, 0.0]}
+    for row, relevant in held_out.items():
+        seen = train.indices[train.indptr[row]:train.indptr[row + 1]]
+        ranked = {
+            'als': top_items(user_factors[row], item_factors, k, seen),
+            'popular': top_items(np.ones(1, dtype=np.float32), popularity[:, None], k, seen),
+        }
+        for name, items in ranked.items():
+            hits = len(relevant.intersection(items.tolist()))
+            totals[name][0] += hits / k
+            totals[name][1] += hits / len(relevant)
+
+    users = max(1, len(held_out))
+    return {
+        'k': k,
+        'users': len(held_out),
+        **{f'{name}_precision': round(p / users, 4) for name, (p, _) in totals.items()},
+        **{f'{name}_recall': round(r / users, 4) for name, (_, r) in totals.items()},
+    }
+
+
+# ============= SERVING =============
+
+class FactorModel:
+    """Memory-mapped factors loaded from RECOMMENDER_MODEL_DIR"""
+
+    def __init__(self, directory, version):
+        self.version = version
+        directory = directory / version
+        arrays = {name: np.load(directory / f'{name}.npy', mmap_mode='r') for name in FILES}
+        self.user_factors = arrays['user_factors']
+        self.item_factors = arrays['item_factors']
+        self.user_row = {int(uid): i for i, uid in enumerate(arrays['user_ids'])}
+        self.movie_ids = arrays['movie_ids']
+        self.movie_col = {str(mid): i for i, mid in enumerate(self.movie_ids)}
+
+    def recommend(self, user_id, k=10, exclude=()):
+        """Best `k` movie ids for a user, or [] if the user wasn't in the training data"""
+        row = self.user_row.get(user_id)
+        if row is None:
+            return []
+        seen = {self.movie_col[m] for m in exclude if m in self.movie_col}
+        best = top_items(np.asarray(self.user_factors[row]), self.item_factors, k, seen)
+        return [str(self.movie_ids[i]) for i in best]
+
+
+def get_model():
+    """The current FactorModel, or None if no model has been trained yet"""
+    global _model
+    directory = Path(settings.RECOMMENDER_MODEL_DIR)
+    try:
+        version = os.readlink(directory / CURRENT)
+    except FileNotFoundError:
+        return None
+    if _model is None or _model.version != version:
+        with _model_lock:
+            if _model is None or _model.version != version:
+                _model = FactorModel(directory, version)
+    return _model
+
+
+def recommend_for_user(user, k=10, exclude=()):
+    """Movie ids ranked by the factor model ([] if there is no model or no data for the user)"""
+    model = get_model()
+    if model is None:
+        return []
+    return model.recommend(user.id, k=k, exclude=exclude)
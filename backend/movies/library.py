@@ -0,0 +1,97 @@
+"""
+Query engine behind GET /api/movies/library/.
+
+All shelves come out of a single query over UserMovieInteraction: the
+user's review is LEFT JOINed in via a FilteredRelation, per-shelf totals
+are a COUNT() window and the first page of every shelf is cut with a
+ROW_NUMBER() window. Later pages of one shelf use the keyset cursors from
+tunr_backend.pagination.
+"""
+from django.db.models import Count, F, FilteredRelation, Q, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from tunr_backend.pagination import encode_cursor, paginate
+from .models import UserMovieInteraction
+
+# Response key -> UserMovieInteraction.interaction_type
+SHELVES = {
+    'watched': 'watched',
+    'want_to_watch': 'want_to_watch',
+    'loved': 'love',
+}
+
+# ?sort= value -> keyset ordering (all non-null, ending in a unique column)
+SORTS = {
+    'added': ['-created_at', '-id'],
+    'rating': ['-sort_rating', '-created_at', '-id'],
+    'year': ['-sort_year', '-created_at', '-id'],
+}
+
+
+def _base_queryset(user):
+    return UserMovieInteraction.objects.filter(user=user).select_related('movie').annotate(
+        user_review=FilteredRelation('movie__reviews', condition=Q(movie__reviews__user=user)),
+    ).annotate(
+        user_rating=F('user_review__rating'),
+        user_review_text=F('user_review__review_text'),
+        sort_rating=Coalesce(F('user_review__rating'), Value(0)),
+        sort_year=Coalesce(F('movie__year_start'), Value(0)),
+    )
+
+
+def _order_expressions(ordering):
+    return [F(f.lstrip('-')).desc() if f.startswith('-') else F(f).asc() for f in ordering]
+
+
+def _cursor_for(item, ordering):
+    return encode_cursor(getattr(item, f.lstrip('-')) for f in ordering)
+
+
+def first_pages(user, sort, page_size):
+    """
+    First page of every shelf plus shelf totals, in one query.
+
+    Returns ({shelf: [interactions]}, {shelf: total}, {shelf: next_cursor}).
+    """
+    ordering = SORTS[sort]
+    types = {interaction_type: shelf for shelf, interaction_type in SHELVES.items()}
+    rows = _base_queryset(user).filter(interaction_type__in=list(types)).annotate(
+        shelf_total=Window(Count('id'), partition_by=[F('interaction_type')]),
+        shelf_rank=Window(
+            RowNumber(),
+            partition_by=[F('interaction_type')],
+            order_by=_order_expressions(ordering),
+        ),
+    ).filter(shelf_rank__lte=page_size + 1).order_by('interaction_type', 'shelf_rank')
+
+    items = {shelf: [] for shelf in SHELVES}
+    totals = {shelf: 0 for shelf in SHELVES}
+    for row in rows:
+        shelf = types[row.interaction_type]
+        items[shelf].append(row)
+        totals[shelf] = row.shelf_total
+
+    cursors = {}
+    for shelf, shelf_items in items.items():
+        cursors[shelf] = None
+        if len(shelf_items) > page_size:
+            del shelf_items[page_size:]
+            cursors[shelf] = _cursor_for(shelf_items[-1], ordering)
+    return items, totals, cursors
+
+
+def shelf_page(user, shelf, sort, page_size, cursor=None):
+    """
+    One page of one shelf. The total is only computed (in the same query)
+    for the first page.
+
+    Returns (interactions, total or None, next_cursor).
+    """
+    queryset = _base_queryset(user).filter(interaction_type=SHELVES[shelf])
+    if not cursor:
+        queryset = queryset.annotate(shelf_total=Window(Count('id')))
+    items, next_cursor = paginate(queryset, SORTS[sort], cursor=cursor, page_size=page_size)
+    total = None
+    if not cursor:
+        total = items[0].shelf_total if items else 0
+    return items, total, next_cursor
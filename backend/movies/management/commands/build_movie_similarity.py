@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from movies.similarity import rebuild_similar_movies
+
+
+class Command(BaseCommand):
+    help = 'Precompute item-item movie neighbours for "because you liked" recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours', type=int, default=settings.MOVIE_SIMILARITY_NEIGHBOURS,
+            help='Similar movies kept per title',
+        )
+        parser.add_argument(
+            '--min-support', type=int, default=settings.MOVIE_SIMILARITY_MIN_SUPPORT,
+            help='Minimum number of users who engaged with both movies',
+        )
+        parser.add_argument('--chunk-size', type=int, default=500, help='Movies per matrix block')
+
+    def handle(self, *args, **options):
+        stored = rebuild_similar_movies(
+            k=options['neighbours'],
+            min_support=options['min_support'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Stored {stored} similar-movie rows"))
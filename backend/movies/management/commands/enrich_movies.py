@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from movies.catalog import claim_enrichment_batch, process_enrichment_batch
+
+
+class Command(BaseCommand):
+    help = 'Fill in OMDb details for movies queued by the review / watch-state endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Tasks claimed per batch')
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.MOVIE_ENRICHMENT_CONCURRENCY,
+            help='Parallel OMDb requests per batch',
+        )
+        parser.add_argument('--max-attempts', type=int, default=5, help='Give up on a title after this many errors')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when empty')
+        parser.add_argument('--sleep', type=float, default=5.0, help='Seconds to wait between polls in --loop mode')
+
+    def handle(self, *args, **options):
+        total_enriched = total_failed = 0
+        while True:
+            ids = claim_enrichment_batch(options['batch_size'])
+            if not ids:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            enriched, failed = process_enrichment_batch(
+                ids,
+                concurrency=options['concurrency'],
+                max_attempts=options['max_attempts'],
+            )
+            total_enriched += enriched
+            total_failed += failed
+            self.stdout.write(f"Batch of {len(ids)}: {enriched} enriched, {failed} failed")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Enrichment queue drained: {total_enriched} enriched, {total_failed} failed"
+        ))
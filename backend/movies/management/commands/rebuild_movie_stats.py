@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from movies.models import MovieReview, MovieStats, UserMovieInteraction
+
+
+class Command(BaseCommand):
+    help = 'Recompute the MovieStats table from reviews and interactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = {}
+
+        def row(movie_id):
+            if movie_id not in stats:
+                stats[movie_id] = MovieStats(movie_id=movie_id)
+            return stats[movie_id]
+
+        reviews = MovieReview.objects.values('movie_id').annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+        )
+        for item in reviews:
+            movie_stats = row(item.pop('movie_id'))
+            for field, value in item.items():
+                setattr(movie_stats, field, value or 0)
+
+        interactions = UserMovieInteraction.objects.values('movie_id', 'interaction_type').annotate(n=Count('id'))
+        for item in interactions:
+            field = MovieStats.INTERACTION_FIELDS.get(item['interaction_type'])
+            if field:
+                setattr(row(item['movie_id']), field, item['n'])
+
+        counters = [f.name for f in MovieStats._meta.concrete_fields if f.name not in ('movie', 'updated_at')]
+        with transaction.atomic():
+            # Movies that lost all their reviews/interactions drop back to zero
+            MovieStats.objects.update(**{field: 0 for field in counters})
+            MovieStats.objects.bulk_create(
+                list(stats.values()),
+                batch_size=options['batch_size'],
+                update_conflicts=True,
+                unique_fields=['movie'],
+                update_fields=counters + ['updated_at'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {len(stats)} movies"))
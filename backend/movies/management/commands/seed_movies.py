@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies import omdb
+from movies.catalog import bulk_upsert_omdb_details
+from movies.models import Movie
+from tunr_backend.upstream import RateLimiter
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load movies into the catalog from a list of IMDb ids (one per line)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', nargs='?', default='-', help='File of IMDb ids, or "-" for stdin')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent OMDb requests')
+        parser.add_argument('--rate', type=float, default=10.0, help='Max OMDb requests per second')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows upserted per INSERT')
+        parser.add_argument(
+            '--checkpoint',
+            help='JSON file recording progress; re-running with the same file resumes where it stopped',
+        )
+        parser.add_argument('--refresh', action='store_true', help='Re-fetch titles that are already enriched')
+
+    def _read_ids(self, source):
+        stream = sys.stdin if source == '-' else open(source)
+        try:
+            for line in stream:
+                imdb_id = line.strip()
+                if imdb_id and not imdb_id.startswith('#'):
+                    yield imdb_id
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def _load_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f).get('position', 0)
+        return 0
+
+    def _save_checkpoint(self, path, position):
+        if not path:
+            return
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'position': position}, f)
+        os.replace(tmp, path)
+
+    def handle(self, *args, **options):
+        if options['source'] != '-' and not os.path.exists(options['source']):
+            raise CommandError(f"File not found: {options['source']}")
+
+        limiter = RateLimiter(options['rate'])
+        batch_size = options['batch_size']
+        checkpoint = options['checkpoint']
+        start = self._load_checkpoint(checkpoint)
+        if start:
+            self.stdout.write(f"Resuming after {start} ids")
+
+        def fetch(imdb_id):
+            """(payload, transient error) for one id"""
+            limiter.acquire()
+            try:
+                data = omdb.get_details(imdb_id)
+            except omdb.OMDbError as e:
+                return None, str(e)
+            if data.get('Response') == 'True' or omdb.is_negative(data):
+                return data, None
+            # e.g. "Request limit reached!": worth retrying later
+            return None, data.get('Error') or 'Unknown OMDb error'
+
+        position = 0
+        saved = skipped = failed = 0
+        batch = []
+
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            def flush():
+                """Store one batch; False (checkpoint not advanced) if any id should be retried"""
+                nonlocal saved, skipped, failed
+                ids = list(dict.fromkeys(batch))
+                if not options['refresh']:
+                    done = set(
+                        Movie.objects.filter(Movie.ENRICHED, imdb_id__in=ids)
+                        .values_list('imdb_id', flat=True)
+                    )
+                    ids = [i for i in ids if i not in done]
+                    skipped += len(done)
+                results = dict(zip(ids, pool.map(fetch, ids)))
+                payloads = [d for d, _ in results.values() if d and d.get('Response') == 'True']
+                # Keep what did arrive; a re-run skips it as already enriched
+                if payloads:
+                    bulk_upsert_omdb_details(payloads)
+                saved += len(payloads)
+                retry = {imdb_id: error for imdb_id, (_, error) in results.items() if error}
+                if retry:
+                    for imdb_id, error in retry.items():
+                        self.stderr.write(f"{imdb_id}: {error}")
+                    return False
+                failed += len(ids) - len(payloads)
+                self._save_checkpoint(checkpoint, position)
+                self.stdout.write(f"{position} ids read: {saved} saved, {skipped} skipped, {failed} failed")
+                batch.clear()
+                return True
+
+            complete = True
+            for imdb_id in self._read_ids(options['source']):
+                position += 1
+                if position <= start:
+                    continue
+                batch.append(imdb_id)
+                if len(batch) >= batch_size:
+                    complete = flush()
+                    if not complete:
+                        break
+            if complete and batch:
+                complete = flush()
+
+        if not complete:
+            raise CommandError(
+                f"Stopped on OMDb errors after {saved} saved; re-run with the same --checkpoint to resume"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeding finished: {saved} saved, {skipped} already present, {failed} failed"
+        ))
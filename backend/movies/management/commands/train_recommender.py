@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from movies.factorization import evaluate, save_model, train_als
+from movies.similarity import build_preference_matrix
+
+
+class Command(BaseCommand):
+    help = 'Train the ALS movie recommender and write its factors to RECOMMENDER_MODEL_DIR'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=32)
+        parser.add_argument('--regularization', type=float, default=0.1)
+        parser.add_argument('--iterations', type=int, default=15)
+        parser.add_argument('--alpha', type=float, default=20.0, help='Confidence scaling of preference weights')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--evaluate', action='store_true',
+            help='Report precision@k / recall@k on a hold-out split before training the final model',
+        )
+        parser.add_argument('--k', type=int, default=10, help='Cut-off for --evaluate')
+        parser.add_argument('--test-fraction', type=float, default=0.2, help='Share of each user\'s items held out')
+        parser.add_argument('--dry-run', action='store_true', help='Don\'t write the model')
+
+    def handle(self, *args, **options):
+        params = {
+            'factors': options['factors'],
+            'regularization': options['regularization'],
+            'iterations': options['iterations'],
+            'alpha': options['alpha'],
+        }
+        X, user_ids, movie_ids = build_preference_matrix()
+        if not X.nnz:
+            self.stdout.write(self.style.WARNING('No reviews or interactions to train on'))
+            return
+        self.stdout.write(f"Training on {X.nnz} signals from {len(user_ids)} users x {len(movie_ids)} movies")
+
+        report = None
+        if options['evaluate']:
+            report = evaluate(
+                X, k=options['k'], test_fraction=options['test_fraction'], seed=options['seed'], **params
+            )
+            self.stdout.write(json.dumps(report, indent=2))
+
+        user_factors, item_factors = train_als(X, seed=options['seed'], **params)
+        if options['dry_run']:
+            return
+        save_model(user_factors, item_factors, user_ids, movie_ids, meta={
+            'trained_at': timezone.now().isoformat(),
+            'users': len(user_ids),
+            'movies': len(movie_ids),
+            'signals': int(X.nnz),
+            'params': params,
+            'evaluation': report,
+        })
+        self.stdout.write(self.style.SUCCESS(f"Saved {options['factors']}-factor model"))
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_movieenrichmenttask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Person',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovieGenre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movie_genres', to='movies.genre')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movie_genres', to='movies.movie')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='genres',
+            field=models.ManyToManyField(blank=True, related_name='movies', through='movies.MovieGenre', to='movies.genre'),
+        ),
+        migrations.CreateModel(
+            name='MovieCredit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('director', 'Director'), ('actor', 'Actor')], max_length=10)),
+                ('billing_order', models.PositiveSmallIntegerField(default=0)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movies.movie')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movies.person')),
+            ],
+            options={
+                'ordering': ['billing_order'],
+            },
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='people',
+            field=models.ManyToManyField(blank=True, related_name='movies', through='movies.MovieCredit', to='movies.person'),
+        ),
+        migrations.AddIndex(
+            model_name='moviegenre',
+            index=models.Index(fields=['genre', 'movie'], name='movies_movi_genre_i_decaf6_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='moviegenre',
+            unique_together={('movie', 'genre')},
+        ),
+        migrations.AddIndex(
+            model_name='moviecredit',
+            index=models.Index(fields=['person', 'role', 'movie'], name='movies_movi_person__b65c21_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='moviecredit',
+            unique_together={('movie', 'person', 'role')},
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+def split_names(value):
+    names = []
+    for name in (value or '').split(','):
+        name = name.strip()
+        if name and name != 'N/A' and name not in names:
+            names.append(name)
+    return names
+
+
+def populate(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    Genre = apps.get_model('movies', 'Genre')
+    Person = apps.get_model('movies', 'Person')
+    MovieGenre = apps.get_model('movies', 'MovieGenre')
+    MovieCredit = apps.get_model('movies', 'MovieCredit')
+
+    genres, people = {}, {}
+    movie_genres, credits = [], []
+    for movie in Movie.objects.only('imdb_id', 'genre', 'director', 'actors').iterator():
+        for name in split_names(movie.genre):
+            name = name[:50]
+            if name not in genres:
+                genres[name] = Genre.objects.get_or_create(name=name)[0]
+            movie_genres.append(MovieGenre(movie_id=movie.imdb_id, genre=genres[name]))
+        order = 0
+        for role, value in (('director', movie.director), ('actor', movie.actors)):
+            for name in split_names(value):
+                name = name[:255]
+                if name not in people:
+                    people[name] = Person.objects.get_or_create(name=name)[0]
+                credits.append(MovieCredit(movie_id=movie.imdb_id, person=people[name], role=role, billing_order=order))
+                order += 1
+
+    MovieGenre.objects.bulk_create(movie_genres, batch_size=1000, ignore_conflicts=True)
+    MovieCredit.objects.bulk_create(credits, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_genre_person'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_populate_genres_people'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_score',
+            field=models.DecimalField(blank=True, decimal_places=1, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='runtime_minutes',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='year_end',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='year_start',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['year_start', 'imdb_score'], name='movies_movi_year_st_d806d8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['imdb_score'], name='movies_movi_imdb_sc_ad14f5_idx'),
+        ),
+    ]
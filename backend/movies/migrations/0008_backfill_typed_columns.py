@@ -0,0 +1,37 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    batch = []
+    for movie in Movie.objects.only('imdb_id', 'year', 'runtime', 'imdb_rating').iterator():
+        years = [int(y) for y in re.findall(r'\d{4}', movie.year or '')]
+        movie.year_start = years[0] if years else None
+        movie.year_end = years[1] if len(years) > 1 else None
+        runtime = re.search(r'\d+', movie.runtime or '')
+        movie.runtime_minutes = int(runtime.group()) if runtime else None
+        try:
+            rating = Decimal((movie.imdb_rating or '').strip())
+            movie.imdb_score = rating if rating.is_finite() and 0 <= rating <= 10 else None
+        except InvalidOperation:
+            movie.imdb_score = None
+        batch.append(movie)
+        if len(batch) >= 1000:
+            Movie.objects.bulk_update(batch, ['year_start', 'year_end', 'runtime_minutes', 'imdb_score'])
+            batch = []
+    if batch:
+        Movie.objects.bulk_update(batch, ['year_start', 'year_end', 'runtime_minutes', 'imdb_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_movie_typed_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_backfill_typed_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieStats',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='movies.movie')),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_1', models.IntegerField(default=0)),
+                ('rating_2', models.IntegerField(default=0)),
+                ('rating_3', models.IntegerField(default=0)),
+                ('rating_4', models.IntegerField(default=0)),
+                ('rating_5', models.IntegerField(default=0)),
+                ('watched_count', models.IntegerField(default=0)),
+                ('want_to_watch_count', models.IntegerField(default=0)),
+                ('like_count', models.IntegerField(default=0)),
+                ('love_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'movie stats',
+            },
+        ),
+    ]
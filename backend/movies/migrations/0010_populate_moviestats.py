@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+INTERACTION_FIELDS = {
+    'watched': 'watched_count',
+    'want_to_watch': 'want_to_watch_count',
+    'like': 'like_count',
+    'love': 'love_count',
+}
+
+
+def populate(apps, schema_editor):
+    MovieReview = apps.get_model('movies', 'MovieReview')
+    MovieStats = apps.get_model('movies', 'MovieStats')
+    UserMovieInteraction = apps.get_model('movies', 'UserMovieInteraction')
+
+    stats = {}
+    reviews = MovieReview.objects.values('movie_id').annotate(
+        review_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+    )
+    for item in reviews:
+        movie_id = item.pop('movie_id')
+        stats[movie_id] = MovieStats(movie_id=movie_id, **{k: v or 0 for k, v in item.items()})
+
+    for item in UserMovieInteraction.objects.values('movie_id', 'interaction_type').annotate(n=Count('id')):
+        field = INTERACTION_FIELDS.get(item['interaction_type'])
+        if field:
+            row = stats.setdefault(item['movie_id'], MovieStats(movie_id=item['movie_id']))
+            setattr(row, field, item['n'])
+
+    MovieStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_moviestats'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
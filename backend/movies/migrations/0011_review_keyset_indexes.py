@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_populate_moviestats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moviereview',
+            index=models.Index(fields=['movie', '-created_at', '-id'], name='movies_movi_movie_i_cf8960_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moviereview',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='movies_movi_user_id_366f6d_idx'),
+        ),
+    ]
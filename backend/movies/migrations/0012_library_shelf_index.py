@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_review_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usermovieinteraction',
+            index=models.Index(fields=['user', 'interaction_type', '-created_at', '-id'], name='movies_user_user_id_6a3970_idx'),
+        ),
+    ]
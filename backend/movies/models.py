@@ -1,6 +1,57 @@
+import re
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from accounts.models import CustomUser
 
+def parse_year_range(value):
+    """OMDb year ("1999", "2008–2013", "2019–") -> (start, end) ints or None"""
+    years = [int(y) for y in re.findall(r'\d{4}', value or '')]
+    if not years:
+        return None, None
+    return years[0], years[1] if len(years) > 1 else None
+
+
+def parse_runtime(value):
+    """OMDb runtime ("142 min") -> minutes or None"""
+    match = re.search(r'\d+', value or '')
+    return int(match.group()) if match else None
+
+
+def parse_rating(value):
+    """OMDb rating ("7.8", "N/A") -> Decimal or None"""
+    try:
+        rating = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return rating if rating.is_finite() and 0 <= rating <= 10 else None
+
+
+class Genre(models.Model):
+    """A single genre name, e.g. "Action" (split out of Movie.genre)"""
+    name = models.CharField(max_length=50, unique=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class Person(models.Model):
+    """A director or actor (split out of Movie.director / Movie.actors)"""
+    name = models.CharField(max_length=255, unique=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
 # Movie data from OMDb
 class Movie(models.Model):
     """Store movie data from OMDb"""
@@ -15,14 +66,113 @@ class Movie(models.Model):
     imdb_rating = models.CharField(max_length=10, blank=True)
     runtime = models.CharField(max_length=20, blank=True)
     
+    # Typed copies of year/runtime/imdb_rating, parsed on save so filters and sorts run in SQL
+    year_start = models.PositiveSmallIntegerField(null=True, blank=True)
+    year_end = models.PositiveSmallIntegerField(null=True, blank=True)
+    runtime_minutes = models.PositiveSmallIntegerField(null=True, blank=True)
+    imdb_score = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True)
+    
+    # Normalized copies of genre/director/actors, kept in sync by movies.catalog
+    genres = models.ManyToManyField(Genre, through='MovieGenre', related_name='movies', blank=True)
+    people = models.ManyToManyField(Person, through='MovieCredit', related_name='movies', blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Model field -> OMDb response key
+    OMDB_FIELDS = {
+        'title': 'Title',
+        'year': 'Year',
+        'genre': 'Genre',
+        'director': 'Director',
+        'actors': 'Actors',
+        'plot': 'Plot',
+        'poster': 'Poster',
+        'imdb_rating': 'imdbRating',
+        'runtime': 'Runtime',
+    }
+    
     def __str__(self):
         return f"{self.title} ({self.year})"
     
+    TYPED_FIELDS = ['year_start', 'year_end', 'runtime_minutes', 'imdb_score']
+    
+    # Queryset form of `is_enriched`
+    ENRICHED = ~models.Q(director='') | ~models.Q(plot='')
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['year_start', 'imdb_score']),
+            models.Index(fields=['imdb_score']),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.parse_typed_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.TYPED_FIELDS)
+        super().save(*args, **kwargs)
+    
+    def parse_typed_fields(self):
+        """Refresh the typed columns from the OMDb text fields"""
+        self.year_start, self.year_end = parse_year_range(self.year)
+        self.runtime_minutes = parse_runtime(self.runtime)
+        self.imdb_score = parse_rating(self.imdb_rating)
+    
+    @property
+    def is_enriched(self):
+        """True once full OMDb details have been copied in (stubs only carry title/year/poster)"""
+        return bool(self.director or self.plot)
+    
+    def is_stale(self):
+        max_age = timedelta(seconds=settings.MOVIE_DETAIL_STALE_AFTER)
+        return self.updated_at is None or timezone.now() - self.updated_at > max_age
+    
+    def apply_omdb(self, data):
+        """Copy an OMDb detail payload onto this instance (doesn't save)"""
+        for field, key in self.OMDB_FIELDS.items():
+            default = getattr(self, field) if field == 'title' else ''
+            setattr(self, field, data.get(key, default) or default)
+    
+    def to_omdb(self):
+        """Render the row in the same shape as an OMDb detail response"""
+        data = {key: getattr(self, field) for field, key in self.OMDB_FIELDS.items()}
+        data.update({'imdbID': self.imdb_id, 'Type': 'movie', 'Response': 'True'})
+        return data
+
+
+class MovieGenre(models.Model):
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='movie_genres')
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name='movie_genres')
+    
+    class Meta:
+        unique_together = ['movie', 'genre']
+        indexes = [
+            models.Index(fields=['genre', 'movie']),
+        ]
+
+
+class MovieCredit(models.Model):
+    ROLE_CHOICES = [
+        ('director', 'Director'),
+        ('actor', 'Actor'),
+    ]
+    
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='credits')
+    person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name='credits')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    billing_order = models.PositiveSmallIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['movie', 'person', 'role']
+        ordering = ['billing_order']
+        indexes = [
+            models.Index(fields=['person', 'role', 'movie']),
+        ]
+    
+    def __str__(self):
+        return f"{self.person.name} ({self.role}) - {self.movie_id}"
 
 
 class UserMovieInteraction(models.Model):
@@ -42,6 +192,10 @@ class UserMovieInteraction(models.Model):
     class Meta:
         unique_together = ['user', 'movie', 'interaction_type']
         ordering = ['-created_at']
+        indexes = [
+            # Library shelves, newest first
+            models.Index(fields=['user', 'interaction_type', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.interaction_type} - {self.movie.title}"
@@ -74,10 +228,22 @@ class MovieReview(models.Model):
     class Meta:
         unique_together = ['user', 'movie']
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a movie's / a user's reviews
+            models.Index(fields=['movie', '-created_at', '-id']),
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.movie.title} ({self.rating}⭐)"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so MovieStats can apply the delta on update
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+    
     def save(self, *args, **kwargs):
         # Auto-mark as watched when review is created
         UserMovieInteraction.objects.get_or_create(
@@ -88,3 +254,90 @@ class MovieReview(models.Model):
         super().save(*args, **kwargs)
 
 
+
+
+class MovieEnrichmentTask(models.Model):
+    """Queue of movies waiting for their full OMDb details (see `manage.py enrich_movies`)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('in_progress', 'In Progress'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True, related_name='enrichment_task')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.movie_id} ({self.status})"
+
+
+class MovieStats(models.Model):
+    """Per-movie aggregates, maintained incrementally by movies.signals"""
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+    watched_count = models.IntegerField(default=0)
+    want_to_watch_count = models.IntegerField(default=0)
+    like_count = models.IntegerField(default=0)
+    love_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # interaction_type -> counter column
+    INTERACTION_FIELDS = {
+        'watched': 'watched_count',
+        'want_to_watch': 'want_to_watch_count',
+        'like': 'like_count',
+        'love': 'love_count',
+    }
+    
+    class Meta:
+        verbose_name_plural = 'movie stats'
+    
+    def __str__(self):
+        return f"{self.movie_id}: {self.review_count} reviews"
+    
+    @property
+    def average_rating(self):
+        return round(self.rating_sum / self.review_count, 1) if self.review_count else 0
+    
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}') for star in range(1, 6)}
+
+
+class SimilarMovie(models.Model):
+    """
+    Item-item neighbours: the top-N movies most often enjoyed by the same
+    people as `movie`. Built by `manage.py build_movie_similarity`.
+    """
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similar_movies')
+    similar = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    support = models.PositiveIntegerField(default=0)  # users who engaged with both
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['movie', 'similar']
+        indexes = [
+            models.Index(fields=['movie', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.movie_id} ~ {self.similar_id} ({self.score:.3f})"
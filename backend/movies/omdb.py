@@ -0,0 +1,248 @@
+"""
+OMDb client with a two-tier response cache.
+
+Every OMDb lookup in the app goes through this module so that a title is
+fetched from omdbapi.com at most once per TTL window:
+
+1. an in-process LRU (per gunicorn worker, no I/O at all)
+2. the Django cache (shared by every worker and surviving restarts)
+
+Entries are keyed by a hash of the normalized search query (memcached-safe
+whatever the user typed) or by the IMDb id. "Movie not
+found" answers are cached too (negative caching, shorter TTL) so that bad
+ids coming from the frontend don't hit the upstream on every page view.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from tunr_backend.upstream import get_client
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'omdb'
+
+# Errors that describe the title itself (safe to cache) as opposed to
+# transient/account problems like "Request limit reached!"
+NEGATIVE_ERRORS = ('movie not found', 'incorrect imdb id', 'too many results')
+
+
+class OMDbError(Exception):
+    """Raised when OMDb can't be reached or isn't configured"""
+
+
+class LRUCache:
+    """Small thread-safe LRU with a per-entry expiry"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local = LRUCache(settings.OMDB_LOCAL_CACHE_SIZE)
+_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'negative_hits': 0, 'upstream_errors': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_stats():
+    """Snapshot of the cache counters for this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+    stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 3) if lookups else 0.0
+    stats['local_entries'] = len(_local)
+    return stats
+
+
+def normalize_query(query):
+    """Collapse case and whitespace so equivalent searches share one entry"""
+    return ' '.join((query or '').lower().split())
+
+
+def is_negative(data):
+    """True for a definitive "not found" answer: worth caching, not worth retrying"""
+    error = (data.get('Error') or '').lower()
+    return data.get('Response') == 'False' and any(e in error for e in NEGATIVE_ERRORS)
+
+
+def _cache_lookup(key):
+    data = _local.get(key)
+    if data is not None:
+        _count('local_hits')
+    else:
+        try:
+            entry = cache.get(key)
+        except Exception as e:
+            # The shared tier is an optimisation; never fail a request over it
+            logger.warning('OMDb shared cache read failed: %s', e)
+            entry = None
+        if entry is None:
+            return None
+        data, remaining = entry['data'], entry['expires_at'] - time.time()
+        if remaining <= 0:
+            return None
+        _local.set(key, data, remaining)
+        _count('shared_hits')
+    if data.get('Response') == 'False':
+        _count('negative_hits')
+    return data
+
+
+def _cache_store(key, data, ttl):
+    _local.set(key, data, ttl)
+    try:
+        cache.set(key, {'data': data, 'expires_at': time.time() + ttl}, ttl)
+    except Exception as e:
+        logger.warning('OMDb shared cache write failed: %s', e)
+
+
+def _fetch(params, key, ttl):
+    cached = _cache_lookup(key)
+    if cached is not None:
+        return cached
+
+    api_key = settings.OMDB_API_KEY
+    if not api_key:
+        raise OMDbError('OMDB API key not configured')
+
+    _count('misses')
+    try:
+        response = get_client('omdb').get('', params={**params, 'apikey': api_key})
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        _count('upstream_errors')
+        raise OMDbError(f'OMDb request failed: {e}') from e
+
+    if data.get('Response') == 'True':
+        _cache_store(key, data, ttl)
+    elif is_negative(data):
+        _cache_store(key, data, settings.OMDB_NEGATIVE_CACHE_TTL)
+    return data
+
+
+def search(query):
+    """Search OMDb for movies matching `query` (raw OMDb payload)"""
+    normalized = normalize_query(query)
+    return _fetch(
+        {'s': normalized, 'type': 'movie'},
+        f'{CACHE_PREFIX}:search:{hashlib.sha1(normalized.encode()).hexdigest()}',
+        settings.OMDB_SEARCH_CACHE_TTL,
+    )
+
+
+def get_details(imdb_id):
+    """Full OMDb record for an IMDb id (raw OMDb payload)"""
+    imdb_id = (imdb_id or '').strip().lower()
+    return _fetch(
+        {'i': imdb_id},
+        f'{CACHE_PREFIX}:detail:{imdb_id}',
+        settings.OMDB_DETAIL_CACHE_TTL,
+    )
+
+
+def invalidate(imdb_id):
+    """Drop a cached detail record (e.g. after an admin correction)"""
+    key = f'{CACHE_PREFIX}:detail:{(imdb_id or "").strip().lower()}'
+    _local.delete(key)
+    try:
+        cache.delete(key)
+    except Exception as e:
+        logger.warning('OMDb shared cache delete failed: %s', e)
+
+
+def _in_worker(func, *args):
+    try:
+        return func(*args)
+    finally:
+        # Worker threads get their own DB connection (for the shared cache tier)
+        connection.close()
+
+
+def search_details(queries, per_query=10, timeout=1.0, exclude=(), max_workers=8):
+    """
+    Run `queries` concurrently and fetch the full record of the first
+    `per_query` hits of each, all within `timeout` seconds.
+
+    Returns (details, complete): the detail payloads that arrived in time,
+    in query/hit order, and whether everything finished. Calls still in
+    flight at the deadline are left to finish in the background, so their
+    answers land in the cache for the next request.
+    """
+    deadline = time.monotonic() + timeout
+    seen = set(exclude)
+    searches, fetches, results = {}, {}, {}
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='omdb')
+    try:
+        for position, query in enumerate(queries):
+            searches[pool.submit(_in_worker, search, query)] = position
+        pending = set(searches)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    data = future.result()
+                except Exception as e:
+                    logger.warning('OMDb lookup failed: %s', e)
+                    continue
+                if future in fetches:
+                    results[fetches[future]] = data
+                    continue
+                if data.get('Response') != 'True':
+                    continue
+                for rank, hit in enumerate(data.get('Search', [])[:per_query]):
+                    imdb_id = hit.get('imdbID')
+                    if imdb_id and imdb_id not in seen:
+                        seen.add(imdb_id)
+                        fetch = pool.submit(_in_worker, get_details, imdb_id)
+                        fetches[fetch] = (searches[future], rank)
+                        pending.add(fetch)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return [results[key] for key in sorted(results)], not pending
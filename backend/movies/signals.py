@@ -0,0 +1,70 @@
+"""
+Keeps MovieStats in step with review and interaction writes.
+
+The deltas run inside the write's own transaction (the views wrap each
+write in transaction.atomic()), so the counts can't drift from the rows.
+"""
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import MovieReview, MovieStats, UserMovieInteraction
+
+
+def _rating_field(rating):
+    rating = int(rating)
+    return f'rating_{rating}' if 1 <= rating <= 5 else None
+
+
+def apply_stats_delta(movie_id, deltas):
+    """Add `deltas` ({column: +/-n}) to a movie's stats row, creating it if needed"""
+    deltas = {field: n for field, n in deltas.items() if field and n}
+    if not deltas:
+        return
+    # Only increments need the row to exist; decrements during a cascade
+    # delete of the movie must not resurrect it
+    if any(n > 0 for n in deltas.values()):
+        MovieStats.objects.bulk_create([MovieStats(movie_id=movie_id)], ignore_conflicts=True)
+    MovieStats.objects.filter(movie_id=movie_id).update(
+        **{field: F(field) + n for field, n in deltas.items()}
+    )
+
+
+@receiver(post_save, sender=MovieReview)
+def review_saved(sender, instance, created, **kwargs):
+    new_rating = int(instance.rating)
+    if created:
+        apply_stats_delta(instance.movie_id, {
+            'review_count': 1,
+            'rating_sum': new_rating,
+            _rating_field(new_rating): 1,
+        })
+    else:
+        old_rating = getattr(instance, '_loaded_rating', None)
+        if old_rating is not None and int(old_rating) != new_rating:
+            deltas = {'rating_sum': new_rating - int(old_rating)}
+            deltas[_rating_field(old_rating)] = -1
+            deltas[_rating_field(new_rating)] = 1
+            apply_stats_delta(instance.movie_id, deltas)
+    instance._loaded_rating = new_rating
+
+
+@receiver(post_delete, sender=MovieReview)
+def review_deleted(sender, instance, **kwargs):
+    rating = int(getattr(instance, '_loaded_rating', None) or instance.rating)
+    apply_stats_delta(instance.movie_id, {
+        'review_count': -1,
+        'rating_sum': -rating,
+        _rating_field(rating): -1,
+    })
+
+
+@receiver(post_save, sender=UserMovieInteraction)
+def interaction_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_stats_delta(instance.movie_id, {MovieStats.INTERACTION_FIELDS.get(instance.interaction_type): 1})
+
+
+@receiver(post_delete, sender=UserMovieInteraction)
+def interaction_deleted(sender, instance, **kwargs):
+    apply_stats_delta(instance.movie_id, {MovieStats.INTERACTION_FIELDS.get(instance.interaction_type): -1})
@@ -0,0 +1,151 @@
+"""
+Item-item collaborative filtering ("because you liked X").
+
+Each user's reviews and interactions are turned into one preference weight
+per movie:
+
+    review       (rating - 1) / 4, so 1 star counts for nothing and 5 stars for 1
+    watched      + 0.25
+    like         + 0.5
+    love         + 1.0
+
+This gives a sparse users x movies matrix X. With its columns L2-normalised,
+X.T @ X is the cosine similarity of every pair of movies, weighted by how
+much the shared audience enjoyed them. Pairs with fewer than
+MOVIE_SIMILARITY_MIN_SUPPORT shared users are dropped as noise. The top
+MOVIE_SIMILARITY_NEIGHBOURS of each movie are stored in SimilarMovie.
+
+At request time `because_you_liked()` joins the user's favourite movies to
+that table.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .models import MovieReview, SimilarMovie, UserMovieInteraction
+
+INTERACTION_WEIGHTS = {
+    'watched': 0.25,
+    'like': 0.5,
+    'love': 1.0,
+}
+WRITE_BATCH_SIZE = 1000
+
+
+def rating_weight(rating):
+    return (int(rating) - 1) / 4
+
+
+def build_preference_matrix():
+    """
+    Return (X, user_ids, movie_ids): users x movies CSR matrix of preference
+    weights (see module docstring) and the id of each row / column.
+    """
+    entries = [
+        (user_id, movie_id, rating_weight(rating))
+        for user_id, movie_id, rating in MovieReview.objects.values_list('user_id', 'movie_id', 'rating').iterator()
+    ]
+    entries += [
+        (user_id, movie_id, INTERACTION_WEIGHTS[kind])
+        for user_id, movie_id, kind in UserMovieInteraction.objects.filter(
+            interaction_type__in=list(INTERACTION_WEIGHTS)
+        ).values_list('user_id', 'movie_id', 'interaction_type').iterator()
+    ]
+    if not entries:
+        return sparse.csr_matrix((0, 0), dtype=np.float32), np.array([], dtype=np.int64), np.array([], dtype=object)
+
+    user_col, movie_col, weights = zip(*entries)
+    user_ids, rows = np.unique(np.array(user_col, dtype=np.int64), return_inverse=True)
+    movie_ids, cols = np.unique(np.array(movie_col, dtype=object), return_inverse=True)
+    X = sparse.csr_matrix(
+        (np.array(weights, dtype=np.float32), (rows, cols)),
+        shape=(len(user_ids), len(movie_ids)),
+    )
+    X.sum_duplicates()  # review + interactions on the same movie add up
+    X.eliminate_zeros()
+    return X, user_ids, movie_ids
+
+
+def compute_neighbours(X, movie_ids, k, min_support=1, chunk_size=500):
+    """SimilarMovie instances (unsaved) holding the top-`k` neighbours of every column of `X`"""
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    items = (X @ sparse.diags(inverse.astype(np.float32))).T.tocsr()  # movies x users
+    engaged = items.copy()
+    engaged.data[:] = 1
+
+    objs = []
+    for start in range(0, items.shape[0], chunk_size):
+        stop = min(start + chunk_size, items.shape[0])
+        scores = (items[start:stop] @ items.T).tocsr()
+        support = (engaged[start:stop] @ engaged.T).tocsr()
+        for offset in range(stop - start):
+            i = start + offset
+            row, row_support = scores.getrow(offset), support.getrow(offset)
+            shared = dict(zip(row_support.indices, row_support.data))
+            candidates = [
+                (score, j) for j, score in zip(row.indices, row.data)
+                if j != i and score > 0 and shared.get(j, 0) >= min_support
+            ]
+            candidates.sort(reverse=True)
+            objs += [
+                SimilarMovie(
+                    movie_id=movie_ids[i], similar_id=movie_ids[j], score=float(score), support=int(shared[j])
+                )
+                for score, j in candidates[:k]
+            ]
+    return objs
+
+
+def rebuild_similar_movies(k=None, min_support=None, chunk_size=500):
+    """Recompute the whole SimilarMovie table. Returns the number of rows stored."""
+    k = k or settings.MOVIE_SIMILARITY_NEIGHBOURS
+    if min_support is None:
+        min_support = settings.MOVIE_SIMILARITY_MIN_SUPPORT
+    X, _, movie_ids = build_preference_matrix()
+    objs = compute_neighbours(X, movie_ids, k, min_support=min_support, chunk_size=chunk_size) if X.nnz else []
+    with transaction.atomic():
+        SimilarMovie.objects.all().delete()
+        SimilarMovie.objects.bulk_create(objs, batch_size=WRITE_BATCH_SIZE)
+    return len(objs)
+
+
+def because_you_liked(user, exclude=(), seeds=20, limit=10):
+    """
+    Movies similar to the user's favourites, best first, as a list of
+    (movie_id, score, seed_movie_id). `seed_movie_id` is the favourite that
+    contributed most and is used for the reason.
+
+    Favourites are the user's 4-5 star reviews and loved / liked titles,
+    most recent first.
+    """
+    favourites = {}
+    for movie_id, rating in MovieReview.objects.filter(
+        user=user, rating__gte=4
+    ).order_by('-created_at').values_list('movie_id', 'rating')[:seeds]:
+        favourites[movie_id] = rating_weight(rating)
+    for movie_id, kind in UserMovieInteraction.objects.filter(
+        user=user, interaction_type__in=['love', 'like']
+    ).order_by('-created_at').values_list('movie_id', 'interaction_type')[:seeds]:
+        favourites[movie_id] = favourites.get(movie_id, 0) + INTERACTION_WEIGHTS[kind]
+    if not favourites:
+        return []
+
+    exclude = set(exclude) | set(favourites)
+    totals = defaultdict(float)
+    best_seed = {}
+    for seed_id, similar_id, score in SimilarMovie.objects.filter(
+        movie_id__in=list(favourites)
+    ).values_list('movie_id', 'similar_id', 'score'):
+        if similar_id in exclude:
+            continue
+        contribution = score * favourites[seed_id]
+        totals[similar_id] += contribution
+        if contribution > best_seed.get(similar_id, (0, None))[0]:
+            best_seed[similar_id] = (contribution, seed_id)
+
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [(movie_id, score, best_seed[movie_id][1]) for movie_id, score in ranked]
@@ -1,3 +1,585 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from accounts import rec_cache
+from accounts.models import CustomUser
+from accounts.views_social import get_personalized_movie_recommendations
+
+from . import catalog, factorization, library, omdb, signals, similarity
+from .models import (
+    Genre, Movie, MovieCredit, MovieEnrichmentTask, MovieReview, MovieStats, SimilarMovie, UserMovieInteraction,
+    parse_rating, parse_runtime, parse_year_range,
+)
+
+DETAILS = {
+    'Response': 'True',
+    'imdbID': 'tt0000001',
+    'Title': 'Arrival',
+    'Year': '2016',
+    'Director': 'Denis Villeneuve',
+    'Plot': 'A linguist is recruited to talk to aliens.',
+}
+
+
+class OMDbSearchCacheTests(TestCase):
+    @mock.patch.object(omdb, '_fetch', return_value={'Response': 'True', 'Search': []})
+    def test_search_key_is_safe_for_any_query(self, fetch):
+        omdb.search('  The   Lord of the Rings: ' + 'x' * 300)
+        omdb.search('the lord of the rings: ' + 'X' * 300)
+        first, second = (c.args[1] for c in fetch.call_args_list)
+        self.assertEqual(first, second)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            cache.validate_key(first)
+
+
+class SearchDetailsTests(TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        hits = {'fast': ['tt01', 'tt02'], 'slow': ['tt03', 'tt01']}
+        search = mock.patch.object(
+            omdb, 'search', side_effect=lambda query: {'Response': 'True', 'Search': [{'imdbID': i} for i in hits[query]]},
+        )
+        get_details = mock.patch.object(omdb, 'get_details', side_effect=self._details)
+        self.get_details = get_details.start()
+        search.start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _details(self, imdb_id):
+        if imdb_id == 'tt03':
+            self.release.wait(5)
+        return {'Response': 'True', 'imdbID': imdb_id}
+
+    def test_complete_in_query_and_hit_order(self):
+        self.release.set()
+        details, complete = omdb.search_details(['slow', 'fast'], timeout=5)
+        self.assertEqual([d['imdbID'] for d in details], ['tt03', 'tt01', 'tt02'])
+        self.assertTrue(complete)
+
+    def test_partial_at_the_deadline(self):
+        started = time.monotonic()
+        details, complete = omdb.search_details(['fast', 'slow'], timeout=0.2)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual([d['imdbID'] for d in details], ['tt01', 'tt02'])
+        self.assertFalse(complete)
+
+    def test_exclude_and_per_query(self):
+        self.release.set()
+        details, _ = omdb.search_details(['fast', 'slow'], per_query=1, exclude={'tt01'}, timeout=5)
+        self.assertEqual([d['imdbID'] for d in details], ['tt03'])
+
+
+@mock.patch.object(factorization, 'recommend_for_user', return_value=[])
+class PartialRecommendationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='viewer', email='viewer@example.com')
+
+    def _recommend(self):
+        request = APIRequestFactory().get('/recommendations/movies/personal/')
+        force_authenticate(request, user=self.user)
+        return get_personalized_movie_recommendations(request).data
+
+    def _answer(self, complete):
+        detail = {**DETAILS, 'imdbRating': '7.9'}
+        return mock.patch.object(omdb, 'search_details', return_value=([detail], complete))
+
+    def test_partial_answer_is_flagged_and_not_cached(self, recommend_for_user):
+        with self._answer(complete=False):
+            data = self._recommend()
+        self.assertEqual(([r['imdb_id'] for r in data['recommendations']], data['partial']), (['tt0000001'], True))
+        self.assertIsNone(cache.get(rec_cache._entry_key('movies', self.user.id)))
+
+    def test_complete_answer_is_cached(self, recommend_for_user):
+        with self._answer(complete=True):
+            data = self._recommend()
+        self.assertNotIn('partial', data)
+        self.assertIsNotNone(cache.get(rec_cache._entry_key('movies', self.user.id)))
+
+
+def _omdb_answers(answers):
+    return mock.patch.object(omdb, 'get_details', side_effect=lambda imdb_id: answers[imdb_id])
+
+
+@mock.patch.object(catalog, 'refresh_movie_async')
+@mock.patch.object(omdb, 'get_details', return_value=DETAILS)
+class MovieDetailsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('movie_details', args=['tt0000001'])
+
+    def test_enriched_row_served_without_omdb(self, get_details, refresh_movie_async):
+        catalog.save_omdb_details(DETAILS)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['Title'], response.data['Director']), ('Arrival', 'Denis Villeneuve'))
+        get_details.assert_not_called()
+        refresh_movie_async.assert_not_called()
+
+    def test_stale_row_served_and_refreshed_in_background(self, get_details, refresh_movie_async):
+        catalog.save_omdb_details(DETAILS)
+        Movie.objects.update(updated_at=timezone.now() - timedelta(seconds=settings.MOVIE_DETAIL_STALE_AFTER + 60))
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['Title'], 'Arrival')
+        get_details.assert_not_called()
+        refresh_movie_async.assert_called_once_with('tt0000001')
+
+    def test_stub_read_through_from_omdb(self, get_details, refresh_movie_async):
+        Movie.objects.create(imdb_id='tt0000001', title='Arrival')
+        self.assertEqual(self.client.get(self.url).data['Director'], 'Denis Villeneuve')
+        self.assertTrue(Movie.objects.get(imdb_id='tt0000001').is_enriched)
+        self.client.get(self.url)
+        get_details.assert_called_once()
+
+    def test_unknown_title_is_a_404(self, get_details, refresh_movie_async):
+        get_details.return_value = {'Response': 'False', 'Error': 'Incorrect IMDb ID.'}
+        response = self.client.get(self.url)
+        self.assertEqual((response.status_code, response.data['error']), (404, 'Incorrect IMDb ID.'))
+        self.assertFalse(Movie.objects.exists())
+
+    @override_settings(MOVIE_DETAILS_FROM_DB=False)
+    def test_db_read_can_be_switched_off(self, get_details, refresh_movie_async):
+        catalog.save_omdb_details(DETAILS)
+        self.client.get(self.url)
+        get_details.assert_called_once_with('tt0000001')
+
+    def test_refresh_movie_bypasses_the_response_cache(self, get_details, refresh_movie_async):
+        Movie.objects.create(imdb_id='tt0000001', title='Arrival')
+        with mock.patch.object(omdb, 'invalidate') as invalidate:
+            movie = catalog.refresh_movie('tt0000001')
+        invalidate.assert_called_once_with('tt0000001')
+        self.assertEqual(movie.director, 'Denis Villeneuve')
+
+
+class EnrichmentBatchTests(TestCase):
+    def setUp(self):
+        for imdb_id in ('tt0000001', 'tt0000002'):
+            movie = Movie.objects.create(imdb_id=imdb_id, title='Stub')
+            MovieEnrichmentTask.objects.create(movie=movie, status='in_progress')
+
+    def _task(self, imdb_id):
+        return MovieEnrichmentTask.objects.get(movie_id=imdb_id)
+
+    def test_enriches_and_marks_done(self):
+        with _omdb_answers({'tt0000001': DETAILS}):
+            self.assertEqual(catalog.process_enrichment_batch(['tt0000001']), (1, 0))
+        self.assertEqual(self._task('tt0000001').status, 'done')
+        self.assertTrue(Movie.objects.get(imdb_id='tt0000001').is_enriched)
+
+    def test_unknown_id_fails_for_good(self):
+        with _omdb_answers({'tt0000002': {'Response': 'False', 'Error': 'Incorrect IMDb ID.'}}):
+            catalog.process_enrichment_batch(['tt0000002'])
+        self.assertEqual(self._task('tt0000002').status, 'failed')
+
+    def test_request_limit_is_retried(self):
+        limited = {'Response': 'False', 'Error': 'Request limit reached!'}
+        with _omdb_answers({'tt0000002': limited}):
+            self.assertEqual(catalog.process_enrichment_batch(['tt0000002'], max_attempts=2), (0, 1))
+            task = self._task('tt0000002')
+            self.assertEqual((task.status, task.attempts), ('pending', 1))
+
+            catalog.process_enrichment_batch(['tt0000002'], max_attempts=2)
+        task = self._task('tt0000002')
+        self.assertEqual((task.status, task.attempts, task.last_error), ('failed', 2, 'Request limit reached!'))
+
+    def test_connection_errors_are_retried(self):
+        with mock.patch.object(omdb, 'get_details', side_effect=omdb.OMDbError('timed out')):
+            catalog.process_enrichment_batch(['tt0000001'])
+        self.assertEqual(self._task('tt0000001').status, 'pending')
+
+
+class TaxonomyTests(TestCase):
+    def test_parse_names(self):
+        self.assertEqual(catalog.parse_names(' Drama,  Crime , Drama,N/A,,'), ['Drama', 'Crime'])
+        self.assertEqual(catalog.parse_names('N/A'), [])
+        self.assertEqual(catalog.parse_names(None), [])
+
+    def test_sync_links_genres_and_people_in_billing_order(self):
+        heat = Movie.objects.create(
+            imdb_id='tt0113277', title='Heat', genre='Crime, Drama', director='Michael Mann',
+            actors='Al Pacino, Robert De Niro, Al Pacino',
+        )
+        insider = Movie.objects.create(imdb_id='tt0140352', title='The Insider', genre='Drama', director='Michael Mann', actors='N/A')
+        catalog.sync_taxonomy([heat, insider])
+        self.assertEqual(list(Genre.objects.values_list('name', flat=True)), ['Crime', 'Drama'])
+        self.assertEqual(
+            list(heat.credits.values_list('person__name', 'role')),
+            [('Michael Mann', 'director'), ('Al Pacino', 'actor'), ('Robert De Niro', 'actor')],
+        )
+        self.assertEqual(list(insider.credits.values_list('person__name', flat=True)), ['Michael Mann'])
+        self.assertEqual(MovieCredit.objects.filter(person__name='Michael Mann').count(), 2)
+
+    def test_resync_replaces_links(self):
+        movie = Movie.objects.create(imdb_id='tt0113277', title='Heat', genre='Crime', director='Michael Mann')
+        catalog.sync_taxonomy([movie])
+        movie.genre, movie.director = 'Drama', 'N/A'
+        catalog.sync_taxonomy([movie])
+        self.assertEqual(list(movie.genres.values_list('name', flat=True)), ['Drama'])
+        self.assertFalse(movie.credits.exists())
+
+
+class TypedColumnTests(TestCase):
+    def test_parse_year_range(self):
+        for value, expected in (
+            ('1999', (1999, None)),
+            ('2008–2013', (2008, 2013)),
+            ('2019–', (2019, None)),
+            ('N/A', (None, None)),
+            ('', (None, None)),
+            (None, (None, None)),
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(parse_year_range(value), expected)
+
+    def test_parse_runtime_and_rating(self):
+        self.assertEqual(parse_runtime('142 min'), 142)
+        self.assertIsNone(parse_runtime('N/A'))
+        self.assertEqual(parse_rating(' 7.8 '), Decimal('7.8'))
+        for value in ('N/A', '', None, 'NaN', 'Infinity', '11', '-1'):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_rating(value))
+
+    def test_save_keeps_typed_columns_in_step(self):
+        movie = Movie.objects.create(imdb_id='tt0903747', title='Breaking Bad', year='2008–2013', runtime='49 min', imdb_rating='9.5')
+        movie.refresh_from_db()
+        self.assertEqual((movie.year_start, movie.year_end, movie.runtime_minutes, movie.imdb_score), (2008, 2013, 49, Decimal('9.5')))
+        movie.imdb_rating = 'N/A'
+        movie.save(update_fields=['imdb_rating'])
+        movie.refresh_from_db()
+        self.assertIsNone(movie.imdb_score)
+
+    def test_bulk_upsert_fills_typed_columns(self):
+        catalog.bulk_upsert_omdb_details([{'imdbID': 'tt0113277', 'Title': 'Heat', 'Year': '1995', 'Runtime': '170 min', 'imdbRating': '8.3'}])
+        movie = Movie.objects.get(imdb_id='tt0113277')
+        self.assertEqual((movie.year_start, movie.runtime_minutes, movie.imdb_score), (1995, 170, Decimal('8.3')))
+
+
+class MovieDataMigrationTests(TransactionTestCase):
+    """Runs the data migrations against rows written with the historical models"""
+
+    def _migrate(self, name):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('movies', name)])
+        # The state of every app as migrated, not just the movies ancestors
+        executor.loader.build_graph()
+        return executor.loader.project_state(list(executor.loader.applied_migrations)).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_populate_genres_people(self):
+        apps = self._migrate('0005_genre_person')
+        Movie = apps.get_model('movies', 'Movie')
+        Movie.objects.create(imdb_id='tt0113277', title='Heat', genre='Crime, Drama', director='Michael Mann', actors='Al Pacino, N/A')
+        Movie.objects.create(imdb_id='tt0140352', title='The Insider', genre='Drama', director='Michael Mann')
+
+        apps = self._migrate('0006_populate_genres_people')
+        MovieGenre, MovieCredit = apps.get_model('movies', 'MovieGenre'), apps.get_model('movies', 'MovieCredit')
+        self.assertEqual(apps.get_model('movies', 'Genre').objects.count(), 2)
+        self.assertEqual(MovieGenre.objects.filter(genre__name='Drama').count(), 2)
+        self.assertEqual(
+            list(MovieCredit.objects.filter(movie_id='tt0113277').order_by('billing_order').values_list('person__name', 'role')),
+            [('Michael Mann', 'director'), ('Al Pacino', 'actor')],
+        )
+        self.assertEqual(apps.get_model('movies', 'Person').objects.count(), 2)
+
+    def test_backfill_typed_columns(self):
+        apps = self._migrate('0007_movie_typed_columns')
+        Movie = apps.get_model('movies', 'Movie')
+        # Historical models have no save() override, so the typed columns start empty
+        Movie.objects.create(imdb_id='tt0903747', title='Breaking Bad', year='2008–2013', runtime='49 min', imdb_rating='9.5')
+        Movie.objects.create(imdb_id='tt0000001', title='Stub', year='N/A', runtime='N/A', imdb_rating='N/A')
+
+        apps = self._migrate('0008_backfill_typed_columns')
+        rows = dict(
+            (imdb_id, rest) for imdb_id, *rest in apps.get_model('movies', 'Movie').objects.values_list(
+                'imdb_id', 'year_start', 'year_end', 'runtime_minutes', 'imdb_score'
+            )
+        )
+        self.assertEqual(rows['tt0903747'], [2008, 2013, 49, Decimal('9.5')])
+        self.assertEqual(rows['tt0000001'], [None, None, None, None])
+
+    def test_populate_movie_stats(self):
+        apps = self._migrate('0009_moviestats')
+        Movie = apps.get_model('movies', 'Movie')
+        MovieReview = apps.get_model('movies', 'MovieReview')
+        UserMovieInteraction = apps.get_model('movies', 'UserMovieInteraction')
+        CustomUser = apps.get_model('accounts', 'CustomUser')
+        heat = Movie.objects.create(imdb_id='tt0113277', title='Heat')
+        Movie.objects.create(imdb_id='tt0140352', title='The Insider')
+        for n, rating in enumerate([5, 3]):
+            user = CustomUser.objects.create(username=f'u{n}', email=f'u{n}@example.com')
+            MovieReview.objects.create(user=user, movie=heat, rating=rating)
+            UserMovieInteraction.objects.create(user=user, movie_id='tt0140352', interaction_type='want_to_watch')
+
+        apps = self._migrate('0010_populate_moviestats')
+        stats = {row.movie_id: row for row in apps.get_model('movies', 'MovieStats').objects.all()}
+        self.assertEqual(
+            (stats['tt0113277'].review_count, stats['tt0113277'].rating_sum, stats['tt0113277'].rating_5),
+            (2, 8, 1),
+        )
+        self.assertEqual((stats['tt0140352'].review_count, stats['tt0140352'].want_to_watch_count), (0, 2))
+
+
+class SeedMoviesTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.source = os.path.join(tmp.name, 'ids.txt')
+        self.checkpoint = os.path.join(tmp.name, 'checkpoint.json')
+        with open(self.source, 'w') as f:
+            f.write('tt0000001\ntt0000002\ntt0000003\n')
+
+    def _seed(self, answers):
+        with mock.patch.object(omdb, 'get_details', side_effect=lambda imdb_id: answers[imdb_id]) as get_details:
+            call_command(
+                'seed_movies', self.source, '--batch-size=2', f'--checkpoint={self.checkpoint}',
+                '--rate=1000', stdout=StringIO(), stderr=StringIO(),
+            )
+        return [c.args[0] for c in get_details.call_args_list]
+
+    def _position(self):
+        if not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint) as f:
+            return json.load(f)['position']
+
+    def test_request_limit_stops_without_advancing_the_checkpoint(self):
+        answers = {
+            'tt0000001': {**DETAILS, 'imdbID': 'tt0000001'},
+            'tt0000002': {'Response': 'False', 'Error': 'Request limit reached!'},
+        }
+        with self.assertRaises(CommandError):
+            self._seed(answers)
+        self.assertEqual(self._position(), 0)
+        self.assertTrue(Movie.objects.filter(Movie.ENRICHED, imdb_id='tt0000001').exists())
+
+        # The resumed run retries tt0000002 and skips what was already stored
+        answers['tt0000002'] = {**DETAILS, 'imdbID': 'tt0000002'}
+        answers['tt0000003'] = {'Response': 'False', 'Error': 'Incorrect IMDb ID.'}
+        self.assertEqual(sorted(self._seed(answers)), ['tt0000002', 'tt0000003'])
+        self.assertEqual(self._position(), 3)
+        self.assertEqual(Movie.objects.filter(Movie.ENRICHED).count(), 2)
+
+
+class FactorModelTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(RECOMMENDER_MODEL_DIR=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = tmp.name
+
+    def _save(self, favourite):
+        # One user, two movies; `favourite` gets the higher score
+        items = [[1.0], [0.0]] if favourite == 'tt0000001' else [[0.0], [1.0]]
+        factorization.save_model([[1.0]], items, [7], ['tt0000001', 'tt0000002'])
+
+    def test_new_model_is_swapped_in_whole(self):
+        self.assertIsNone(factorization.get_model())
+        self._save('tt0000001')
+        self.assertEqual(factorization.get_model().recommend(7, k=1), ['tt0000001'])
+        self._save('tt0000002')
+        self.assertEqual(factorization.get_model().recommend(7, k=1), ['tt0000002'])
+
+    def test_old_versions_are_pruned(self):
+        for _ in range(4):
+            self._save('tt0000001')
+        versions = [name for name in os.listdir(self.directory) if name.startswith('v')]
+        self.assertEqual(len(versions), factorization.KEEP_VERSIONS)
+        self.assertIn(os.readlink(os.path.join(self.directory, factorization.CURRENT)), versions)
+
+
+class MovieRecommendationFallbackTests(TestCase):
+    @mock.patch.object(omdb, 'search_details', return_value=([], True))
+    @mock.patch.object(factorization, 'recommend_for_user', side_effect=ValueError('truncated .npy'))
+    def test_broken_factor_model_falls_back_to_heuristics(self, recommend_for_user, search_details):
+        user = CustomUser.objects.create(username='viewer', email='viewer@example.com')
+        request = APIRequestFactory().get('/recommendations/movies/personal/')
+        force_authenticate(request, user=user)
+        response = get_personalized_movie_recommendations(request)
+        self.assertEqual(response.status_code, 200)
+        recommend_for_user.assert_called_once()
+
+
+class MovieSimilarityTests(TestCase):
+    def setUp(self):
+        self.arrival, self.sicario, self.prisoners, self.dune = (
+            Movie.objects.create(imdb_id=f'tt000000{n}', title=title)
+            for n, title in enumerate(['Arrival', 'Sicario', 'Prisoners', 'Dune'], start=1)
+        )
+        users = [CustomUser.objects.create(username=f'u{n}', email=f'u{n}@example.com') for n in range(3)]
+        for user in users[:2]:
+            MovieReview.objects.create(user=user, movie=self.arrival, rating=5)
+            MovieReview.objects.create(user=user, movie=self.sicario, rating=5)
+        MovieReview.objects.create(user=users[2], movie=self.arrival, rating=5)
+        # A 1-star review weighs nothing; the review still marks it watched
+        MovieReview.objects.create(user=users[2], movie=self.prisoners, rating=1)
+        UserMovieInteraction.objects.filter(movie=self.prisoners).delete()
+        UserMovieInteraction.objects.create(user=users[2], movie=self.dune, interaction_type='love')
+        self.viewer = CustomUser.objects.create(username='viewer', email='viewer@example.com')
+
+    def _neighbours(self, movie):
+        return list(SimilarMovie.objects.filter(movie=movie).order_by('-score').values_list('similar_id', 'support'))
+
+    def test_neighbours_ranked_by_shared_enjoyment(self):
+        stored = similarity.rebuild_similar_movies(k=5, min_support=1)
+        self.assertEqual(stored, SimilarMovie.objects.count())
+        self.assertEqual(self._neighbours(self.arrival), [('tt0000002', 2), ('tt0000004', 1)])
+        self.assertEqual(self._neighbours(self.prisoners), [])
+
+    def test_min_support_and_k(self):
+        call_command('build_movie_similarity', neighbours=1, min_support=2, stdout=StringIO())
+        self.assertEqual(self._neighbours(self.arrival), [('tt0000002', 2)])
+        self.assertEqual(self._neighbours(self.dune), [])
+
+    def test_rebuild_replaces_old_rows(self):
+        SimilarMovie.objects.create(movie=self.prisoners, similar=self.dune, score=1)
+        similarity.rebuild_similar_movies(k=5, min_support=1)
+        self.assertFalse(SimilarMovie.objects.filter(movie=self.prisoners).exists())
+
+    def test_because_you_liked(self):
+        similarity.rebuild_similar_movies(k=5, min_support=1)
+        UserMovieInteraction.objects.create(user=self.viewer, movie=self.sicario, interaction_type='love')
+        picks = similarity.because_you_liked(self.viewer)
+        self.assertEqual([(movie_id, seed_id) for movie_id, _, seed_id in picks], [('tt0000001', 'tt0000002')])
+        self.assertEqual(similarity.because_you_liked(self.viewer, exclude={'tt0000001'}), [])
+        # Middling ratings are not favourites
+        lukewarm = CustomUser.objects.create(username='lukewarm', email='lukewarm@example.com')
+        MovieReview.objects.create(user=lukewarm, movie=self.sicario, rating=3)
+        self.assertEqual(similarity.because_you_liked(lukewarm), [])
+
+    @mock.patch.object(omdb, 'search_details', return_value=([], True))
+    @mock.patch.object(factorization, 'recommend_for_user', return_value=[])
+    def test_recommendations_lead_with_because_you_liked(self, recommend_for_user, search_details):
+        similarity.rebuild_similar_movies(k=5, min_support=1)
+        MovieReview.objects.create(user=self.viewer, movie=self.sicario, rating=5)
+        request = APIRequestFactory().get('/recommendations/movies/personal/')
+        force_authenticate(request, user=self.viewer)
+        first = get_personalized_movie_recommendations(request).data['recommendations'][0]
+        self.assertEqual((first['imdb_id'], first['reason']), ('tt0000001', 'Because you liked Sicario'))
+
+
+class MovieStatsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='critic', email='critic@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Movie.objects.create(imdb_id='tt0000001', title='Arrival', director='Denis Villeneuve')
+
+    def _stats(self):
+        stats = MovieStats.objects.get(movie_id='tt0000001')
+        return {
+            field: getattr(stats, field)
+            for field in ('review_count', 'rating_sum', 'rating_3', 'rating_5', 'watched_count', 'want_to_watch_count')
+        }
+
+    def _review(self, rating):
+        return self.client.post(reverse('create_review'), {'imdb_id': 'tt0000001', 'rating': rating}, format='json')
+
+    def _watch(self, state):
+        return self.client.post(reverse('toggle_watch_state'), {'imdb_id': 'tt0000001', 'state': state}, format='json')
+
+    def test_review_create_rating_change_and_delete(self):
+        self.assertEqual(self._review(5).status_code, 201)
+        self.assertEqual(self._stats(), {
+            'review_count': 1, 'rating_sum': 5, 'rating_3': 0, 'rating_5': 1,
+            'watched_count': 1, 'want_to_watch_count': 0,
+        })
+        self.assertEqual(self._review(3).status_code, 200)
+        self.assertEqual(self._stats()['rating_sum'], 3)
+        self.assertEqual((self._stats()['rating_3'], self._stats()['rating_5']), (1, 0))
+
+        review = MovieReview.objects.get(user=self.user)
+        self.client.delete(reverse('delete_review', args=[review.id]))
+        stats = self._stats()
+        self.assertEqual((stats['review_count'], stats['rating_sum'], stats['rating_3']), (0, 0, 0))
+
+    def test_watch_state_toggles(self):
+        self._watch('want_to_watch')
+        self.assertEqual(self._stats()['want_to_watch_count'], 1)
+        self._watch('watched')
+        self.assertEqual((self._stats()['watched_count'], self._stats()['want_to_watch_count']), (1, 0))
+        self._watch('watched')
+        self.assertEqual(self._stats()['watched_count'], 0)
+
+    def test_failed_delta_rolls_the_write_back(self):
+        with mock.patch.object(signals, 'apply_stats_delta', side_effect=RuntimeError('stats down')):
+            self.assertEqual(self._review(4).status_code, 500)
+        self.assertFalse(MovieReview.objects.exists())
+
+
+class LibraryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='viewer', email='viewer@example.com')
+        years = ['1999', '2016', '1985', '2021', '2008']
+        self.movies = [
+            Movie.objects.create(imdb_id=f'tt000000{n}', title=f'Movie {n}', year=year)
+            for n, year in enumerate(years)
+        ]
+        # Reviews mark the first four watched; ratings 2, 5, 3, 4
+        for movie, rating in zip(self.movies[:4], (2, 5, 3, 4)):
+            MovieReview.objects.create(user=self.user, movie=movie, rating=rating)
+        UserMovieInteraction.objects.create(user=self.user, movie=self.movies[4], interaction_type='want_to_watch')
+        for movie in self.movies[:2]:
+            UserMovieInteraction.objects.create(user=self.user, movie=movie, interaction_type='love')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _ids(self, items):
+        return [item.movie_id for item in items]
+
+    def test_first_pages_and_totals_in_one_query(self):
+        with self.assertNumQueries(1):
+            items, totals, cursors = library.first_pages(self.user, 'added', page_size=2)
+        self.assertEqual(totals, {'watched': 4, 'want_to_watch': 1, 'loved': 2})
+        self.assertEqual([len(shelf) for shelf in items.values()], [2, 1, 2])
+        self.assertIsNotNone(cursors['watched'])
+        self.assertIsNone(cursors['want_to_watch'])
+        self.assertIsNone(cursors['loved'])
+
+    def test_sort_orders(self):
+        items, _, _ = library.first_pages(self.user, 'rating', page_size=10)
+        self.assertEqual(self._ids(items['watched']), ['tt0000001', 'tt0000003', 'tt0000002', 'tt0000000'])
+        items, _, _ = library.first_pages(self.user, 'year', page_size=10)
+        self.assertEqual(self._ids(items['watched']), ['tt0000003', 'tt0000001', 'tt0000000', 'tt0000002'])
+        self.assertEqual(items['watched'][0].user_rating, 4)
+
+    def test_shelf_pages_continue_the_first_page(self):
+        data = self.client.get(reverse('get_user_library'), {'sort': 'rating', 'page_size': 1}).json()
+        self.assertEqual(data['total_watched'], 4)
+        ids = [movie['imdb_id'] for movie in data['library']['watched']]
+        cursor = data['next_cursors']['watched']
+        while cursor:
+            page = self.client.get(reverse('get_user_library'), {
+                'sort': 'rating', 'page_size': 1, 'shelf': 'watched', 'cursor': cursor,
+            }).json()
+            ids += [movie['imdb_id'] for movie in page['movies']]
+            cursor = page['next_cursor']
+        self.assertEqual(ids, ['tt0000001', 'tt0000003', 'tt0000002', 'tt0000000'])
+
+    def test_invalid_sort_or_cursor(self):
+        self.assertEqual(self.client.get(reverse('get_user_library'), {'sort': 'title'}).status_code, 400)
+        response = self.client.get(reverse('get_user_library'), {'shelf': 'watched', 'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 400)
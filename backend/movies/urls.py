@@ -5,6 +5,7 @@ from . import views
 urlpatterns = [
     path('search/', views.search_movies, name='search_movies'),
     path('details/<str:imdb_id>/', views.get_movie_details, name='movie_details'),
+    path('cache-stats/', views.omdb_cache_stats, name='omdb_cache_stats'),
     
     # Review endpoints
     path('reviews/create/', views.create_review, name='create_review'),
@@ -1,13 +1,17 @@
 # movies/views.py
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
-import requests
 from django.conf import settings
-from .models import Movie, MovieReview, UserMovieInteraction
+from django.db import transaction
+from . import catalog, library, omdb
+from .models import Movie, MovieReview, MovieStats, UserMovieInteraction
 from django.shortcuts import get_object_or_404
-from django.db.models import Avg, Count
+from tunr_backend.pagination import InvalidCursor, get_page_size, paginate
+
+# Newest first; id breaks ties so the keyset cursor is stable
+REVIEW_ORDERING = ['-created_at', '-id']
 
 @api_view(['GET'])
 def search_movies(request):
@@ -17,17 +21,10 @@ def search_movies(request):
         return Response({'movies': []})
     
     try:
-        # Read API key from settings (which reads from environment)
-        api_key = settings.OMDB_API_KEY
-        
-        if not api_key:
+        if not settings.OMDB_API_KEY:
             return Response({'movies': [], 'error': 'OMDB API key not configured'}, status=500)
         
-        # OMDb API search endpoint
-        url = f'http://www.omdbapi.com/?s={query}&type=movie&apikey={api_key}'
-        
-        response = requests.get(url)
-        data = response.json()
+        data = omdb.search(query)
         
         movies = []
         if data.get('Response') == 'True':
@@ -44,18 +41,22 @@ def search_movies(request):
 def get_movie_details(request, imdb_id):
     """Get detailed information about a specific movie by IMDB ID"""
     try:
-        api_key = settings.OMDB_API_KEY
-        
-        if not api_key:
+        # Serve from our own table when we already have the full record
+        if settings.MOVIE_DETAILS_FROM_DB:
+            movie = Movie.objects.filter(imdb_id=imdb_id).first()
+            if movie and movie.is_enriched:
+                if movie.is_stale():
+                    catalog.refresh_movie_async(imdb_id)
+                return Response(movie.to_omdb())
+        
+        if not settings.OMDB_API_KEY:
             return Response({'error': 'OMDB API key not configured'}, status=500)
         
-        # OMDb API detail endpoint
-        url = f'http://www.omdbapi.com/?i={imdb_id}&apikey={api_key}'
-        
-        response = requests.get(url)
-        data = response.json()
+        data = omdb.get_details(imdb_id)
         
         if data.get('Response') == 'True':
+            # Read-through: the next request is a primary-key lookup
+            catalog.save_omdb_details(data)
             return Response(data)
         else:
             return Response({'error': data.get('Error', 'Movie not found')}, status=404)
@@ -65,6 +66,13 @@ def get_movie_details(request, imdb_id):
         return Response({'error': str(e)}, status=500)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def omdb_cache_stats(request):
+    """Hit/miss counters of the OMDb cache for this worker process"""
+    return Response(omdb.get_stats())
+
+
 # ============= REVIEW ENDPOINTS =============
 
 @api_view(['POST'])
@@ -84,44 +92,20 @@ def create_review(request):
         if not (1 <= int(rating) <= 5):
             return Response({'error': 'Rating must be between 1 and 5'}, status=400)
         
-        # Get or create movie from OMDb
-        movie, created = Movie.objects.get_or_create(
-            imdb_id=imdb_id,
-            defaults={'title': request.data.get('title', 'Unknown')}
-        )
-        
-        # If movie was just created, fetch full details from OMDb
-        if created:
-            api_key = settings.OMDB_API_KEY
-            if api_key:
-                try:
-                    url = f'http://www.omdbapi.com/?i={imdb_id}&apikey={api_key}'
-                    response = requests.get(url)
-                    data = response.json()
-                    
-                    if data.get('Response') == 'True':
-                        movie.title = data.get('Title', movie.title)
-                        movie.year = data.get('Year', '')
-                        movie.genre = data.get('Genre', '')
-                        movie.director = data.get('Director', '')
-                        movie.actors = data.get('Actors', '')
-                        movie.plot = data.get('Plot', '')
-                        movie.poster = data.get('Poster', '')
-                        movie.imdb_rating = data.get('imdbRating', '')
-                        movie.runtime = data.get('Runtime', '')
-                        movie.save()
-                except Exception as e:
-                    print(f"Error fetching movie details: {e}")
-        
-        # Create or update review
-        review, created = MovieReview.objects.update_or_create(
-            user=request.user,
-            movie=movie,
-            defaults={
-                'rating': rating,
-                'review_text': review_text
-            }
-        )
+        # The review, its watched mark and the MovieStats deltas (movies.signals) commit together
+        with transaction.atomic():
+            # New titles are stored as a stub and enriched by the background worker
+            movie = catalog.get_or_create_movie(imdb_id, request.data)
+            
+            # Create or update review
+            review, created = MovieReview.objects.update_or_create(
+                user=request.user,
+                movie=movie,
+                defaults={
+                    'rating': rating,
+                    'review_text': review_text
+                }
+            )
         
         return Response({
             'success': True,
@@ -145,12 +129,26 @@ def create_review(request):
         return Response({'error': str(e)}, status=500)
 
 
+def _get_stats(imdb_id):
+    """The movie's MovieStats row (unsaved zeros if nobody has touched it yet)"""
+    stats = MovieStats.objects.filter(movie_id=imdb_id).first()
+    if stats is None:
+        movie = get_object_or_404(Movie, imdb_id=imdb_id)
+        stats = MovieStats(movie=movie)
+    return stats
+
+
 @api_view(['GET'])
 def get_movie_reviews(request, imdb_id):
-    """Get all reviews for a specific movie"""
+    """Get a page of reviews for a specific movie (newest first, `?cursor=` for older)"""
     try:
-        movie = get_object_or_404(Movie, imdb_id=imdb_id)
-        reviews = MovieReview.objects.filter(movie=movie).select_related('user')
+        cursor = request.GET.get('cursor')
+        reviews, next_cursor = paginate(
+            MovieReview.objects.filter(movie_id=imdb_id).select_related('user'),
+            REVIEW_ORDERING,
+            cursor=cursor,
+            page_size=get_page_size(request),
+        )
         
         reviews_data = [{
             'id': review.id,
@@ -164,16 +162,18 @@ def get_movie_reviews(request, imdb_id):
             'updated_at': review.updated_at
         } for review in reviews]
         
-        # Calculate average rating
-        total_ratings = sum(r.rating for r in reviews)
-        avg_rating = total_ratings / len(reviews) if reviews else 0
+        data = {'reviews': reviews_data, 'next_cursor': next_cursor}
         
-        return Response({
-            'reviews': reviews_data,
-            'total_reviews': len(reviews),
-            'average_rating': round(avg_rating, 1)
-        })
+        # Summary numbers come from the MovieStats row, only needed with the first page
+        if not cursor:
+            stats = _get_stats(imdb_id)
+            data['total_reviews'] = stats.review_count
+            data['average_rating'] = stats.average_rating
+        
+        return Response(data)
         
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=400)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
@@ -181,9 +181,15 @@ def get_movie_reviews(request, imdb_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_reviews(request):
-    """Get all reviews by the authenticated user"""
+    """Get a page of reviews by the authenticated user (newest first, `?cursor=` for older)"""
     try:
-        reviews = MovieReview.objects.filter(user=request.user).select_related('movie')
+        cursor = request.GET.get('cursor')
+        reviews, next_cursor = paginate(
+            MovieReview.objects.filter(user=request.user).select_related('movie'),
+            REVIEW_ORDERING,
+            cursor=cursor,
+            page_size=get_page_size(request),
+        )
         
         reviews_data = [{
             'id': review.id,
@@ -200,11 +206,14 @@ def get_user_reviews(request):
             }
         } for review in reviews]
         
-        return Response({
-            'reviews': reviews_data,
-            'total_reviews': len(reviews)
-        })
+        data = {'reviews': reviews_data, 'next_cursor': next_cursor}
+        if not cursor:
+            data['total_reviews'] = request.user.reviews_count
         
+        return Response(data)
+        
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=400)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
@@ -216,7 +225,8 @@ def delete_review(request, review_id):
     """Delete a user's review"""
     try:
         review = get_object_or_404(MovieReview, id=review_id, user=request.user)
-        review.delete()
+        with transaction.atomic():
+            review.delete()
         
         return Response({
             'success': True,
@@ -241,68 +251,36 @@ def toggle_watch_state(request):
         if state not in ['watched', 'want_to_watch']:
             return Response({'error': 'State must be "watched" or "want_to_watch"'}, status=400)
         
-        # Get or create movie
-        movie, created = Movie.objects.get_or_create(
-            imdb_id=imdb_id,
-            defaults={
-                'title': request.data.get('title', 'Unknown'),
-                'year': request.data.get('year', ''),
-                'poster': request.data.get('poster', ''),
-                'genre': request.data.get('genre', ''),
-            }
-        )
-        
-        # Fetch full details if just created
-        if created and settings.OMDB_API_KEY:
-            try:
-                url = f'http://www.omdbapi.com/?i={imdb_id}&apikey={settings.OMDB_API_KEY}'
-                response = requests.get(url)
-                data = response.json()
-                if data.get('Response') == 'True':
-                    movie.title = data.get('Title', movie.title)
-                    movie.year = data.get('Year', '')
-                    movie.genre = data.get('Genre', '')
-                    movie.director = data.get('Director', '')
-                    movie.actors = data.get('Actors', '')
-                    movie.plot = data.get('Plot', '')
-                    movie.poster = data.get('Poster', '')
-                    movie.imdb_rating = data.get('imdbRating', '')
-                    movie.runtime = data.get('Runtime', '')
-                    movie.save()
-            except Exception as e:
-                print(f"Error fetching movie details: {e}")
-        
-        # Toggle the state
-        interaction, created = UserMovieInteraction.objects.get_or_create(
-            user=request.user,
-            movie=movie,
-            interaction_type=state
-        )
+        # The interaction rows and their MovieStats deltas (movies.signals) commit together
+        with transaction.atomic():
+            # New titles are stored as a stub and enriched by the background worker
+            movie = catalog.get_or_create_movie(imdb_id, request.data)
+            
+            # Toggle the state
+            interaction, created = UserMovieInteraction.objects.get_or_create(
+                user=request.user,
+                movie=movie,
+                interaction_type=state
+            )
+            
+            if not created:
+                # If it already exists, remove it (toggle off)
+                interaction.delete()
+            else:
+                # Adding one of 'watched' / 'want_to_watch' removes the other
+                UserMovieInteraction.objects.filter(
+                    user=request.user,
+                    movie=movie,
+                    interaction_type='want_to_watch' if state == 'watched' else 'watched'
+                ).delete()
         
         if not created:
-            # If it already exists, remove it (toggle off)
-            interaction.delete()
             return Response({
                 'success': True,
                 'action': 'removed',
                 'state': state
             })
         
-        # If adding 'watched', remove 'want_to_watch'
-        if state == 'watched':
-            UserMovieInteraction.objects.filter(
-                user=request.user,
-                movie=movie,
-                interaction_type='want_to_watch'
-            ).delete()
-        # If adding 'want_to_watch', remove 'watched'
-        elif state == 'want_to_watch':
-            UserMovieInteraction.objects.filter(
-                user=request.user,
-                movie=movie,
-                interaction_type='watched'
-            ).delete()
-        
         return Response({
             'success': True,
             'action': 'added',
@@ -327,49 +305,51 @@ def toggle_like(request):
         
         movie = get_object_or_404(Movie, imdb_id=imdb_id)
         
-        # Check if already exists
-        interaction = UserMovieInteraction.objects.filter(
-            user=request.user,
-            movie=movie,
-            interaction_type=like_type
-        ).first()
-        
-        if interaction:
-            # Remove it (toggle off)
-            interaction.delete()
-            return Response({
-                'success': True,
-                'action': 'removed',
-                'type': like_type
-            })
-        else:
-            # Add it
-            UserMovieInteraction.objects.create(
+        # The interaction rows and their MovieStats deltas (movies.signals) commit together
+        with transaction.atomic():
+            # Check if already exists
+            interaction = UserMovieInteraction.objects.filter(
                 user=request.user,
                 movie=movie,
                 interaction_type=like_type
-            )
+            ).first()
             
-            # If adding 'love', remove 'like'
-            if like_type == 'love':
-                UserMovieInteraction.objects.filter(
-                    user=request.user,
-                    movie=movie,
-                    interaction_type='like'
-                ).delete()
-            # If adding 'like', remove 'love'
-            elif like_type == 'like':
-                UserMovieInteraction.objects.filter(
+            if interaction:
+                # Remove it (toggle off)
+                interaction.delete()
+                return Response({
+                    'success': True,
+                    'action': 'removed',
+                    'type': like_type
+                })
+            else:
+                # Add it
+                UserMovieInteraction.objects.create(
                     user=request.user,
                     movie=movie,
-                    interaction_type='love'
-                ).delete()
+                    interaction_type=like_type
+                )
             
-            return Response({
-                'success': True,
-                'action': 'added',
-                'type': like_type
-            })
+                # If adding 'love', remove 'like'
+                if like_type == 'love':
+                    UserMovieInteraction.objects.filter(
+                        user=request.user,
+                        movie=movie,
+                        interaction_type='like'
+                    ).delete()
+                # If adding 'like', remove 'love'
+                elif like_type == 'like':
+                    UserMovieInteraction.objects.filter(
+                        user=request.user,
+                        movie=movie,
+                        interaction_type='love'
+                    ).delete()
+            
+                return Response({
+                    'success': True,
+                    'action': 'added',
+                    'type': like_type
+                })
         
     except Exception as e:
         return Response({'error': str(e)}, status=500)
@@ -378,52 +358,62 @@ def toggle_like(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_library(request):
-    """Get user's watched movies, want to watch list, and liked movies"""
+    """
+    Get user's watched movies, want to watch list, and liked movies.
+
+    Without `?shelf=` returns the first page of every shelf; with
+    `?shelf=watched|want_to_watch|loved&cursor=` returns the next page of one.
+    `?sort=added|rating|year` (default added, newest first).
+    """
     try:
-        # Get all interactions
-        watched = UserMovieInteraction.objects.filter(
-            user=request.user,
-            interaction_type='watched'
-        ).select_related('movie')
-        
-        want_to_watch = UserMovieInteraction.objects.filter(
-            user=request.user,
-            interaction_type='want_to_watch'
-        ).select_related('movie')
-        
-        loved = UserMovieInteraction.objects.filter(
-            user=request.user,
-            interaction_type='love'
-        ).select_related('movie')
-        
-        # Get user's reviews for ratings
-        reviews = {r.movie.imdb_id: r for r in MovieReview.objects.filter(user=request.user)}
+        sort = request.GET.get('sort', 'added')
+        shelf = request.GET.get('shelf')
+        cursor = request.GET.get('cursor')
+        if sort not in library.SORTS:
+            return Response({'error': f"sort must be one of {', '.join(library.SORTS)}"}, status=400)
+        if shelf and shelf not in library.SHELVES:
+            return Response({'error': f"shelf must be one of {', '.join(library.SHELVES)}"}, status=400)
+        page_size = get_page_size(request)
         
         def format_movie(interaction):
             movie = interaction.movie
-            review = reviews.get(movie.imdb_id)
             return {
                 'imdb_id': movie.imdb_id,
                 'title': movie.title,
                 'year': movie.year,
                 'poster': movie.poster,
                 'genre': movie.genre,
-                'rating': review.rating if review else None,
-                'review_text': review.review_text if review else None,
+                'rating': interaction.user_rating,
+                'review_text': interaction.user_review_text,
                 'added_at': interaction.created_at
             }
         
+        if shelf:
+            items, total, next_cursor = library.shelf_page(
+                request.user, shelf, sort, page_size, cursor=cursor
+            )
+            data = {
+                'success': True,
+                'shelf': shelf,
+                'movies': [format_movie(i) for i in items],
+                'next_cursor': next_cursor,
+            }
+            if total is not None:
+                data['total'] = total
+            return Response(data)
+        
+        items, totals, cursors = library.first_pages(request.user, sort, page_size)
         return Response({
             'success': True,
-            'library': {
-                'watched': [format_movie(i) for i in watched],
-                'want_to_watch': [format_movie(i) for i in want_to_watch],
-                'loved': [format_movie(i) for i in loved],
-            },
-            'total_watched': watched.count(),
-            'total_want_to_watch': want_to_watch.count()
+            'library': {name: [format_movie(i) for i in shelf_items] for name, shelf_items in items.items()},
+            'next_cursors': cursors,
+            'total_watched': totals['watched'],
+            'total_want_to_watch': totals['want_to_watch'],
+            'total_loved': totals['loved'],
         })
         
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=400)
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 
@@ -432,36 +422,21 @@ def get_user_library(request):
 def get_movie_stats(request, imdb_id):
     """Get stats for a movie (reviews, likes, watches)"""
     try:
-        movie = get_object_or_404(Movie, imdb_id=imdb_id)
-        
-        # Get review stats
-        reviews = MovieReview.objects.filter(movie=movie)
-        avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
-        
-        # Get interaction counts
-        watched_count = UserMovieInteraction.objects.filter(
-            movie=movie, 
-            interaction_type='watched'
-        ).count()
-        
-        love_count = UserMovieInteraction.objects.filter(
-            movie=movie,
-            interaction_type='love'
-        ).count()
+        stats = _get_stats(imdb_id)
         
         # Get current user's interactions if authenticated
         user_interactions = {}
         if request.user.is_authenticated:
             interactions = UserMovieInteraction.objects.filter(
                 user=request.user,
-                movie=movie
+                movie_id=imdb_id
             )
             user_interactions = {i.interaction_type: True for i in interactions}
             
             # Check if user has reviewed
             user_review = MovieReview.objects.filter(
                 user=request.user,
-                movie=movie
+                movie_id=imdb_id
             ).first()
             
             if user_review:
@@ -470,10 +445,13 @@ def get_movie_stats(request, imdb_id):
                 user_interactions['user_review_text'] = user_review.review_text
         
         return Response({
-            'average_rating': round(avg_rating, 1),
-            'total_reviews': reviews.count(),
-            'watched_count': watched_count,
-            'love_count': love_count,
+            'average_rating': stats.average_rating,
+            'total_reviews': stats.review_count,
+            'rating_histogram': stats.rating_histogram,
+            'watched_count': stats.watched_count,
+            'want_to_watch_count': stats.want_to_watch_count,
+            'like_count': stats.like_count,
+            'love_count': stats.love_count,
             'user_interactions': user_interactions
         })
         
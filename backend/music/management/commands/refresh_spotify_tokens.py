@@ -0,0 +1,74 @@
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from music.tokens import expiring_user_ids, refresh
+
+logger = logging.getLogger(__name__)
+
+REFRESHED, REVOKED, FAILED = 'refreshed', 'revoked', 'failed'
+
+
+def _refresh(user_id, within):
+    """Refresh one user's token; returns REFRESHED, REVOKED or FAILED"""
+    try:
+        refresh(user_id, within=within)
+        # refresh() hands back the old token when Spotify couldn't be reached,
+        # so judge the outcome by what landed in the row
+        user = CustomUser.objects.filter(id=user_id).values('spotify_refresh_token', 'spotify_token_expires').first()
+        if user is None or not user['spotify_refresh_token']:
+            return REVOKED
+        if user['spotify_token_expires'] is None or user['spotify_token_expires'] <= timezone.now() + within:
+            return FAILED
+        return REFRESHED
+    except Exception as e:
+        logger.warning('Spotify token refresh for user %s failed: %s', user_id, e)
+        return FAILED
+    finally:
+        # Worker threads get their own DB connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh Spotify access tokens that are about to expire, before a request needs them. '
+        'A single pass exits non-zero if any refresh failed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon', type=int, default=settings.SPOTIFY_TOKEN_REFRESH_HORIZON,
+            help='Refresh tokens expiring within this many seconds',
+        )
+        parser.add_argument('--concurrency', type=int, default=4, help='Parallel refresh requests')
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping instead of exiting after one pass')
+        parser.add_argument('--sleep', type=float, default=60.0, help='Seconds between sweeps in --loop mode')
+
+    def handle(self, *args, **options):
+        within = timedelta(seconds=options['horizon'])
+        while True:
+            outcomes = Counter()
+            user_ids = expiring_user_ids(within)
+            if user_ids:
+                with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                    outcomes.update(pool.map(lambda user_id: _refresh(user_id, within), user_ids))
+                self.stdout.write(
+                    f"{len(user_ids)} expiring tokens: {outcomes[REFRESHED]} refreshed, "
+                    f"{outcomes[REVOKED]} revoked, {outcomes[FAILED]} failed"
+                )
+            if not options['loop']:
+                break
+            # A failed token stays in the horizon, so the next sweep retries it
+            time.sleep(options['sleep'])
+
+        if outcomes[FAILED]:
+            raise CommandError(f"{outcomes[FAILED]} token refreshes failed")
+        self.stdout.write(self.style.SUCCESS("Token sweep finished"))
@@ -1,75 +1,162 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from music import spotify
 from music.models import LikedSong, SavedPlaylist
-import requests
-from django.conf import settings
+from tunr_backend.upstream import BATCH
+
+# Spotify's limit for GET /v1/tracks?ids=
+TRACKS_PER_REQUEST = 50
+
+MISSING_SONG_IMAGE = Q(album_image_url__isnull=True) | Q(album_image_url='')
+MISSING_PLAYLIST_IMAGE = Q(playlist_image_url__isnull=True) | Q(playlist_image_url='')
+
+
+def _first_image(images):
+    return images[0]['url'] if images else None
 
 
 class Command(BaseCommand):
     help = 'Update album images for existing liked songs and playlists'
 
-    def handle(self, *args, **options):
-        # Get songs without images
-        songs_without_images = LikedSong.objects.filter(album_image_url__isnull=True) | LikedSong.objects.filter(album_image_url='')
-        playlists_without_images = SavedPlaylist.objects.filter(playlist_image_url__isnull=True) | SavedPlaylist.objects.filter(playlist_image_url='')
-        
-        self.stdout.write(f"Found {songs_without_images.count()} songs without images")
-        self.stdout.write(f"Found {playlists_without_images.count()} playlists without images")
-        
-        # Get a Spotify access token from any user who has one
-        from accounts.models import CustomUser
-        spotify_user = CustomUser.objects.exclude(spotify_access_token__isnull=True).exclude(spotify_access_token='').first()
-        
-        if not spotify_user:
-            self.stdout.write(self.style.ERROR("No user with Spotify token found. Please connect to Spotify first."))
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent playlist requests')
+        parser.add_argument('--batch-size', type=int, default=500, help='Track / playlist ids handled per round')
+        parser.add_argument(
+            '--checkpoint',
+            help='JSON file recording progress; re-running with the same file resumes where it stopped',
+        )
+
+    def _load_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return {}
+
+    def _save_checkpoint(self, path, state):
+        if not path:
             return
-        
-        access_token = spotify_user.spotify_access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        
-        # Update songs
-        updated_songs = 0
-        for song in songs_without_images:
-            try:
-                # Fetch track details from Spotify
-                response = requests.get(
-                    f'https://api.spotify.com/v1/tracks/{song.spotify_track_id}',
-                    headers=headers
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def _pending_ids(self, model, id_field, missing, after, limit):
+        """Next distinct Spotify ids (in id order, after `after`) that have rows missing an image"""
+        queryset = model.objects.filter(missing)
+        if after:
+            queryset = queryset.filter(**{f'{id_field}__gt': after})
+        return list(queryset.order_by(id_field).values_list(id_field, flat=True).distinct()[:limit])
+
+    def _fetch_tracks(self, track_ids):
+        """
+        {track id: album image url} for one batch of up to 50 ids.
+
+        Raises SpotifyError if the batch can't be fetched, so the checkpoint
+        isn't moved past it.
+        """
+        response = spotify.app_get('tracks', {'ids': ','.join(track_ids)}, priority=BATCH)
+        if response.status_code == 400 and len(track_ids) > 1:
+            # One malformed id fails the whole batch; ask for the ids one at a time
+            images = {}
+            for track_id in track_ids:
+                images.update(self._fetch_tracks([track_id]))
+            return images
+        if response.status_code == 400:
+            self.stdout.write(self.style.WARNING(f"Skipping track {track_ids[0]}: Spotify rejected the id"))
+            return {}
+        if response.status_code != 200:
+            raise spotify.SpotifyError(
+                response.status_code, f'tracks batch failed: {response.status_code}', detail=response.text[:200]
+            )
+        images = {}
+        for track in response.json().get('tracks') or []:
+            url = track and _first_image((track.get('album') or {}).get('images'))
+            if url:
+                images[track['id']] = url
+        return images
+
+    def _fetch_playlist(self, playlist_id):
+        try:
+            response = spotify.app_get(f'playlists/{playlist_id}', {'fields': 'images'}, priority=BATCH)
+        finally:
+            # Worker threads get their own DB connection (cache tier)
+            connection.close()
+        if response.status_code in (403, 404):
+            # Private playlists aren't visible to the app token
+            return playlist_id, None
+        if response.status_code != 200:
+            raise spotify.SpotifyError(response.status_code, f'playlist {playlist_id} failed: {response.status_code}')
+        return playlist_id, _first_image(response.json().get('images'))
+
+    def _apply(self, model, id_field, image_field, missing, images):
+        """Write `images` ({spotify id: url}) to every row of those ids still missing one"""
+        rows = list(model.objects.filter(missing, **{f'{id_field}__in': list(images)}).only('id', id_field))
+        for row in rows:
+            setattr(row, image_field, images[getattr(row, id_field)])
+        model.objects.bulk_update(rows, [image_field], batch_size=500)
+        return len(rows)
+
+    def _update_songs(self, state, checkpoint, batch_size):
+        """One request per 50 distinct tracks, however many users liked them"""
+        updated = 0
+        while True:
+            track_ids = self._pending_ids(
+                LikedSong, 'spotify_track_id', MISSING_SONG_IMAGE, state.get('track'), batch_size
+            )
+            if not track_ids:
+                return updated
+            images = {}
+            for start in range(0, len(track_ids), TRACKS_PER_REQUEST):
+                images.update(self._fetch_tracks(track_ids[start:start + TRACKS_PER_REQUEST]))
+            updated += self._apply(LikedSong, 'spotify_track_id', 'album_image_url', MISSING_SONG_IMAGE, images)
+            state['track'] = track_ids[-1]
+            self._save_checkpoint(checkpoint, state)
+            self.stdout.write(f"Songs: {updated} updated (up to track {track_ids[-1]})")
+
+    def _update_playlists(self, state, checkpoint, batch_size, workers):
+        """Playlists have no multi-id endpoint; fetch them concurrently instead"""
+        updated = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while True:
+                playlist_ids = self._pending_ids(
+                    SavedPlaylist, 'spotify_playlist_id', MISSING_PLAYLIST_IMAGE, state.get('playlist'), batch_size
                 )
-                
-                if response.status_code == 200:
-                    track_data = response.json()
-                    if track_data.get('album', {}).get('images'):
-                        song.album_image_url = track_data['album']['images'][0]['url']
-                        song.save()
-                        updated_songs += 1
-                        self.stdout.write(f"Updated: {song.track_name}")
-                elif response.status_code == 401:
-                    self.stdout.write(self.style.ERROR("Spotify token expired. Please reconnect to Spotify."))
-                    break
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f"Failed to update {song.track_name}: {str(e)}"))
-        
-        # Update playlists
-        updated_playlists = 0
-        for playlist in playlists_without_images:
-            try:
-                # Fetch playlist details from Spotify
-                response = requests.get(
-                    f'https://api.spotify.com/v1/playlists/{playlist.spotify_playlist_id}',
-                    headers=headers
+                if not playlist_ids:
+                    return updated
+                images = {pid: url for pid, url in pool.map(self._fetch_playlist, playlist_ids) if url}
+                updated += self._apply(
+                    SavedPlaylist, 'spotify_playlist_id', 'playlist_image_url', MISSING_PLAYLIST_IMAGE, images
                 )
-                
-                if response.status_code == 200:
-                    playlist_data = response.json()
-                    if playlist_data.get('images'):
-                        playlist.playlist_image_url = playlist_data['images'][0]['url']
-                        playlist.save()
-                        updated_playlists += 1
-                        self.stdout.write(f"Updated: {playlist.playlist_name}")
-                elif response.status_code == 401:
-                    self.stdout.write(self.style.ERROR("Spotify token expired. Please reconnect to Spotify."))
-                    break
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f"Failed to update {playlist.playlist_name}: {str(e)}"))
-        
+                state['playlist'] = playlist_ids[-1]
+                self._save_checkpoint(checkpoint, state)
+                self.stdout.write(f"Playlists: {updated} updated (up to playlist {playlist_ids[-1]})")
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        state = self._load_checkpoint(checkpoint)
+        if state:
+            self.stdout.write(f"Resuming after track {state.get('track')} / playlist {state.get('playlist')}")
+
+        self.stdout.write(f"Found {LikedSong.objects.filter(MISSING_SONG_IMAGE).count()} songs without images")
+        self.stdout.write(f"Found {SavedPlaylist.objects.filter(MISSING_PLAYLIST_IMAGE).count()} playlists without images")
+
+        try:
+            spotify.app_token()
+        except spotify.SpotifyError as e:
+            self.stdout.write(self.style.ERROR(f"Can't get a Spotify app token: {e}"))
+            return
+
+        try:
+            updated_songs = self._update_songs(state, checkpoint, options['batch_size'])
+            updated_playlists = self._update_playlists(state, checkpoint, options['batch_size'], options['workers'])
+        except spotify.SpotifyError as e:
+            self.stdout.write(self.style.ERROR(f"Spotify error: {e}. Re-run with the same --checkpoint to resume."))
+            return
+
         self.stdout.write(self.style.SUCCESS(f"Successfully updated {updated_songs} songs and {updated_playlists} playlists!"))
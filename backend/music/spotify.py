@@ -0,0 +1,330 @@
+"""
+Spotify Web API gateway.
+
+Every read the music page makes goes through here.
+
+The /me endpoints (profile, playlists, top tracks, recently played,
+followed artists) go through `fetch`. It caches each response per user in
+the Django cache, with a TTL per endpoint: top tracks barely move within
+hours, recently played within a minute. Entries outlive their TTL by
+SPOTIFY_CACHE_REVALIDATE_WINDOW. After they go stale, the next read sends
+the stored ETag as If-None-Match, and a 304 Not Modified renews the entry
+without re-downloading it. A `Cache-Control: no-store` answer is never
+cached, and a `max-age` longer than the endpoint TTL is honoured.
+
+Search results don't depend on who asks. `search` therefore uses the app's
+own client-credentials token and caches the answer by the normalized query
+in two tiers:
+
+1. an in-process LRU (per gunicorn worker)
+2. the Django cache (shared by every worker)
+
+Concurrent misses for the same query within a worker share one upstream
+call. Only the track fields the frontend renders are kept.
+
+Errors come back as `SpotifyError`, which carries the status and JSON body
+the views return to the frontend. Calls share the Spotify rate limit set up in
+tunr_backend/upstream.py. When it runs out, a stale /me entry is served
+instead, or else a 429 with `retry_after`.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from movies.omdb import LRUCache
+from tunr_backend.upstream import INTERACTIVE, RateLimitedError, get_client
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'spotify'
+
+# name -> (API path, fixed query params)
+ENDPOINTS = {
+    'profile': ('me', {}),
+    'playlists': ('me/playlists', {'limit': 50}),
+    'top_tracks': ('me/top/tracks', {'limit': 20, 'time_range': 'short_term'}),
+    'recently_played': ('me/player/recently-played', {'limit': 50}),
+    'following': ('me/following', {'type': 'artist', 'limit': 50}),
+}
+# Request 50 tracks to increase chances of finding tracks with previews
+SEARCH_PARAMS = {'type': 'track', 'limit': 50, 'market': 'US'}
+APP_TOKEN_KEY = f'{CACHE_PREFIX}:app-token'
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+class SpotifyError(Exception):
+    """A Spotify call failed; `status` and `payload` are what the view should return"""
+
+    def __init__(self, status, error, **detail):
+        super().__init__(error)
+        self.status = status
+        self.payload = {'error': error, **detail}
+
+
+def _rate_limited(e):
+    return SpotifyError(429, 'Spotify is busy, please try again shortly', retry_after=e.retry_after)
+
+
+def normalize_query(query):
+    """Collapse case and whitespace so equivalent searches share one entry"""
+    return ' '.join((query or '').lower().split())
+
+
+def _cache_key(endpoint, scope):
+    return f'{CACHE_PREFIX}:{endpoint}:{scope}'
+
+
+def _user_scope(user_id, access_token):
+    # Session-only connections have no user row; fall back to the token itself
+    if user_id:
+        return f'user{user_id}'
+    return 'token' + hashlib.sha1(access_token.encode()).hexdigest()[:16]
+
+
+def _freshness(response, endpoint):
+    """Seconds to serve `response` without asking Spotify again (None: don't store)"""
+    cache_control = response.headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control:
+        return None
+    ttl = settings.SPOTIFY_CACHE_TTLS[endpoint]
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        ttl = max(ttl, int(match.group(1)))
+    return ttl
+
+
+def _store(key, data, etag, ttl):
+    entry = {'data': data, 'etag': etag, 'expires_at': time.time() + ttl}
+    try:
+        cache.set(key, entry, ttl + settings.SPOTIFY_CACHE_REVALIDATE_WINDOW)
+    except Exception as e:
+        logger.warning('Spotify cache write failed: %s', e)
+
+
+def _raise_for_status(response):
+    if response.status_code == 401:
+        raise SpotifyError(401, 'Spotify session expired. Please reconnect.')
+    if response.status_code == 403:
+        raise SpotifyError(
+            403, 'Spotify API access forbidden',
+            detail=response.text,
+            hint='Check if your Spotify account is added to the app allowlist in Spotify Developer Dashboard',
+        )
+    raise SpotifyError(
+        response.status_code, f'Spotify API error: {response.status_code}', detail=response.text[:200]
+    )
+
+
+def fetch(endpoint, access_token, user_id=None):
+    """JSON body of a /me read (`endpoint` is a key of ENDPOINTS), served from cache when possible"""
+    path, params = ENDPOINTS[endpoint]
+    key = _cache_key(endpoint, _user_scope(user_id, access_token))
+
+    try:
+        entry = cache.get(key)
+    except Exception as e:
+        # The cache is an optimisation; never fail a request over it
+        logger.warning('Spotify cache read failed: %s', e)
+        entry = None
+    if entry and entry['expires_at'] > time.time():
+        return entry['data']
+
+    headers = {'Authorization': f'Bearer {access_token}'}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    try:
+        response = get_client('spotify').get(path, params=params, headers=headers)
+    except RateLimitedError as e:
+        # Out of quota: a stale copy beats an error
+        if entry:
+            return entry['data']
+        raise _rate_limited(e) from e
+    except requests.RequestException as e:
+        raise SpotifyError(503, 'Failed to connect to Spotify', detail=str(e)) from e
+
+    if response.status_code == 304 and entry:
+        ttl = _freshness(response, endpoint)
+        if ttl:
+            _store(key, entry['data'], response.headers.get('ETag') or entry['etag'], ttl)
+        return entry['data']
+    if response.status_code != 200:
+        _raise_for_status(response)
+
+    data = response.json()
+    ttl = _freshness(response, endpoint)
+    if ttl:
+        _store(key, data, response.headers.get('ETag'), ttl)
+    return data
+
+
+def forget_user(user_id):
+    """Drop a user's cached /me responses (e.g. after they (dis)connect Spotify)"""
+    keys = [_cache_key(endpoint, _user_scope(user_id, '')) for endpoint in ENDPOINTS]
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning('Spotify cache delete failed: %s', e)
+
+
+# ============= APP TOKEN & SEARCH =============
+
+_app_token = {'token': None, 'expires_at': 0.0}
+_app_token_lock = threading.Lock()
+
+
+def _request_app_token():
+    if not settings.SPOTIFY_CLIENT_ID or not settings.SPOTIFY_CLIENT_SECRET:
+        raise SpotifyError(503, 'Spotify is not configured')
+    try:
+        response = get_client('spotify_accounts').post(
+            'api/token',
+            data={'grant_type': 'client_credentials'},
+            auth=(settings.SPOTIFY_CLIENT_ID, settings.SPOTIFY_CLIENT_SECRET),
+        )
+    except requests.RequestException as e:
+        raise SpotifyError(503, 'Failed to connect to Spotify', detail=str(e)) from e
+    if response.status_code != 200:
+        raise SpotifyError(503, f'Spotify token error: {response.status_code}', detail=response.text[:200])
+    tokens = response.json()
+    # Renew a minute early so a token never expires mid-request
+    return tokens['access_token'], time.time() + int(tokens.get('expires_in') or 3600) - 60
+
+
+def _cached_app_token():
+    try:
+        return cache.get(APP_TOKEN_KEY)
+    except Exception as e:
+        logger.warning('Spotify cache read failed: %s', e)
+        return None
+
+
+def app_token(force_refresh=False):
+    """The app's client-credentials token, shared by workers through the cache"""
+    # Fast path without the lock: readers never wait on a token request
+    if not force_refresh and _app_token['expires_at'] > time.time():
+        return _app_token['token']
+    with _app_token_lock:
+        # Double-checked: another thread may have renewed it while we waited
+        if not force_refresh and _app_token['expires_at'] > time.time():
+            return _app_token['token']
+        entry = None if force_refresh else _cached_app_token()
+        if not entry or entry['expires_at'] <= time.time():
+            token, expires_at = _request_app_token()
+            entry = {'token': token, 'expires_at': expires_at}
+            try:
+                cache.set(APP_TOKEN_KEY, entry, max(1, int(expires_at - time.time())))
+            except Exception as e:
+                logger.warning('Spotify cache write failed: %s', e)
+        _app_token.update(entry)
+        return entry['token']
+
+
+def _trim_track(track):
+    album = track.get('album') or {}
+    return {
+        'id': track.get('id'),
+        'name': track.get('name'),
+        'uri': track.get('uri'),
+        'preview_url': track.get('preview_url'),
+        'duration_ms': track.get('duration_ms'),
+        'artists': [{'id': a.get('id'), 'name': a.get('name')} for a in track.get('artists') or []],
+        'album': {
+            'id': album.get('id'),
+            'name': album.get('name'),
+            'images': album.get('images') or [],
+        },
+    }
+
+
+def app_get(path, params=None, priority=INTERACTIVE):
+    """GET a public Spotify resource with the app token; returns the response (raises SpotifyError)"""
+    for attempt in range(2):
+        try:
+            response = get_client('spotify').get(
+                path,
+                params=params,
+                headers={'Authorization': f'Bearer {app_token(force_refresh=attempt > 0)}'},
+                priority=priority,
+            )
+        except RateLimitedError as e:
+            raise _rate_limited(e) from e
+        except requests.RequestException as e:
+            raise SpotifyError(503, 'Failed to connect to Spotify', detail=str(e)) from e
+        # A 401 means the cached app token was revoked early; get a new one once
+        if response.status_code != 401:
+            return response
+    raise SpotifyError(503, 'Spotify rejected the app token')
+
+
+def _search_upstream(query):
+    response = app_get('search', {**SEARCH_PARAMS, 'q': query})
+    if response.status_code != 200:
+        _raise_for_status(response)
+    tracks = response.json().get('tracks') or {}
+    return {'tracks': {
+        'items': [_trim_track(track) for track in tracks.get('items') or [] if track],
+        'total': tracks.get('total', 0),
+    }}
+
+
+_search_local = LRUCache(settings.SPOTIFY_SEARCH_LOCAL_CACHE_SIZE)
+_search_inflight = {}
+_search_inflight_lock = threading.Lock()
+
+
+def _search_cached(key, query):
+    """Shared-tier lookup, then Spotify; stores the result in both tiers"""
+    ttl = settings.SPOTIFY_CACHE_TTLS['search']
+    try:
+        entry = cache.get(key)
+    except Exception as e:
+        logger.warning('Spotify cache read failed: %s', e)
+        entry = None
+    if entry and entry['expires_at'] > time.time():
+        _search_local.set(key, entry['data'], entry['expires_at'] - time.time())
+        return entry['data']
+
+    data = _search_upstream(query)
+    _search_local.set(key, data, ttl)
+    try:
+        cache.set(key, {'data': data, 'expires_at': time.time() + ttl}, ttl)
+    except Exception as e:
+        logger.warning('Spotify cache write failed: %s', e)
+    return data
+
+
+def search(query):
+    """Track search results for `query` (trimmed to the fields the frontend shows)"""
+    query = normalize_query(query)
+    key = _cache_key('search', hashlib.sha1(query.encode()).hexdigest())
+    data = _search_local.get(key)
+    if data is not None:
+        return data
+
+    # Single flight: concurrent misses for the same query wait for the first one
+    with _search_inflight_lock:
+        future = _search_inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _search_inflight[key] = Future()
+    if not leader:
+        return future.result()
+
+    try:
+        data = _search_cached(key, query)
+        future.set_result(data)
+        return data
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _search_inflight_lock:
+            _search_inflight.pop(key, None)
@@ -1,3 +1,295 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from accounts.models import CustomUser
+from tunr_backend.upstream import RateLimitedError
+
+from . import spotify, tokens
+from .models import LikedSong
+
+
+class TokenRefreshTests(TestCase):
+    def setUp(self):
+        self.expires = timezone.now() + timedelta(seconds=30)
+        self.user = CustomUser.objects.create(
+            username='listener',
+            spotify_access_token='old-access',
+            spotify_refresh_token='old-refresh',
+            spotify_token_expires=self.expires,
+        )
+
+    def _reload(self):
+        return CustomUser.objects.get(id=self.user.id)
+
+    @mock.patch.object(tokens, 'request_refresh', return_value={'access_token': 'new-access', 'expires_in': 3600})
+    def test_refreshes_an_expiring_token(self, request_refresh):
+        self.assertEqual(tokens.refresh(self.user.id), 'new-access')
+        request_refresh.assert_called_once_with('old-refresh')
+        user = self._reload()
+        self.assertEqual(user.spotify_access_token, 'new-access')
+        self.assertEqual(user.spotify_refresh_token, 'old-refresh')
+        self.assertGreater(user.spotify_token_expires, timezone.now() + timedelta(minutes=59))
+
+    @mock.patch.object(tokens, 'request_refresh')
+    def test_leaves_a_fresh_token_alone(self, request_refresh):
+        CustomUser.objects.filter(id=self.user.id).update(spotify_token_expires=timezone.now() + timedelta(hours=1))
+        self.assertEqual(tokens.refresh(self.user.id), 'old-access')
+        request_refresh.assert_not_called()
+
+    @mock.patch.object(tokens, 'request_refresh', return_value={})
+    def test_revoked_refresh_token_disconnects(self, request_refresh):
+        self.assertIsNone(tokens.refresh(self.user.id))
+        user = self._reload()
+        self.assertIsNone(user.spotify_access_token)
+        self.assertIsNone(user.spotify_refresh_token)
+
+    def test_concurrent_refresh_does_not_overwrite_a_newer_token(self):
+        def refreshed_elsewhere(refresh_token):
+            # Another worker lands its token while our request is in flight
+            CustomUser.objects.filter(id=self.user.id).update(
+                spotify_access_token='their-access', spotify_token_expires=timezone.now() + timedelta(hours=1),
+            )
+            return {'access_token': 'our-access', 'expires_in': 3600}
+
+        with mock.patch.object(tokens, 'request_refresh', side_effect=refreshed_elsewhere):
+            self.assertEqual(tokens.refresh(self.user.id), 'their-access')
+        self.assertEqual(self._reload().spotify_access_token, 'their-access')
+
+    @mock.patch.object(tokens, 'REFRESH_WAIT', 0)
+    @mock.patch.object(tokens, 'request_refresh')
+    def test_waits_for_a_refresh_in_progress(self, request_refresh):
+        cache.add(tokens._lock_key(self.user.id), 1)
+        self.assertEqual(tokens.refresh(self.user.id), 'old-access')
+        request_refresh.assert_not_called()
+
+    @mock.patch.object(tokens, 'request_refresh', return_value={'access_token': 'new-access'})
+    def test_releases_the_lock(self, request_refresh):
+        tokens.refresh(self.user.id)
+        self.assertIsNone(cache.get(tokens._lock_key(self.user.id)))
+
+    @mock.patch.object(tokens, '_refresh_async')
+    def test_access_token_for_renews_in_the_background_within_the_skew(self, refresh_async):
+        self.assertEqual(tokens.access_token_for(self.user), 'old-access')
+        refresh_async.assert_called_once_with(self.user.id)
+
+    @mock.patch.object(tokens, 'request_refresh', return_value={'access_token': 'new-access'})
+    def test_access_token_for_refreshes_an_expired_token_inline(self, request_refresh):
+        CustomUser.objects.filter(id=self.user.id).update(spotify_token_expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tokens.access_token_for(self._reload()), 'new-access')
+
+
+class RefreshCommandTests(TransactionTestCase):
+    """The command refreshes on worker threads, which only see committed rows"""
+
+    ANSWERS = {
+        'ok-refresh': {'access_token': 'new-access', 'expires_in': 3600},
+        'revoked-refresh': {},
+        'down-refresh': None,
+    }
+
+    def setUp(self):
+        expires = timezone.now() + timedelta(seconds=30)
+        for name in ('ok', 'revoked', 'down'):
+            CustomUser.objects.create(
+                username=name, email=f'{name}@example.com', spotify_access_token=f'{name}-access',
+                spotify_refresh_token=f'{name}-refresh', spotify_token_expires=expires,
+            )
+
+    def _sweep(self, *names):
+        CustomUser.objects.exclude(username__in=names).update(spotify_refresh_token=None)
+        stdout = StringIO()
+        with mock.patch.object(tokens, 'request_refresh', side_effect=self.ANSWERS.get):
+            call_command('refresh_spotify_tokens', stdout=stdout)
+        return stdout.getvalue()
+
+    def test_counts_each_outcome_and_fails_the_run(self):
+        with self.assertRaisesMessage(CommandError, '1 token refreshes failed'):
+            self._sweep('ok', 'revoked', 'down')
+        self.assertEqual(CustomUser.objects.get(username='ok').spotify_access_token, 'new-access')
+        self.assertIsNone(CustomUser.objects.get(username='revoked').spotify_access_token)
+        self.assertEqual(CustomUser.objects.get(username='down').spotify_access_token, 'down-access')
+
+    def test_summary_line(self):
+        output = self._sweep('ok', 'revoked')
+        self.assertIn('2 expiring tokens: 1 refreshed, 1 revoked, 0 failed', output)
+        self.assertIn('Token sweep finished', output)
+
+
+class SpotifySearchTests(TestCase):
+    def setUp(self):
+        spotify._app_token.update(token=None, expires_at=0.0)
+
+    @mock.patch.object(spotify, 'search')
+    def test_search_requires_a_tunr_user(self, search):
+        response = self.client.get(reverse('spotify_search'), {'q': 'daft punk'})
+        self.assertEqual(response.status_code, 401)
+        search.assert_not_called()
+
+    @mock.patch.object(spotify, 'search', return_value={'tracks': {'items': [], 'total': 0}})
+    def test_search_with_a_token(self, search):
+        user = CustomUser.objects.create(username='listener')
+        token = Token.objects.create(user=user)
+        response = self.client.get(
+            reverse('spotify_search'), {'q': 'daft punk'}, HTTP_AUTHORIZATION=f'Token {token.key}',
+        )
+        self.assertEqual(response.status_code, 200)
+        search.assert_called_once_with('daft punk')
+
+    @mock.patch.object(spotify, '_request_app_token', return_value=('app-token', time.time() + 3600))
+    def test_app_token_survives_a_broken_cache(self, request_app_token):
+        with mock.patch.object(spotify.cache, 'get', side_effect=Exception('down')), \
+                mock.patch.object(spotify.cache, 'set', side_effect=Exception('down')):
+            self.assertEqual(spotify.app_token(), 'app-token')
+
+    def test_app_token_is_requested_once_under_concurrency(self):
+        def slow_token():
+            time.sleep(0.05)
+            return 'app-token', time.time() + 3600
+
+        with mock.patch.object(spotify, '_request_app_token', side_effect=slow_token) as request_app_token, \
+                mock.patch.object(spotify, '_cached_app_token', return_value=None):
+            threads = [threading.Thread(target=spotify.app_token) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(request_app_token.call_count, 1)
+        self.assertEqual(spotify.app_token(), 'app-token')
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data or {}
+        self.text = json.dumps(self.data)
+        self.headers = headers or {}
+
+    def json(self):
+        return self.data
+
+
+def _track(track_id):
+    return {'id': track_id, 'album': {'images': [{'url': f'https://img.test/{track_id}.jpg'}]}}
+
+
+class SpotifyFetchTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(spotify, 'get_client')
+        self.get = patcher.start().return_value.get
+        self.addCleanup(patcher.stop)
+        self.key = spotify._cache_key('top_tracks', spotify._user_scope(7, 'token'))
+
+    def _fetch(self):
+        return spotify.fetch('top_tracks', 'token', user_id=7)
+
+    def _expire(self):
+        entry = cache.get(self.key)
+        cache.set(self.key, {**entry, 'expires_at': time.time() - 1})
+
+    def test_fresh_entry_skips_spotify(self):
+        self.get.return_value = FakeResponse(200, {'items': [1]}, {'ETag': '"v1"'})
+        self.assertEqual(self._fetch(), {'items': [1]})
+        self.assertEqual(self._fetch(), {'items': [1]})
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_stale_entry_revalidates_with_etag(self):
+        self.get.return_value = FakeResponse(200, {'items': [1]}, {'ETag': '"v1"'})
+        self._fetch()
+        self._expire()
+        self.get.return_value = FakeResponse(304)
+        self.assertEqual(self._fetch(), {'items': [1]})
+        self.assertEqual(self.get.call_args.kwargs['headers']['If-None-Match'], '"v1"')
+        # The 304 renewed the entry, ETag included
+        entry = cache.get(self.key)
+        self.assertGreater(entry['expires_at'], time.time())
+        self.assertEqual(entry['etag'], '"v1"')
+        self._fetch()
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_changed_resource_replaces_the_entry(self):
+        self.get.return_value = FakeResponse(200, {'items': [1]}, {'ETag': '"v1"'})
+        self._fetch()
+        self._expire()
+        self.get.return_value = FakeResponse(200, {'items': [2]}, {'ETag': '"v2"'})
+        self.assertEqual(self._fetch(), {'items': [2]})
+        self.assertEqual(cache.get(self.key)['etag'], '"v2"')
+
+    def test_no_store_is_not_cached(self):
+        self.get.return_value = FakeResponse(200, {'items': [1]}, {'Cache-Control': 'private, no-store'})
+        self._fetch()
+        self.assertIsNone(cache.get(self.key))
+
+    def test_longer_max_age_is_honoured(self):
+        max_age = settings.SPOTIFY_CACHE_TTLS['top_tracks'] * 2
+        self.get.return_value = FakeResponse(200, {'items': [1]}, {'Cache-Control': f'max-age={max_age}'})
+        self._fetch()
+        self.assertGreater(cache.get(self.key)['expires_at'], time.time() + max_age - 60)
+
+    def test_stale_entry_served_when_rate_limited(self):
+        self.get.return_value = FakeResponse(200, {'items': [1]}, {'ETag': '"v1"'})
+        self._fetch()
+        self._expire()
+        self.get.side_effect = RateLimitedError('busy', retry_after=5)
+        self.assertEqual(self._fetch(), {'items': [1]})
+        cache.delete(self.key)
+        with self.assertRaises(spotify.SpotifyError) as raised:
+            self._fetch()
+        self.assertEqual(raised.exception.status, 429)
+
+
+class UpdateMusicImagesTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username='listener')
+        for track_id in ('track-a', 'track-b', 'track-c'):
+            LikedSong.objects.create(user=user, spotify_track_id=track_id, track_name=track_id, artist_name='x')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = os.path.join(tmp.name, 'checkpoint.json')
+
+    def _run(self, app_get):
+        with mock.patch.object(spotify, 'app_token', return_value='app-token'), \
+                mock.patch.object(spotify, 'app_get', side_effect=app_get):
+            call_command('update_music_images', f'--checkpoint={self.checkpoint}', stdout=StringIO())
+
+    def _images(self):
+        return dict(LikedSong.objects.values_list('spotify_track_id', 'album_image_url'))
+
+    def test_failed_batch_does_not_advance_the_checkpoint(self):
+        self._run(lambda path, params, priority: FakeResponse(503))
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertEqual(set(self._images().values()), {None})
+
+        def tracks(path, params, priority):
+            return FakeResponse(200, {'tracks': [_track(i) for i in params['ids'].split(',')]})
+
+        self._run(tracks)
+        self.assertEqual(self._images()['track-c'], 'https://img.test/track-c.jpg')
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['track'], 'track-c')
+
+    def test_rejected_batch_falls_back_to_single_ids(self):
+        def tracks(path, params, priority):
+            ids = params['ids'].split(',')
+            if 'track-b' in ids:
+                return FakeResponse(400, {'error': {'status': 400, 'message': 'invalid id'}})
+            return FakeResponse(200, {'tracks': [_track(i) for i in ids]})
+
+        self._run(tracks)
+        images = self._images()
+        self.assertEqual(images['track-a'], 'https://img.test/track-a.jpg')
+        self.assertIsNone(images['track-b'])
+        self.assertEqual(images['track-c'], 'https://img.test/track-c.jpg')
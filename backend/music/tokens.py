@@ -0,0 +1,213 @@
+"""
+Spotify user access tokens.
+
+Tokens are refreshed ahead of expiry rather than after it:
+
+- `manage.py refresh_spotify_tokens --loop` renews every token that expires
+  within SPOTIFY_TOKEN_REFRESH_HORIZON, so requests normally find a fresh one
+- a request that finds its token inside SPOTIFY_TOKEN_REFRESH_SKEW of expiry
+  still uses it and renews it on a background thread
+- only a request holding an already-expired token refreshes inline
+
+Refreshes are single-flight per user without holding a row lock across
+the call to Spotify (that would block counter and follow updates on the
+same row):
+
+- a short cache lock (`cache.add`) keeps other workers from asking Spotify
+  at the same time; they wait for the new token to land instead
+- the new token is written with a compare-and-set UPDATE that only matches
+  if the row still holds the token we refreshed, so a slower refresher can
+  never overwrite a newer token
+
+Only the token columns are written.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from tunr_backend.upstream import get_client
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FIELDS = ['spotify_access_token', 'spotify_refresh_token', 'spotify_token_expires']
+
+# Longer than a token request can take (connect + read timeout, with retries)
+REFRESH_LOCK_TIMEOUT = 30
+# How long a worker waits for someone else's refresh before giving up
+REFRESH_WAIT = 5.0
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def request_refresh(refresh_token):
+    """
+    Trade a refresh token for a new access token.
+
+    Returns Spotify's token payload, {} when the refresh token was revoked,
+    or None when Spotify couldn't be reached.
+    """
+    token_data = {
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+        'client_id': settings.SPOTIFY_CLIENT_ID,
+        'client_secret': settings.SPOTIFY_CLIENT_SECRET
+    }
+
+    try:
+        response = get_client('spotify_accounts').post(
+            'api/token',
+            data=token_data,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'}
+        )
+    except Exception as e:
+        logger.warning('Spotify token refresh failed: %s', e)
+        return None
+    if response.status_code == 200:
+        return response.json()
+    if response.status_code == 400 and 'invalid_grant' in response.text:
+        return {}
+    logger.warning('Spotify token refresh failed: %s %s', response.status_code, response.text[:200])
+    return None
+
+
+def _needs_refresh(user, within):
+    expires = user.spotify_token_expires
+    return bool(user.spotify_refresh_token) and expires is not None and expires <= timezone.now() + within
+
+
+def _lock_key(user_id):
+    return f'spotify:token-refresh:{user_id}'
+
+
+def _acquire_refresh_lock(user_id):
+    try:
+        return cache.add(_lock_key(user_id), 1, REFRESH_LOCK_TIMEOUT)
+    except Exception as e:
+        # Without the cache we may refresh twice; the compare-and-set keeps that safe
+        logger.warning('Spotify token lock failed: %s', e)
+        return True
+
+
+def _release_refresh_lock(user_id):
+    try:
+        cache.delete(_lock_key(user_id))
+    except Exception as e:
+        logger.warning('Spotify token unlock failed: %s', e)
+
+
+def _load(user_id):
+    return CustomUser.objects.only('id', *TOKEN_FIELDS).filter(id=user_id).first()
+
+
+def _wait_for_refresh(user, within):
+    """Someone else is refreshing `user`'s token; wait for it to land"""
+    deadline = time.monotonic() + REFRESH_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.2)
+        current = _load(user.id)
+        if current is None or not _needs_refresh(current, within):
+            return current
+    return user
+
+
+def refresh(user_id, within=None):
+    """
+    Refresh a user's token if it expires within `within` (default: the skew).
+
+    Returns the user's current access token (or None if they're disconnected).
+    """
+    within = timedelta(seconds=settings.SPOTIFY_TOKEN_REFRESH_SKEW) if within is None else within
+    user = _load(user_id)
+    if user is None:
+        return None
+    if not _needs_refresh(user, within):
+        return user.spotify_access_token
+
+    if not _acquire_refresh_lock(user_id):
+        user = _wait_for_refresh(user, within)
+        return user and user.spotify_access_token
+    try:
+        user = _load(user_id)  # re-read: a refresh may have finished before we took the lock
+        if user is None:
+            return None
+        if not _needs_refresh(user, within):
+            return user.spotify_access_token  # someone else got here first
+
+        tokens = request_refresh(user.spotify_refresh_token)
+        if tokens is None:
+            return user.spotify_access_token
+        if not tokens:
+            # Revoked from the Spotify side; the user has to reconnect
+            values = dict.fromkeys(TOKEN_FIELDS)
+        else:
+            values = {
+                'spotify_access_token': tokens.get('access_token'),
+                # Spotify may rotate the refresh token
+                'spotify_refresh_token': tokens.get('refresh_token') or user.spotify_refresh_token,
+                'spotify_token_expires': timezone.now() + timedelta(seconds=int(tokens.get('expires_in') or 3600)),
+            }
+        # Compare-and-set: only replace the token we refreshed
+        updated = CustomUser.objects.filter(
+            id=user_id,
+            spotify_refresh_token=user.spotify_refresh_token,
+            spotify_token_expires=user.spotify_token_expires,
+        ).update(**values)
+        if not updated:
+            current = _load(user_id)
+            return current and current.spotify_access_token
+        return values['spotify_access_token']
+    finally:
+        _release_refresh_lock(user_id)
+
+
+def _refresh_in_background(user_id):
+    try:
+        refresh(user_id)
+    except Exception as e:
+        logger.warning('Background Spotify token refresh for user %s failed: %s', user_id, e)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(user_id)
+        # Threads get their own DB connection; don't leak it
+        connection.close()
+
+
+def _refresh_async(user_id):
+    with _refreshing_lock:
+        if user_id in _refreshing:
+            return
+        _refreshing.add(user_id)
+    threading.Thread(target=_refresh_in_background, args=(user_id,), daemon=True).start()
+
+
+def access_token_for(user):
+    """A usable Spotify access token for `user` (None if not connected)"""
+    if not user.spotify_access_token:
+        return None
+    expires = user.spotify_token_expires
+    if expires is None or not user.spotify_refresh_token:
+        return user.spotify_access_token
+    now = timezone.now()
+    if expires <= now:
+        return refresh(user.id)
+    if expires <= now + timedelta(seconds=settings.SPOTIFY_TOKEN_REFRESH_SKEW):
+        _refresh_async(user.id)
+    return user.spotify_access_token
+
+
+def expiring_user_ids(within):
+    """Users whose token expires within `within` and can be refreshed"""
+    return list(
+        CustomUser.objects.filter(
+            spotify_token_expires__lte=timezone.now() + within,
+            spotify_refresh_token__isnull=False,
+        ).exclude(spotify_refresh_token='').order_by('spotify_token_expires').values_list('id', flat=True)
+    )
@@ -1,5 +1,4 @@
 # backend/music/views.py
-import requests
 from django.shortcuts import redirect
 from django.http import JsonResponse, HttpResponse
 from django.conf import settings
@@ -9,78 +8,38 @@ from rest_framework.authtoken.models import Token
 from django.utils import timezone
 from datetime import timedelta
 from accounts.models import CustomUser
+from tunr_backend.upstream import get_client
+from . import spotify
+from .tokens import TOKEN_FIELDS, access_token_for
 
 
-def refresh_spotify_token(refresh_token):
-    """Refresh an expired Spotify access token"""
-    token_data = {
-        'grant_type': 'refresh_token',
-        'refresh_token': refresh_token,
-        'client_id': settings.SPOTIFY_CLIENT_ID,
-        'client_secret': settings.SPOTIFY_CLIENT_SECRET
-    }
-    
-    try:
-        response = requests.post(
-            'https://accounts.spotify.com/api/token',
-            data=token_data,
-            headers={'Content-Type': 'application/x-www-form-urlencoded'}
-        )
-        
-        if response.status_code == 200:
-            tokens = response.json()
-            return tokens.get('access_token'), tokens.get('expires_in')
-        return None, None
-    except Exception:
-        return None, None
-
-
-def get_valid_access_token(request):
-    """Get a valid access token, refreshing if necessary"""
-    # First check if user is authenticated via Token Auth
-    from rest_framework.authtoken.models import Token
-    
-    # Try to get user from Token auth header
-    user = None
+def _request_user(request):
+    """The user behind the request's `Token` header (or session), if any"""
     auth_header = request.headers.get('Authorization', '')
     if auth_header.startswith('Token '):
         token_key = auth_header.split(' ')[1]
-        try:
-            token_obj = Token.objects.get(key=token_key)
-            user = token_obj.user
-        except Token.DoesNotExist:
-            pass
+        token_obj = Token.objects.select_related('user').filter(key=token_key).first()
+        if token_obj:
+            return token_obj.user
     
     # Fall back to request.user if available
-    if not user and hasattr(request, 'user') and request.user.is_authenticated:
-        user = request.user
-    
-    # If we have a user, get their Spotify token
+    if hasattr(request, 'user') and request.user.is_authenticated:
+        return request.user
+    return None
+
+
+def _access_token(request, user):
+    """`user`'s Spotify access token, refreshed ahead of expiry (music/tokens.py)"""
     if user:
-        access_token = getattr(user, 'spotify_access_token', None)
-        refresh_token = getattr(user, 'spotify_refresh_token', None)
-        token_expires = getattr(user, 'spotify_token_expires', None)
-        
-        # Check if token is expired
-        if token_expires and timezone.now() >= token_expires:
-            # Token expired, try to refresh
-            if refresh_token:
-                new_access_token, expires_in = refresh_spotify_token(refresh_token)
-                if new_access_token:
-                    access_token = new_access_token
-                    # Update user model
-                    user.spotify_access_token = new_access_token
-                    if expires_in:
-                        user.spotify_token_expires = timezone.now() + timedelta(seconds=int(expires_in))
-                    user.save()
-        
-        return access_token
+        return access_token_for(user)
     
     # Fall back to session-based tokens (for backwards compatibility)
-    access_token = request.session.get('spotify_access_token')
-    refresh_token = request.session.get('spotify_refresh_token')
-    
-    return access_token
+    return request.session.get('spotify_access_token')
+
+
+def get_valid_access_token(request):
+    """Get a valid access token, refreshing if necessary"""
+    return _access_token(request, _request_user(request))
 
 @csrf_exempt
 def spotify_login(request):
@@ -128,8 +87,8 @@ def spotify_callback(request):
             'client_secret': settings.SPOTIFY_CLIENT_SECRET
         }
         
-        response = requests.post(
-            'https://accounts.spotify.com/api/token',
+        response = get_client('spotify_accounts').post(
+            'api/token',
             data=token_data,
             headers={'Content-Type': 'application/x-www-form-urlencoded'}
         )
@@ -145,7 +104,7 @@ def spotify_callback(request):
             request.session['spotify_refresh_token'] = refresh_token
 
             # Try to fetch Spotify profile
-            profile_resp = requests.get('https://api.spotify.com/v1/me', headers={'Authorization': f'Bearer {access_token}'})
+            profile_resp = get_client('spotify').get('me', headers={'Authorization': f'Bearer {access_token}'})
             spotify_profile = None
             if profile_resp.status_code == 200:
                 spotify_profile = profile_resp.json()
@@ -174,7 +133,9 @@ def spotify_callback(request):
                     user_to_link.spotify_refresh_token = refresh_token
                     if expires_in:
                         user_to_link.spotify_token_expires = timezone.now() + timedelta(seconds=int(expires_in))
-                    user_to_link.save()
+                    user_to_link.save(update_fields=['spotify_id', 'spotify_display_name', *TOKEN_FIELDS])
+                    # Cached /me responses may belong to a previously linked account
+                    spotify.forget_user(user_to_link.id)
                 except Exception:
                     # If saving fails, continue but leave tokens in session
                     pass
@@ -185,200 +146,68 @@ def spotify_callback(request):
     
     return redirect('http://127.0.0.1:3000/music?error=no_code')
 
-@csrf_exempt
-def spotify_search(request):
-    """Search Spotify API"""
-    query = request.GET.get('q')
-    access_token = get_valid_access_token(request)
+def _spotify_error(e):
+    response = JsonResponse(e.payload, status=e.status)
+    if 'retry_after' in e.payload:
+        response['Retry-After'] = str(e.payload['retry_after'])
+    return response
+
+
+def _spotify_response(request, endpoint):
+    """Proxy one Spotify /me read through the caching gateway (music/spotify.py)"""
+    user = _request_user(request)
+    access_token = _access_token(request, user)
 
     if not access_token:
         return JsonResponse({'error': 'Not authenticated with Spotify'}, status=401)
     
     try:
-        # Request 50 tracks to increase chances of finding tracks with previews
-        response = requests.get(
-            f'https://api.spotify.com/v1/search?q={query}&type=track&limit=50&market=US',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        if response.status_code == 401:
-            return JsonResponse({'error': 'Spotify session expired. Please reconnect.'}, status=401)
-        
-        if response.status_code != 200:
-            return JsonResponse({
-                'error': f'Spotify API error: {response.status_code}',
-                'detail': response.text[:200]
-            }, status=response.status_code)
-        
-        return JsonResponse(response.json())
-        
-    except requests.exceptions.RequestException as e:
-        return JsonResponse({
-            'error': 'Failed to connect to Spotify',
-            'detail': str(e)
-        }, status=503)
+        data = spotify.fetch(endpoint, access_token, user_id=user.id if user else None)
+    except spotify.SpotifyError as e:
+        return _spotify_error(e)
+    return JsonResponse(data)
 
-@csrf_exempt
-def get_user_profile(request):
-    """Get current user's Spotify profile"""
-    print(f"DEBUG: get_user_profile called - Method: {request.method}")
-    print(f"DEBUG: User authenticated: {request.user.is_authenticated}")
-    print(f"DEBUG: Session keys: {list(request.session.keys())}")
-    
-    access_token = get_valid_access_token(request)
-    
-    print(f"DEBUG: Access token retrieved: {access_token[:20] if access_token else None}...")
 
-    if not access_token:
-        print("DEBUG: No access token, returning 401")
-        return JsonResponse({'error': 'Not authenticated with Spotify'}, status=401)
+@csrf_exempt
+def spotify_search(request):
+    """Search Spotify tracks (app token, results shared by everyone)"""
+    # The app's quota is shared; only signed-in Tunr users may spend it
+    if _request_user(request) is None:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
 
+    query = request.GET.get('q', '')
+    if not query.strip():
+        return JsonResponse({'error': 'Missing search query'}, status=400)
+    
     try:
-        print(f"DEBUG: Making request to Spotify API...")
-        response = requests.get(
-            'https://api.spotify.com/v1/me',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        print(f"DEBUG: Spotify API response status: {response.status_code}")
-        
-        # Check if token is invalid
-        if response.status_code == 401:
-            print("DEBUG: Spotify returned 401, token expired")
-            return JsonResponse({'error': 'Spotify session expired. Please reconnect.'}, status=401)
-        
-        if response.status_code == 403:
-            print(f"DEBUG: Spotify 403 response: {response.text}")
-            return JsonResponse({
-                'error': 'Spotify API access forbidden',
-                'detail': response.text,
-                'hint': 'Check if your Spotify account is added to the app allowlist in Spotify Developer Dashboard'
-            }, status=403)
-        
-        if response.status_code != 200:
-            print(f"DEBUG: Spotify API error: {response.status_code}")
-            return JsonResponse({
-                'error': f'Spotify API error: {response.status_code}',
-                'detail': response.text[:200]
-            }, status=response.status_code)
-        
-        print("DEBUG: Returning Spotify profile data successfully")
-        return JsonResponse(response.json())
-        
-    except requests.exceptions.RequestException as e:
-        print(f"DEBUG: Request exception: {str(e)}")
-        return JsonResponse({
-            'error': 'Failed to connect to Spotify',
-            'detail': str(e)
-        }, status=503)
+        return JsonResponse(spotify.search(query))
+    except spotify.SpotifyError as e:
+        return _spotify_error(e)
+
+@csrf_exempt
+def get_user_profile(request):
+    """Get current user's Spotify profile"""
+    return _spotify_response(request, 'profile')
 
 @csrf_exempt
 def get_user_playlists(request):
     """Get current user's playlists"""
-    access_token = get_valid_access_token(request)
-
-    if not access_token:
-        return JsonResponse({'error': 'Not authenticated with Spotify'}, status=401)
-
-    try:
-        response = requests.get(
-            'https://api.spotify.com/v1/me/playlists?limit=50',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        if response.status_code == 401:
-            return JsonResponse({'error': 'Spotify session expired. Please reconnect.'}, status=401)
-        
-        if response.status_code != 200:
-            return JsonResponse({
-                'error': f'Spotify API error: {response.status_code}'
-            }, status=response.status_code)
-        
-        return JsonResponse(response.json())
-        
-    except requests.exceptions.RequestException as e:
-        return JsonResponse({'error': 'Failed to connect to Spotify', 'detail': str(e)}, status=503)
+    return _spotify_response(request, 'playlists')
 
 @csrf_exempt
 def get_top_tracks(request):
     """Get user's top tracks"""
-    access_token = get_valid_access_token(request)
-
-    if not access_token:
-        return JsonResponse({'error': 'Not authenticated with Spotify'}, status=401)
-
-    try:
-        response = requests.get(
-            'https://api.spotify.com/v1/me/top/tracks?limit=20&time_range=short_term',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        if response.status_code == 401:
-            return JsonResponse({'error': 'Spotify session expired. Please reconnect.'}, status=401)
-        
-        if response.status_code != 200:
-            return JsonResponse({
-                'error': f'Spotify API error: {response.status_code}'
-            }, status=response.status_code)
-        
-        return JsonResponse(response.json())
-        
-    except requests.exceptions.RequestException as e:
-        return JsonResponse({'error': 'Failed to connect to Spotify', 'detail': str(e)}, status=503)
+    return _spotify_response(request, 'top_tracks')
 
 @csrf_exempt
 def get_recently_played(request):
     """Get user's recently played tracks"""
-    access_token = get_valid_access_token(request)
-
-    if not access_token:
-        return JsonResponse({'error': 'Not authenticated with Spotify'}, status=401)
-
-    try:
-        response = requests.get(
-            'https://api.spotify.com/v1/me/player/recently-played?limit=50',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        if response.status_code == 401:
-            return JsonResponse({'error': 'Spotify session expired. Please reconnect.'}, status=401)
-        
-        if response.status_code != 200:
-            return JsonResponse({
-                'error': f'Spotify API error: {response.status_code}'
-            }, status=response.status_code)
-        
-        return JsonResponse(response.json())
-        
-    except requests.exceptions.RequestException as e:
-        return JsonResponse({'error': 'Failed to connect to Spotify', 'detail': str(e)}, status=503)
+    return _spotify_response(request, 'recently_played')
 
 @csrf_exempt
 def get_following(request):
     """Get artists user is following"""
-    access_token = get_valid_access_token(request)
-
-    if not access_token:
-        return JsonResponse({'error': 'Not authenticated with Spotify'}, status=401)
-
-    try:
-        response = requests.get(
-            'https://api.spotify.com/v1/me/following?type=artist&limit=50',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        if response.status_code == 401:
-            return JsonResponse({'error': 'Spotify session expired. Please reconnect.'}, status=401)
-        
-        if response.status_code != 200:
-            return JsonResponse({
-                'error': f'Spotify API error: {response.status_code}'
-            }, status=response.status_code)
-        
-        return JsonResponse(response.json())
-        
-    except requests.exceptions.RequestException as e:
-        return JsonResponse({'error': 'Failed to connect to Spotify', 'detail': str(e)}, status=503)
+    return _spotify_response(request, 'following')
 
 @csrf_exempt
 def disconnect_spotify(request):
@@ -406,7 +235,8 @@ def disconnect_spotify(request):
     user.spotify_access_token = None
     user.spotify_refresh_token = None
     user.spotify_token_expires = None
-    user.save()
+    user.save(update_fields=['spotify_id', 'spotify_display_name', *TOKEN_FIELDS])
+    spotify.forget_user(user.id)
     
     # Clear session tokens if they exist
     if 'spotify_access_token' in request.session:
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField(default=0)),
+                ('updated_at', models.FloatField(default=0)),
+                ('blocked_until', models.FloatField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,13 @@
+from django.db import models
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket shared by every worker for one upstream (see upstream.SharedRateLimiter)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    tokens = models.FloatField(default=0)
+    # Epoch seconds, so every process refills from the same clock
+    updated_at = models.FloatField(default=0)
+    blocked_until = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.1f} tokens"
@@ -0,0 +1,94 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+
+Instead of OFFSET, each page remembers the sort key of its last row in an
+opaque cursor and the next page asks for rows strictly "after" it, e.g.
+`(created_at, id) < (cursor.created_at, cursor.id)`. With an index on the
+sort columns every page costs the same no matter how deep you scroll.
+
+Ordering fields must be non-null and end with a unique column (usually `id`)
+so ties are broken deterministically; annotate with Coalesce if needed.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """The cursor string is malformed or doesn't match the ordering"""
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+    if not isinstance(values, list):
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def get_page_size(request, default=None):
+    """`page_size` query param, clamped to settings.API_MAX_PAGE_SIZE"""
+    default = default or settings.API_PAGE_SIZE
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, settings.API_MAX_PAGE_SIZE))
+
+
+def keyset_filter(ordering, values):
+    """
+    Q matching rows that come after `values` in `ordering`.
+
+    For ['-a', '-b'] this is `a < va OR (a = va AND b < vb)`.
+    """
+    if len(values) != len(ordering):
+        raise InvalidCursor('Cursor does not match the ordering')
+    condition = Q()
+    equal_prefix = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+        equal_prefix &= Q(**{name: value})
+    return condition
+
+
+def _resolve(obj, field):
+    value = obj
+    for part in field.lstrip('-').split('__'):
+        value = value.get(part) if isinstance(value, dict) else getattr(value, part)
+    return value
+
+
+def paginate(queryset, ordering, cursor=None, page_size=None):
+    """
+    Return (items, next_cursor) for one page of `queryset` sorted by `ordering`.
+
+    `next_cursor` is None on the last page.
+    """
+    page_size = page_size or settings.API_PAGE_SIZE
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor)))
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    return items, encode_cursor(_resolve(items[-1], field) for field in ordering)
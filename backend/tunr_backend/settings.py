@@ -86,6 +86,16 @@ else:
         }
     }
 
+# Shared cache tier (OMDb responses, etc.) - a DB table so every gunicorn worker
+# sees the same entries. Create it with `python manage.py createcachetable`.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'tunr_cache',
+        'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=50000, cast=int)},
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -159,4 +169,87 @@ REST_FRAMEWORK = {
 # See backend/.env.example for variable names
 OMDB_API_KEY = config('OMDB_API_KEY', default='')
 SPOTIFY_CLIENT_ID = config('SPOTIFY_CLIENT_ID', default='')
-SPOTIFY_CLIENT_SECRET = config('SPOTIFY_CLIENT_SECRET', default='')
\ No newline at end of file
+SPOTIFY_CLIENT_SECRET = config('SPOTIFY_CLIENT_SECRET', default='')
+
+# OMDb response cache (seconds). Negative entries are "Movie not found" answers.
+OMDB_DETAIL_CACHE_TTL = config('OMDB_DETAIL_CACHE_TTL', default=60 * 60 * 24 * 7, cast=int)
+OMDB_SEARCH_CACHE_TTL = config('OMDB_SEARCH_CACHE_TTL', default=60 * 60 * 24, cast=int)
+OMDB_NEGATIVE_CACHE_TTL = config('OMDB_NEGATIVE_CACHE_TTL', default=60 * 60, cast=int)
+OMDB_LOCAL_CACHE_SIZE = config('OMDB_LOCAL_CACHE_SIZE', default=2048, cast=int)
+
+# Outbound HTTP clients (see tunr_backend/upstream.py). Timeouts are in seconds.
+UPSTREAM_CONNECT_TIMEOUT = config('UPSTREAM_CONNECT_TIMEOUT', default=3.05, cast=float)
+UPSTREAM_READ_TIMEOUT = config('UPSTREAM_READ_TIMEOUT', default=10, cast=float)
+UPSTREAMS = {
+    'omdb': {
+        'base_url': 'http://www.omdbapi.com/',
+        'connect_timeout': UPSTREAM_CONNECT_TIMEOUT,
+        'read_timeout': UPSTREAM_READ_TIMEOUT,
+    },
+    'spotify': {
+        'base_url': 'https://api.spotify.com/v1/',
+        'pool_size': 20,
+        'connect_timeout': UPSTREAM_CONNECT_TIMEOUT,
+        'read_timeout': UPSTREAM_READ_TIMEOUT,
+        # Requests/second across all workers; batch jobs get BATCH_SHARE of it
+        'rate_limit': config('SPOTIFY_RATE_LIMIT', default=10, cast=float),
+        'batch_share': config('SPOTIFY_BATCH_SHARE', default=0.5, cast=float),
+    },
+    'spotify_accounts': {
+        'base_url': 'https://accounts.spotify.com/',
+        'connect_timeout': UPSTREAM_CONNECT_TIMEOUT,
+        'read_timeout': UPSTREAM_READ_TIMEOUT,
+    },
+}
+
+# Spotify access tokens (see music/tokens.py): `refresh_spotify_tokens` renews those
+# expiring within HORIZON seconds; requests renew in the background within SKEW
+SPOTIFY_TOKEN_REFRESH_HORIZON = config('SPOTIFY_TOKEN_REFRESH_HORIZON', default=60 * 10, cast=int)
+SPOTIFY_TOKEN_REFRESH_SKEW = config('SPOTIFY_TOKEN_REFRESH_SKEW', default=60 * 5, cast=int)
+
+# Spotify response cache (seconds, see music/spotify.py). Search is shared by all users;
+# stale /me entries are kept REVALIDATE_WINDOW longer for ETag revalidation.
+SPOTIFY_CACHE_TTLS = {
+    'profile': config('SPOTIFY_PROFILE_CACHE_TTL', default=60 * 10, cast=int),
+    'playlists': config('SPOTIFY_PLAYLISTS_CACHE_TTL', default=60 * 5, cast=int),
+    'top_tracks': config('SPOTIFY_TOP_TRACKS_CACHE_TTL', default=60 * 60 * 6, cast=int),
+    'recently_played': config('SPOTIFY_RECENTLY_PLAYED_CACHE_TTL', default=60, cast=int),
+    'following': config('SPOTIFY_FOLLOWING_CACHE_TTL', default=60 * 60, cast=int),
+    'search': config('SPOTIFY_SEARCH_CACHE_TTL', default=60 * 60 * 24, cast=int),
+}
+SPOTIFY_CACHE_REVALIDATE_WINDOW = config('SPOTIFY_CACHE_REVALIDATE_WINDOW', default=60 * 60 * 24, cast=int)
+# Search results kept in each worker's memory (in front of the shared cache)
+SPOTIFY_SEARCH_LOCAL_CACHE_SIZE = config('SPOTIFY_SEARCH_LOCAL_CACHE_SIZE', default=1024, cast=int)
+
+# Movie details are served from the local Movie table; rows older than this
+# (seconds) are refreshed from OMDb in the background.
+MOVIE_DETAILS_FROM_DB = config('MOVIE_DETAILS_FROM_DB', default=True, cast=bool)
+MOVIE_DETAIL_STALE_AFTER = config('MOVIE_DETAIL_STALE_AFTER', default=60 * 60 * 24 * 30, cast=int)
+# Parallel OMDb requests used by `manage.py enrich_movies`
+MOVIE_ENRICHMENT_CONCURRENCY = config('MOVIE_ENRICHMENT_CONCURRENCY', default=4, cast=int)
+
+# Cursor-paginated list endpoints (see tunr_backend/pagination.py)
+API_PAGE_SIZE = config('API_PAGE_SIZE', default=20, cast=int)
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=100, cast=int)
+
+# Precomputed taste neighbours (see accounts/similarity.py)
+USER_SIMILARITY_NEIGHBOURS = config('USER_SIMILARITY_NEIGHBOURS', default=50, cast=int)
+USER_SIMILARITY_METRIC = config('USER_SIMILARITY_METRIC', default='cosine')  # cosine | pearson
+# Item-item "because you liked" neighbours (see movies/similarity.py)
+MOVIE_SIMILARITY_NEIGHBOURS = config('MOVIE_SIMILARITY_NEIGHBOURS', default=30, cast=int)
+MOVIE_SIMILARITY_MIN_SUPPORT = config('MOVIE_SIMILARITY_MIN_SUPPORT', default=2, cast=int)
+# Matrix-factorization model written by `manage.py train_recommender` (see movies/factorization.py)
+RECOMMENDER_MODEL_DIR = config('RECOMMENDER_MODEL_DIR', default=str(BASE_DIR / 'recommender'))
+# Recommendation endpoints: served from cache while fresh, stale-while-revalidate
+# up to MAX_STALE seconds (see accounts/rec_cache.py)
+RECOMMENDATION_CACHE_TTL = config('RECOMMENDATION_CACHE_TTL', default=60 * 15, cast=int)
+RECOMMENDATION_CACHE_MAX_STALE = config('RECOMMENDATION_CACHE_MAX_STALE', default=60 * 60 * 24, cast=int)
+# Time budget (seconds) and parallelism of the OMDb fallback in movie recommendations
+RECOMMENDATION_OMDB_DEADLINE = config('RECOMMENDATION_OMDB_DEADLINE', default=0.8, cast=float)
+RECOMMENDATION_OMDB_WORKERS = config('RECOMMENDATION_OMDB_WORKERS', default=8, cast=int)
+
+# Friends feed (see accounts/feed.py): activities of users with more followers
+# than this are merged in at read time instead of being copied to every inbox
+FEED_FANOUT_MAX_FOLLOWERS = config('FEED_FANOUT_MAX_FOLLOWERS', default=1000, cast=int)
+# Activities copied into a follower's inbox when they follow someone
+FEED_BACKFILL_SIZE = config('FEED_BACKFILL_SIZE', default=50, cast=int)
@@ -0,0 +1,183 @@
+import io
+from unittest import mock
+
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+from movies.models import Movie, MovieReview
+
+from .pagination import encode_cursor, paginate
+
+from .upstream import (
+    BATCH, INTERACTIVE, CircuitBreaker, CircuitOpenError, RateLimitedError, SharedRateLimiter, UpstreamClient,
+    UpstreamError,
+)
+
+
+def _response(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response.raw = io.BytesIO()
+    return response
+
+
+class FakeLimiter:
+    """Lets `allowed` requests through, then raises RateLimitedError"""
+
+    def __init__(self, allowed):
+        self.allowed = allowed
+
+    def acquire(self, priority=None):
+        if self.allowed <= 0:
+            raise RateLimitedError('rate limit reached', retry_after=1)
+        self.allowed -= 1
+
+    def block(self, seconds):
+        pass
+
+
+class CircuitBreakerRequestTests(SimpleTestCase):
+    def setUp(self):
+        self.client = UpstreamClient('test', base_url='http://upstream.test', failure_threshold=1, reset_timeout=0)
+        self.client.session = mock.Mock()
+        # Open the circuit; reset_timeout=0 makes the next call the half-open trial
+        self.client.breaker.record_failure()
+
+    def test_429_on_half_open_trial_does_not_wedge_the_breaker(self):
+        self.client.session.request.return_value = _response(429, {'Retry-After': '60'})
+        with self.assertRaises(RateLimitedError):
+            self.client.get('x')
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+        self.client.session.request.return_value = _response(200)
+        self.assertEqual(self.client.get('x').status_code, 200)
+
+    def test_rate_limited_before_sending_releases_the_trial(self):
+        self.client.limiter = FakeLimiter(allowed=0)
+        with self.assertRaises(RateLimitedError):
+            self.client.get('x')
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+
+        self.client.limiter = None
+        self.client.session.request.return_value = _response(200)
+        self.assertEqual(self.client.get('x').status_code, 200)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_rate_limited_on_retry_releases_the_trial(self):
+        self.client.limiter = FakeLimiter(allowed=1)
+        self.client.backoff_base = 0
+        self.client.session.request.return_value = _response(503)
+        with self.assertRaises(RateLimitedError):
+            self.client.get('x', priority=BATCH)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(self.client.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        self.client.breaker.reset_timeout = 60
+        self.client.breaker.opened_at -= 60
+        self.client.session.request.return_value = _response(500)
+        self.client.max_retries = 0
+        self.assertEqual(self.client.get('x').status_code, 500)
+        with self.assertRaises(CircuitOpenError):
+            self.client.get('x')
+
+
+class RetryTests(SimpleTestCase):
+    def setUp(self):
+        self.client = UpstreamClient('test', base_url='http://upstream.test', max_retries=1, backoff_base=0)
+        self.client.session = mock.Mock()
+
+    def _fail_once(self, error):
+        self.client.session.request.side_effect = [error, _response(200)]
+
+    def test_post_retried_when_the_connection_was_never_made(self):
+        refused = NewConnectionError(None, 'Connection refused')
+        errors = [
+            requests.exceptions.ConnectionError(MaxRetryError(None, '/token', reason=refused)),
+            requests.exceptions.ConnectTimeout('connect timed out'),
+        ]
+        for error in errors:
+            with self.subTest(error=error):
+                self._fail_once(error)
+                self.assertEqual(self.client.post('token').status_code, 200)
+
+    def test_post_not_retried_after_the_request_may_have_been_sent(self):
+        dropped = requests.exceptions.ConnectionError(ProtocolError('Connection aborted.', ConnectionResetError()))
+        self._fail_once(dropped)
+        with self.assertRaises(UpstreamError):
+            self.client.post('token')
+        self.assertEqual(self.client.session.request.call_count, 1)
+
+    def test_get_retried_after_a_dropped_connection(self):
+        self._fail_once(requests.exceptions.ConnectionError(ProtocolError('Connection aborted.')))
+        self.assertEqual(self.client.get('x').status_code, 200)
+
+
+class SharedRateLimiterTests(TestCase):
+    def setUp(self):
+        # Two tokens per second; batch requests must leave one in the bucket
+        self.limiter = SharedRateLimiter('test', rate=2, batch_share=0.5, max_wait=0.1)
+
+    def test_batch_requests_leave_the_interactive_reserve(self):
+        self.assertEqual(self.limiter._try_acquire(BATCH), 0)
+        self.assertGreater(self.limiter._try_acquire(BATCH), 0)
+        self.assertEqual(self.limiter._try_acquire(INTERACTIVE), 0)
+        self.assertGreater(self.limiter._try_acquire(INTERACTIVE), 0)
+
+    def test_interactive_callers_give_up_after_max_wait(self):
+        self.limiter.acquire()
+        self.limiter.acquire()
+        with self.assertRaises(RateLimitedError) as raised:
+            self.limiter.acquire()
+        self.assertEqual(raised.exception.retry_after, 1)
+
+    def test_block_holds_every_caller_off(self):
+        self.limiter.block(30)
+        self.assertGreater(self.limiter._try_acquire(INTERACTIVE), 29)
+        # A shorter Retry-After never shortens an existing block
+        self.limiter.block(1)
+        self.assertGreater(self.limiter._try_acquire(INTERACTIVE), 29)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        movie = Movie.objects.create(imdb_id='tt0000001', title='Arrival')
+        users = [CustomUser.objects.create(username=f'u{n}', email=f'u{n}@example.com') for n in range(7)]
+        for user in users:
+            MovieReview.objects.create(user=user, movie=movie, rating=4)
+        # Ties on created_at: only the id tiebreaker orders these
+        MovieReview.objects.update(created_at=timezone.now())
+        self.client = APIClient()
+
+    def test_cursor_walk_has_no_duplicates_or_gaps(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = paginate(MovieReview.objects.all(), ['-created_at', '-id'], cursor=cursor, page_size=3)
+            seen += [review.id for review in page]
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(MovieReview.objects.values_list('id', flat=True), reverse=True))
+
+    def test_endpoint_walk(self):
+        url = reverse('get_movie_reviews', args=['tt0000001'])
+        ids, params = [], {'page_size': 2}
+        while True:
+            data = self.client.get(url, params).json()
+            ids += [review['id'] for review in data['reviews']]
+            if not data['next_cursor']:
+                break
+            params['cursor'] = data['next_cursor']
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(len(set(ids)), 7)
+
+    def test_bad_cursors_are_rejected(self):
+        url = reverse('get_movie_reviews', args=['tt0000001'])
+        for cursor in ('not-a-cursor!', encode_cursor([1]), encode_cursor({'a': 1})):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 400)
@@ -0,0 +1,384 @@
+"""
+Shared HTTP layer for third-party APIs (OMDb, Spotify).
+
+Each upstream gets one long-lived `UpstreamClient`:
+
+- a `requests.Session` with its own keep-alive connection pool, so repeat
+  calls skip the TCP + TLS handshake
+- connect/read timeouts on every call, so a slow upstream can't pin a
+  gunicorn worker
+- bounded retries with jittered exponential backoff for connection errors
+  and 502/503/504 responses (POSTs only when the connection was never made)
+- a circuit breaker that fails fast while the upstream is down
+- optionally (`rate_limit` option) a token bucket shared by every worker
+  through one database row, which honours 429 Retry-After and keeps part of
+  the budget for interactive requests so batch jobs can't starve them
+
+Use `get_client('omdb')`, `get_client('spotify')` or
+`get_client('spotify_accounts')` rather than calling `requests` directly.
+Per-upstream overrides live in `settings.UPSTREAMS`.
+"""
+import logging
+import math
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThanOrEqual
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from .models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+DEFAULTS = {
+    'base_url': '',
+    'pool_size': 10,
+    'connect_timeout': 3.05,
+    'read_timeout': 10,
+    'max_retries': 2,
+    'backoff_base': 0.2,
+    'backoff_cap': 2.0,
+    'retry_statuses': (502, 503, 504),
+    'failure_threshold': 5,
+    'reset_timeout': 30,
+    'rate_limit': None,  # requests per second across all workers
+    'batch_share': 0.5,
+    'max_rate_wait': 2.0,
+    'max_batch_throttles': 10,
+}
+
+INTERACTIVE, BATCH = 'interactive', 'batch'
+
+
+class UpstreamError(requests.RequestException):
+    """An upstream call failed after retries"""
+
+
+class CircuitOpenError(UpstreamError):
+    """The upstream is failing and calls are being short-circuited"""
+
+
+class RateLimitedError(UpstreamError):
+    """The request budget (ours or the upstream's 429) is exhausted for longer than the caller can wait"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and all
+    calls fail immediately for `reset_timeout` seconds. Then a single trial
+    call is let through; success closes the circuit, failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def release(self):
+        """Give back a half-open trial that never reached the upstream"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class RateLimiter:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedRateLimiter:
+    """
+    Token bucket shared by every worker through one RateLimitBucket row.
+
+    The bucket refills at `rate` tokens per second up to a one-second burst.
+    Taking a token is a single conditional UPDATE that refills and decrements
+    in the same statement, so concurrent workers can't both spend the last
+    token, and the common case costs one query. Interactive requests may
+    empty the bucket; batch requests only take a token while more than
+    `1 - batch_share` of it is left, so that part of every burst stays free
+    for users however busy a backfill is.
+
+    After a 429 the upstream's Retry-After is recorded on the row too, and
+    every worker holds off until it has passed. Interactive callers wait at
+    most `max_wait` seconds and otherwise get RateLimitedError; batch callers
+    wait as long as it takes.
+    """
+
+    def __init__(self, name, rate, batch_share=0.5, max_wait=2.0):
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = max(1.0, self.rate)
+        # Tokens that must be left in the bucket after a request of each priority
+        self.reserve = {
+            INTERACTIVE: 0.0,
+            BATCH: self.capacity * (1 - batch_share),
+        }
+        self.max_wait = max_wait
+        self._created = False
+
+    def _bucket(self):
+        if not self._created:
+            RateLimitBucket.objects.get_or_create(
+                name=self.name, defaults={'tokens': self.capacity, 'updated_at': time.time()},
+            )
+            self._created = True
+        return RateLimitBucket.objects.filter(name=self.name)
+
+    def _refilled(self, now):
+        return Least(Value(self.capacity), F('tokens') + (Value(now) - F('updated_at')) * Value(self.rate))
+
+    def block(self, seconds):
+        """Hold every worker off for `seconds` (the upstream said so)"""
+        until = time.time() + seconds
+        try:
+            self._bucket().filter(blocked_until__lt=until).update(blocked_until=until)
+        except DatabaseError as e:
+            logger.warning('%s rate limiter write failed: %s', self.name, e)
+
+    def _try_acquire(self, priority):
+        """0 if a request may go now, else seconds to wait before asking again"""
+        bucket = self._bucket()
+        now = time.time()
+        needed = 1 + self.reserve[priority]
+        refilled = self._refilled(now)
+        taken = bucket.filter(
+            GreaterThanOrEqual(refilled, Value(needed)), blocked_until__lte=now,
+        ).update(tokens=refilled - 1, updated_at=now)
+        if taken:
+            return 0
+        bucket = bucket.values('tokens', 'updated_at', 'blocked_until').first()
+        if bucket is None:
+            self._created = False
+            return 0
+        tokens = min(self.capacity, bucket['tokens'] + (now - bucket['updated_at']) * self.rate)
+        return max(bucket['blocked_until'] - now, (needed - tokens) / self.rate, 0.001)
+
+    def acquire(self, priority=INTERACTIVE):
+        """Block until a request of `priority` may be sent"""
+        deadline = None if priority == BATCH else time.monotonic() + self.max_wait
+        while True:
+            try:
+                wait = self._try_acquire(priority)
+            except DatabaseError as e:
+                # The limiter is a courtesy to the upstream; never fail a request over it
+                logger.warning('%s rate limiter read failed: %s', self.name, e)
+                return
+            if not wait:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitedError(f'{self.name} rate limit reached', retry_after=math.ceil(wait))
+            time.sleep(wait)
+
+
+def _retry_after(response, default=1.0):
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', default)))
+    except ValueError:
+        return default
+
+
+def _never_sent(error):
+    """True if `error` happened while connecting, so the request never reached the server"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose `reason` is the real failure
+    pending, seen = [error], set()
+    while pending:
+        error = pending.pop()
+        if error is None or id(error) in seen:
+            continue
+        seen.add(id(error))
+        if isinstance(error, NewConnectionError):
+            return True
+        pending += [error.__cause__, error.__context__, getattr(error, 'reason', None)]
+        pending += [arg for arg in error.args if isinstance(arg, BaseException)]
+    return False
+
+
+class UpstreamClient:
+    """Pooled, timeout-bounded, retrying HTTP client for one upstream"""
+
+    def __init__(self, name, **options):
+        self.name = name
+        opts = {**DEFAULTS, **options}
+        self.base_url = opts['base_url']
+        self.timeout = (opts['connect_timeout'], opts['read_timeout'])
+        self.max_retries = opts['max_retries']
+        self.backoff_base = opts['backoff_base']
+        self.backoff_cap = opts['backoff_cap']
+        self.retry_statuses = set(opts['retry_statuses'])
+        self.breaker = CircuitBreaker(opts['failure_threshold'], opts['reset_timeout'])
+        self.max_rate_wait = opts['max_rate_wait']
+        self.max_batch_throttles = opts['max_batch_throttles']
+        self.limiter = None
+        if opts['rate_limit']:
+            self.limiter = SharedRateLimiter(
+                name, opts['rate_limit'], batch_share=opts['batch_share'], max_wait=opts['max_rate_wait'],
+            )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=opts['pool_size'], max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _url(self, url):
+        if url.startswith(('http://', 'https://')):
+            return url
+        return self.base_url.rstrip('/') + '/' + url.lstrip('/')
+
+    def _backoff(self, attempt):
+        # "Full jitter": uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, priority=INTERACTIVE, **kwargs):
+        """
+        Send a request. `priority` is INTERACTIVE (a user is waiting) or BATCH
+        (background jobs: lower share of the rate limit, waits out 429s).
+        """
+        method = method.upper()
+        url = self._url(url)
+        kwargs.setdefault('timeout', self.timeout)
+        retryable = method in IDEMPOTENT_METHODS
+
+        # Wait for the rate limit first: allow() may hand out the half-open
+        # trial, which must end in record_success/record_failure/release
+        if self.limiter is not None:
+            self.limiter.acquire(priority)
+        if not self.breaker.allow():
+            raise CircuitOpenError(f'{self.name} circuit open, skipping {method} {url}')
+
+        attempt = throttled = 0
+        while True:
+            if self.limiter is not None and (attempt or throttled):
+                try:
+                    self.limiter.acquire(priority)
+                except RateLimitedError:
+                    self.breaker.release()
+                    raise
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                # Failures while connecting never reached the server, so even POSTs are
+                # safe to retry; a dropped connection may have (e.g. a one-shot OAuth
+                # code exchange), so those are only retried for idempotent methods
+                can_retry = retryable or _never_sent(e)
+                if can_retry and attempt < self.max_retries:
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self.breaker.record_failure()
+                raise UpstreamError(f'{self.name} request failed: {e}') from e
+
+            if response.status_code == 429:
+                # The upstream answered, so it's up: not a breaker failure
+                self.breaker.record_success()
+                retry_after = _retry_after(response)
+                response.close()
+                if self.limiter is not None:
+                    self.limiter.block(retry_after)
+                can_wait = (
+                    throttled < self.max_batch_throttles if priority == BATCH
+                    else throttled < self.max_retries and retry_after <= self.max_rate_wait
+                )
+                if not can_wait:
+                    raise RateLimitedError(
+                        f'{self.name} rate limited {method} {url}', retry_after=math.ceil(retry_after)
+                    )
+                if self.limiter is None:
+                    time.sleep(retry_after)  # with a limiter, acquire() waits it out
+                throttled += 1
+                continue
+
+            if response.status_code in self.retry_statuses and retryable and attempt < self.max_retries:
+                response.close()
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """Process-wide client for a named upstream (see settings.UPSTREAMS)"""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = UpstreamClient(name, **getattr(settings, 'UPSTREAMS', {}).get(name, {}))
+                _clients[name] = client
+    return client
@@ -1,9 +1,8 @@
 # tunr_backend/views.py
-import requests
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.conf import settings
 from django.http import JsonResponse
+from movies import omdb
 
 @api_view(['GET'])
 def search_movies(request):
@@ -12,12 +11,8 @@ def search_movies(request):
     if not query:
         return JsonResponse({'error': 'query parameter is required'}, status=400)
     
-    omdb_api_key = settings.OMDB_API_KEY
-    url = f'http://www.omdbapi.com/?apikey={omdb_api_key}&s={query}&type=movie'
-    
     try:
-        response = requests.get(url)
-        data = response.json()
+        data = omdb.search(query)
         
         if data.get('Response') == 'True':
             return JsonResponse({
@@ -35,9 +30,10 @@ def search_movies(request):
 @api_view(['GET'])
 def movie_detail(request, movie_id):
     # Get detailed movie info from OMDb
-    omdb_url = f"http://www.omdbapi.com/?i={movie_id}&apikey={settings.OMDB_API_KEY}"
-    response = requests.get(omdb_url)
-    return JsonResponse(response.json())
+    try:
+        return JsonResponse(omdb.get_details(movie_id))
+    except omdb.OMDbError as e:
+        return JsonResponse({'error': str(e)}, status=502)
 
 @api_view(['POST'])
 def toggle_like(request, movie_id):